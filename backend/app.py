@@ -1,8 +1,13 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+import copy
 import json
-import os
+import queue
+import re
+import requests
+import time
 from datetime import datetime
+from urllib.parse import quote
 from sqlalchemy.orm import sessionmaker
 from models import (
     engine, SessionLocal, get_db, init_database,
@@ -13,9 +18,36 @@ from models import (
     VariableValue as VariableValueModel
 )
 from enhanced_data_service import get_enhanced_data_service
+from config_store import init_config_store, thaw_config, ConfigConflictError
+from es_client import get_es_client
+from log_cursor import PIT_KEEP_ALIVE, query_fingerprint, encode_cursor, decode_cursor
+from time_utils import parse_duration_ms, now_ms, relative_start_ms
+from log_hits import format_log_hit, FieldProjection
+from log_tail import get_log_tail_hub
+from index_catalog import get_index_catalog
+from index_resolver import resolve_index
+from es_query_builder import QueryBuilder, time_range_filter, round_down, round_up
+from log_patterns import get_pattern_miner_registry, summarize_patterns
+from log_async_search import (
+    get_async_search_registry, ASYNC_KEEP_ALIVE, SUBMIT_WAIT_TIMEOUT, MAX_POLL_WAIT
+)
+from log_ingest import get_log_ingestor, resolve_ingest_index
+from log_context import (
+    LogContextQuery, ContextError, DEFAULT_CONTEXT_LINES, MAX_CONTEXT_LINES, CONTEXT_WINDOW_MS
+)
+from prom_client import get_prom_client, PromQueryError
+from prom_range_cache import get_prom_range_cache
+from prom_batch import BatchQuery, parse_batch_queries, run_batch
+from dashboard_data import compile_dashboard, resolve_variables, panel_queries
+from series_downsample import coarser_step, downsample_matrix, parse_max_points
+from variable_resolver import get_variable_resolver, VariableQueryError, REFRESH_POLICIES
+from log_multi_search import parse_targets, multi_search, DEFAULT_TARGET_TIMEOUT, MAX_TARGET_TIMEOUT
+from log_export import LogExporter, export_projection, EXPORT_FORMATS, EXPORT_MAX_ROWS, DEFAULT_MAX_ROWS
+from log_trends_cache import get_trend_cache, fixed_interval_ms, stats_interval, parse_histogram_buckets
+from ttl_cache import TTLCache
 
 app = Flask(__name__)
-CORS(app)  # 允许跨域请求
+CORS(app, expose_headers=['ETag'])  # 允许跨域请求（暴露 ETag 供乐观并发控制使用）
 
 # 初始化数据库
 try:
@@ -30,6 +62,42 @@ enhanced_data_service = get_enhanced_data_service()
 # 配置文件路径
 CONFIG_FILE = 'config.json'
 
+# 实时日志推送的心跳间隔（秒）
+STREAM_HEARTBEAT_SECONDS = 15
+
+# 活跃服务数缓存（基数聚合无法增量计算，短暂缓存）
+_active_services_cache = TTLCache(maxsize=256, ttl=60)
+
+# 字段分布（facets）缓存，按查询条件与取整后的时间窗口区分
+_facet_cache = TTLCache(maxsize=256, ttl=60)
+
+# 日志概览可选的部分
+OVERVIEW_SECTIONS = ('logs', 'stats', 'trends', 'indices')
+
+# 日志模板挖掘的采样条数与读取字段
+DEFAULT_PATTERN_SAMPLE = 1000
+MAX_PATTERN_SAMPLE = 5000
+PATTERN_SOURCE_FIELDS = ['@timestamp', 'timestamp', 'level', 'message', 'log']
+
+# 日志写入的单次请求限制与索引名格式（小写，可包含 %Y/%m/%d 日期格式）
+MAX_INGEST_REQUEST_DOCS = 10000
+MAX_INGEST_REQUEST_BYTES = 10 * 1024 * 1024
+INGEST_INDEX_PATTERN = re.compile(r'^[a-z0-9](?:[a-z0-9_.\-]|%[Ymd])*$')
+
+# 字段分布：默认字段、单次最多字段数，以及超过该时间窗口时使用抽样聚合
+DEFAULT_FACET_FIELDS = ['level', 'service', 'host.name']
+MAX_FACET_FIELDS = 20
+FACET_FIELD_PATTERN = re.compile(r'^[A-Za-z0-9_@.\-]+$')
+FACET_CACHE_ROUNDING_MS = 60 * 1000
+FACET_SAMPLER_THRESHOLD_MS = 6 * 60 * 60 * 1000
+FACET_SAMPLE_SHARD_SIZE = 20000
+
+# 日志检索默认的命中计数上限（超过后总数只是下限，避免大窗口上的精确计数）
+DEFAULT_TRACK_TOTAL_HITS = 10000
+
+# 日志上下文最大查找时间范围
+MAX_CONTEXT_WINDOW_MS = 24 * 60 * 60 * 1000
+
 # 默认配置
 DEFAULT_CONFIG = {
     "system": {
@@ -100,40 +168,65 @@ DEFAULT_CONFIG = {
     }
 }
 
+# 配置存储（进程内缓存，文件变化时自动重新加载）
+config_store = init_config_store(CONFIG_FILE, DEFAULT_CONFIG)
+
 def load_config():
-    """加载配置文件"""
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"加载配置文件失败: {e}")
-            return DEFAULT_CONFIG.copy()
-    else:
-        # 如果配置文件不存在，创建默认配置
-        save_config(DEFAULT_CONFIG)
-        return DEFAULT_CONFIG.copy()
+    """加载配置文件（返回可修改的副本）"""
+    return config_store.load()
 
 def save_config(config):
     """保存配置文件"""
-    try:
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(config, f, ensure_ascii=False, indent=2)
-        return True
-    except Exception as e:
-        print(f"保存配置文件失败: {e}")
-        return False
+    return config_store.save(config)
+
+def _expected_revision():
+    """解析 If-Match 请求头，返回期望的配置版本号（未提供或为 * 时返回 None）"""
+    if_match = request.if_match
+    if not if_match or if_match.star_tag:
+        return None
+    for tag in if_match.as_set():
+        try:
+            return int(tag)
+        except ValueError:
+            continue
+    # 无法识别的 ETag 视为不匹配
+    return -1
+
+def _not_modified(revision):
+    """请求的 If-None-Match 与当前版本一致时返回 304 响应"""
+    if request.if_none_match.contains(str(revision)):
+        response = app.response_class(status=304)
+        response.set_etag(str(revision))
+        return response
+    return None
+
+def _with_etag(response, revision):
+    """为响应设置配置版本 ETag"""
+    response.set_etag(str(revision))
+    return response
+
+def _conflict_response(error):
+    """配置版本冲突响应"""
+    return _with_etag(jsonify({
+        "success": False,
+        "data": None,
+        "message": str(error)
+    }), error.current_revision), 412
 
 @app.route('/api/config', methods=['GET'])
 def get_config():
     """获取配置"""
     try:
-        config = load_config()
-        return jsonify({
+        snapshot, revision = config_store.snapshot_with_revision()
+        not_modified = _not_modified(revision)
+        if not_modified is not None:
+            return not_modified
+
+        return _with_etag(jsonify({
             "success": True,
-            "data": config,
+            "data": thaw_config(snapshot),
             "message": "配置获取成功"
-        })
+        }), revision)
     except Exception as e:
         return jsonify({
             "success": False,
@@ -153,9 +246,6 @@ def update_config():
                 "message": "请求数据不能为空"
             }), 400
         
-        # 验证配置格式
-        current_config = load_config()
-        
         # 合并配置（保留现有配置结构）
         def merge_config(current, new):
             for key, value in new.items():
@@ -167,23 +257,21 @@ def update_config():
                 else:
                     current[key] = value
         
-        merge_config(current_config, new_config)
+        def apply(current_config):
+            merge_config(current_config, new_config)
+            # 添加更新时间戳
+            current_config['last_updated'] = datetime.now().isoformat()
         
-        # 添加更新时间戳
-        current_config['last_updated'] = datetime.now().isoformat()
+        try:
+            current_config, revision, _ = config_store.update(apply, _expected_revision())
+        except ConfigConflictError as ce:
+            return _conflict_response(ce)
         
-        if save_config(current_config):
-            return jsonify({
-                "success": True,
-                "data": current_config,
-                "message": "配置更新成功"
-            })
-        else:
-            return jsonify({
-                "success": False,
-                "data": None,
-                "message": "配置保存失败"
-            }), 500
+        return _with_etag(jsonify({
+            "success": True,
+            "data": current_config,
+            "message": "配置更新成功"
+        }), revision)
             
     except Exception as e:
         return jsonify({
@@ -196,13 +284,17 @@ def update_config():
 def get_config_section(section):
     """获取特定配置节"""
     try:
-        config = load_config()
-        if section in config:
-            return jsonify({
+        snapshot, revision = config_store.snapshot_with_revision()
+        if section in snapshot:
+            not_modified = _not_modified(revision)
+            if not_modified is not None:
+                return not_modified
+
+            return _with_etag(jsonify({
                 "success": True,
-                "data": config[section],
+                "data": thaw_config(snapshot[section]),
                 "message": f"配置节 {section} 获取成功"
-            })
+            }), revision)
         else:
             return jsonify({
                 "success": False,
@@ -228,22 +320,20 @@ def update_config_section(section):
                 "message": "请求数据不能为空"
             }), 400
         
-        config = load_config()
-        config[section] = section_data
-        config['last_updated'] = datetime.now().isoformat()
+        def apply(config):
+            config[section] = section_data
+            config['last_updated'] = datetime.now().isoformat()
         
-        if save_config(config):
-            return jsonify({
-                "success": True,
-                "data": config[section],
-                "message": f"配置节 {section} 更新成功"
-            })
-        else:
-            return jsonify({
-                "success": False,
-                "data": None,
-                "message": "配置保存失败"
-            }), 500
+        try:
+            config, revision, _ = config_store.update(apply, _expected_revision())
+        except ConfigConflictError as ce:
+            return _conflict_response(ce)
+        
+        return _with_etag(jsonify({
+            "success": True,
+            "data": config[section],
+            "message": f"配置节 {section} 更新成功"
+        }), revision)
             
     except Exception as e:
         return jsonify({
@@ -256,21 +346,21 @@ def update_config_section(section):
 def reset_config():
     """重置配置为默认值"""
     try:
-        default_config = DEFAULT_CONFIG.copy()
-        default_config['last_updated'] = datetime.now().isoformat()
+        def apply(config):
+            config.clear()
+            config.update(copy.deepcopy(DEFAULT_CONFIG))
+            config['last_updated'] = datetime.now().isoformat()
         
-        if save_config(default_config):
-            return jsonify({
-                "success": True,
-                "data": default_config,
-                "message": "配置重置成功"
-            })
-        else:
-            return jsonify({
-                "success": False,
-                "data": None,
-                "message": "配置重置失败"
-            }), 500
+        try:
+            default_config, revision, _ = config_store.update(apply, _expected_revision())
+        except ConfigConflictError as ce:
+            return _conflict_response(ce)
+        
+        return _with_etag(jsonify({
+            "success": True,
+            "data": default_config,
+            "message": "配置重置成功"
+        }), revision)
             
     except Exception as e:
         return jsonify({
@@ -662,84 +752,158 @@ def get_alerts():
             "message": f"获取告警列表失败: {str(e)}"
         }), 500
 
+def _get_es_client():
+    """获取共享的ES客户端，未启用或未配置时返回 (None, 错误响应)"""
+    if not config_store.elk_enabled():
+        return None, (jsonify({
+            "success": False,
+            "data": None,
+            "message": "ELK Stack未启用，请在配置管理中启用"
+        }), 400)
+    
+    es = get_es_client()
+    if es is None:
+        return None, (jsonify({
+            "success": False,
+            "data": None,
+            "message": "Elasticsearch URL未配置，请在配置管理中设置"
+        }), 400)
+    
+    return es, None
+
+def _get_prom_client():
+    """获取共享的Prometheus客户端，未启用或未配置时返回 (None, 错误响应)"""
+    if not config_store.prometheus_enabled():
+        return None, (jsonify({
+            "success": False,
+            "data": None,
+            "message": "Prometheus未启用，请在配置管理中启用"
+        }), 400)
+    
+    prom = get_prom_client()
+    if prom is None:
+        return None, (jsonify({
+            "success": False,
+            "data": None,
+            "message": "Prometheus URL未配置，请在配置管理中设置"
+        }), 400)
+    
+    return prom, None
+
+def _parse_prom_time(value, default=None):
+    """解析 Prometheus 时间参数（Unix 秒或 RFC3339），无法解析时抛出 ValueError"""
+    if value is None or value == '':
+        if default is None:
+            raise ValueError("缺少时间参数")
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+
+def _parse_prom_step(value):
+    """解析步长（秒数或 30s/1m 形式的时长），无法解析时抛出 ValueError"""
+    try:
+        step = float(value)
+    except (TypeError, ValueError):
+        duration = parse_duration_ms(value)
+        if not duration:
+            raise ValueError(f"无效的步长: {value}")
+        step = duration / 1000
+    if step <= 0:
+        raise ValueError(f"无效的步长: {value}")
+    return step
+
+def _es_error_response(response):
+    """ES返回非200状态时的统一错误响应"""
+    return jsonify({
+        "success": False,
+        "data": None,
+        "message": f"Elasticsearch查询失败: {response.status_code}"
+    }), 500
+
+def _load_index_catalog(force_refresh=False):
+    """获取已加载的索引目录，首次访问（或强制刷新）时同步刷新一次"""
+    catalog = get_index_catalog()
+    catalog.ensure_started()
+    if force_refresh or not catalog.ready():
+        catalog.refresh()
+    return catalog
+
 @app.route('/api/logs/indices', methods=['GET'])
 def get_log_indices():
-    """获取Elasticsearch索引列表"""
+    """获取Elasticsearch索引列表（由后台刷新的索引目录提供）
+    
+    支持 search/health/scope(log|all)/sort/order 过滤排序，page/page_size 分页；
+    指定 since 时只返回该版本之后新增/更新的索引及已删除的索引名。
+    """
     try:
-        config = load_config()
-        elk_config = config.get('monitoring', {}).get('elk', {})
+        es, error_response = _get_es_client()
+        if error_response:
+            return error_response
         
-        if not elk_config.get('enabled', False):
+        # 获取查询参数
+        search = request.args.get('search', '').strip()
+        scope = request.args.get('scope', 'log')
+        health = request.args.get('health', '')
+        sort = request.args.get('sort', 'index')
+        order = request.args.get('order', 'desc')
+        since = request.args.get('since', type=int)
+        page = request.args.get('page', type=int)
+        page_size = request.args.get('page_size', type=int)
+        force_refresh = request.args.get('refresh', 'false').lower() in ('1', 'true', 'yes')
+        
+        try:
+            catalog = _load_index_catalog(force_refresh)
+        except requests.exceptions.RequestException as req_e:
             return jsonify({
                 "success": False,
                 "data": None,
-                "message": "ELK Stack未启用，请在配置管理中启用"
-            }), 400
-            
-        elasticsearch_url = elk_config.get('elasticsearch_url')
-        if not elasticsearch_url:
+                "message": f"连接Elasticsearch失败: {str(req_e)}"
+            }), 500
+        except RuntimeError as re_e:
             return jsonify({
                 "success": False,
                 "data": None,
-                "message": "Elasticsearch URL未配置，请在配置管理中设置"
-            }), 400
+                "message": str(re_e)
+            }), 500
         
-        try:
-            import requests
-            
-            # 获取所有索引信息
-            indices_url = f"{elasticsearch_url}/_cat/indices?format=json&h=index,health,status,uuid,pri,rep,docs.count,docs.deleted,store.size,pri.store.size,creation.date,creation.date.string"
-            response = requests.get(indices_url, timeout=10)
-            
-            if response.status_code == 200:
-                indices_data = response.json()
-                
-                # 过滤日志相关索引
-                log_indices = []
-                for index in indices_data:
-                    index_name = index.get('index', '')
-                    # 过滤系统索引和非日志索引
-                    if not index_name.startswith('.') and ('log' in index_name.lower() or 'filebeat' in index_name.lower() or 'metricbeat' in index_name.lower()):
-                        log_indices.append({
-                            "index": index_name,
-                            "health": index.get('health', 'unknown'),
-                            "status": index.get('status', 'unknown'),
-                            "uuid": index.get('uuid', ''),
-                            "pri": index.get('pri', '0'),
-                            "rep": index.get('rep', '0'),
-                            "docs_count": int(index.get('docs.count', 0)) if index.get('docs.count', '0').isdigit() else 0,
-                            "docs_deleted": int(index.get('docs.deleted', 0)) if index.get('docs.deleted', '0').isdigit() else 0,
-                            "size": index.get('store.size', '0b'),
-                            "pri_store_size": index.get('pri.store.size', '0b'),
-                            "creation_date": index.get('creation.date', ''),
-                            "creation_date_string": index.get('creation.date.string', '')
-                        })
-                
-                # 按索引名称排序
-                log_indices.sort(key=lambda x: x['index'], reverse=True)
-                
+        status = catalog.status()
+        
+        # 增量同步
+        if since is not None:
+            changes = catalog.changes_since(since)
+            if changes is not None:
+                revision, upserted, removed = changes
+                if scope == 'log':
+                    upserted = [entry for entry in upserted if entry['is_log']]
                 return jsonify({
                     "success": True,
-                    "data": log_indices,
-                    "total": len(log_indices),
-                    "message": "索引列表获取成功"
+                    "data": upserted,
+                    "removed": removed,
+                    "full": False,
+                    "revision": revision,
+                    "last_refresh": status['last_refresh'],
+                    "message": "索引变更获取成功"
                 })
-            else:
-                return jsonify({
-                    "success": False,
-                    "data": None,
-                    "message": f"Elasticsearch查询失败: {response.status_code}"
-                }), 500
-                
-        except Exception as req_e:
-            if 'requests' in str(type(req_e)) or hasattr(req_e, '__module__') and 'requests' in str(req_e.__module__):
-                return jsonify({
-                    "success": False,
-                    "data": None,
-                    "message": f"连接Elasticsearch失败: {str(req_e)}"
-                }), 500
-            else:
-                raise req_e
+        
+        log_indices = catalog.query(search=search, scope=scope, health=health, sort=sort, order=order)
+        total = len(log_indices)
+        result = {
+            "success": True,
+            "full": True,
+            "revision": status['revision'],
+            "last_refresh": status['last_refresh'],
+            "total": total,
+            "message": "索引列表获取成功"
+        }
+        if page or page_size:
+            page = max(page or 1, 1)
+            page_size = min(max(page_size or 50, 1), 1000)
+            log_indices = log_indices[(page - 1) * page_size:page * page_size]
+            result.update({"page": page, "page_size": page_size})
+        result["data"] = log_indices
+        return jsonify(result)
         
     except Exception as e:
         return jsonify({
@@ -748,28 +912,58 @@ def get_log_indices():
             "message": f"获取索引列表失败: {str(e)}"
         }), 500
 
+def _parse_projection():
+    """解析 fields 参数为字段投影，返回 (投影, 错误响应)"""
+    try:
+        return FieldProjection.parse(request.args.get('fields', '')), None
+    except ValueError as ve:
+        return None, (jsonify({
+            "success": False,
+            "data": None,
+            "message": str(ve)
+        }), 400)
+
+def _stream_log_tail(index_pattern, filters, lookback, size, interval, mode, projection):
+    """订阅共享的实时日志通道，以 SSE 或 NDJSON 持续推送增量日志"""
+    hub = get_log_tail_hub()
+    channel, events = hub.subscribe(index_pattern, filters, lookback, size, interval, projection)
+    
+    def generate():
+        try:
+            if mode == 'sse':
+                yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event = events.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    # 心跳，保持连接并及时发现客户端断开
+                    yield ': keep-alive\n\n' if mode == 'sse' else '\n'
+                    continue
+                
+                if mode == 'sse':
+                    payload = json.dumps(event['data'], ensure_ascii=False)
+                    yield f"event: {event['type']}\ndata: {payload}\n\n"
+                elif event['type'] == 'logs':
+                    for log in event['data']:
+                        yield json.dumps(log, ensure_ascii=False) + '\n'
+                else:
+                    yield json.dumps({"error": event['data']['message']}, ensure_ascii=False) + '\n'
+        finally:
+            hub.unsubscribe(channel, events)
+    
+    mimetype = 'text/event-stream' if mode == 'sse' else 'application/x-ndjson'
+    return Response(generate(), mimetype=mimetype, headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/api/logs/stream', methods=['GET'])
 def get_log_stream():
     """获取实时日志流"""
     try:
-        # 检查Elasticsearch配置
-        config = load_config()
-        elk_config = config.get('monitoring', {}).get('elk', {})
-        
-        if not elk_config.get('enabled', False):
-            return jsonify({
-                "success": False,
-                "data": None,
-                "message": "ELK Stack未启用，请在配置管理中启用"
-            }), 400
-            
-        elasticsearch_url = elk_config.get('elasticsearch_url')
-        if not elasticsearch_url:
-            return jsonify({
-                "success": False,
-                "data": None,
-                "message": "Elasticsearch URL未配置，请在配置管理中设置"
-            }), 400
+        es, error_response = _get_es_client()
+        if error_response:
+            return error_response
         
         # 获取查询参数
         index_pattern = request.args.get('index', 'logstash-*')
@@ -778,8 +972,20 @@ def get_log_stream():
         service = request.args.get('service', 'all')
         size = int(request.args.get('size', 100))
         from_timestamp = request.args.get('from', 'now-5m')
+        projection, error_response = _parse_projection()
+        if error_response:
+            return error_response
         
-        import requests
+        # 过滤条件（级别、服务、全文检索，均为 filter 上下文）
+        clauses = QueryBuilder(es, index_pattern).log_filters(level, service, query)
+        
+        # 推送模式：SSE（EventSource 默认发送 Accept: text/event-stream）或分块 NDJSON
+        mode = request.args.get('mode', '')
+        if not mode and request.accept_mimetypes.best == 'text/event-stream':
+            mode = 'sse'
+        if mode in ('sse', 'ndjson'):
+            interval = min(max(request.args.get('interval', 2, type=float), 1.0), 60.0)
+            return _stream_log_tail(index_pattern, clauses, from_timestamp, size, interval, mode, projection)
         
         try:
             # 构建Elasticsearch查询
@@ -788,8 +994,7 @@ def get_log_stream():
                 "sort": [{"@timestamp": {"order": "desc"}}],
                 "query": {
                     "bool": {
-                        "must": [],
-                        "filter": [
+                        "filter": clauses + [
                             {
                                 "range": {
                                     "@timestamp": {
@@ -802,49 +1007,15 @@ def get_log_stream():
                 }
             }
             
-            # 日志级别过滤
-            if level != 'all':
-                query_body["query"]["bool"]["must"].append({
-                    "match": {"level": level}
-                })
-            
-            # 服务过滤
-            if service != 'all':
-                query_body["query"]["bool"]["must"].append({
-                    "match": {"service": service}
-                })
-            
-            # 查询过滤
-            if query:
-                query_body["query"]["bool"]["must"].append({
-                    "multi_match": {
-                        "query": query,
-                        "fields": ["message", "service", "source"]
-                    }
-                })
-            
             # 执行Elasticsearch查询
-            search_url = f"{elasticsearch_url}/{index_pattern}/_search"
-            response = requests.post(search_url, json=query_body, timeout=10)
+            target = resolve_index(index_pattern, relative_start_ms(from_timestamp))
+            response = es.search(target, projection.apply(query_body))
             
             if response.status_code == 200:
                 es_data = response.json()
                 hits = es_data.get('hits', {}).get('hits', [])
                 
-                logs = []
-                for hit in hits:
-                    source = hit.get('_source', {})
-                    logs.append({
-                        "id": hit.get('_id'),
-                        "timestamp": source.get('@timestamp', source.get('timestamp')),
-                        "level": source.get('level', 'INFO'),
-                        "service": source.get('service', source.get('container_name', 'unknown')),
-                        "message": source.get('message', source.get('log', '')),
-                        "source": source.get('source', source.get('source_type', 'unknown')),
-                        "index": hit.get('_index'),
-                        "host": source.get('host', {}),
-                        "fields": source
-                    })
+                logs = [projection.format(hit) for hit in hits]
                 
                 return jsonify({
                     "success": True,
@@ -860,15 +1031,12 @@ def get_log_stream():
                     "message": f"Elasticsearch查询失败: {response.status_code}"
                 }), 500
                 
-        except Exception as req_e:
-            if 'requests' in str(type(req_e)) or hasattr(req_e, '__module__') and 'requests' in str(req_e.__module__):
-                return jsonify({
-                    "success": False,
-                    "data": None,
-                    "message": f"连接Elasticsearch失败: {str(req_e)}"
-                }), 500
-            else:
-                raise req_e
+        except requests.exceptions.RequestException as req_e:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": f"连接Elasticsearch失败: {str(req_e)}"
+            }), 500
         
     except Exception as e:
         return jsonify({
@@ -877,28 +1045,206 @@ def get_log_stream():
             "message": f"获取实时日志失败: {str(e)}"
         }), 500
 
-@app.route('/api/logs', methods=['GET'])
-def get_logs():
-    """获取日志数据"""
+def _build_log_query(builder, time_range, range_start, level, service, match_pattern, size, use_pit=False):
+    """构建日志检索查询（附加唯一的排序决胜字段以支持search_after）
+    
+    在 PIT 内以 _shard_doc 决胜；不使用 PIT 时按 _id 决胜（_doc 跨分片/跨索引并不唯一）。
+    """
+    filters = []
+    
+    timestamp_field = builder.field('timestamp')
+    
+    # 时间范围过滤
+    if range_start is not None:
+        filters.append(time_range_filter(start_ms=range_start, field=timestamp_field))
+    elif time_range:
+        filters.append(time_range_filter(time_range=time_range, field=timestamp_field))
+    
+    # 级别、服务与匹配模式过滤
+    filters.extend(builder.log_filters(level, service, match_pattern))
+    
+    return {
+        "size": size,
+        "sort": [
+            {timestamp_field: {"order": "desc"}},
+            {"_shard_doc": "desc"} if use_pit else {"_id": "desc"}
+        ],
+        "query": {
+            "bool": {
+                "filter": filters
+            }
+        }
+    }
+
+def _parse_total(es_data):
+    """解析命中总数（兼容 ES 6 的整数形式）"""
+    total_hits = es_data.get('hits', {}).get('total', {})
+    if isinstance(total_hits, dict):
+        return total_hits.get('value', 0)
+    return total_hits
+
+def _parse_total_relation(es_data):
+    """命中总数是精确值（eq）还是下限（gte）"""
+    total_hits = es_data.get('hits', {}).get('total')
+    if total_hits is None:
+        return 'gte'  # 未计数
+    if isinstance(total_hits, dict):
+        return total_hits.get('relation', 'eq')
+    return 'eq'
+
+def _parse_track_total_hits():
+    """解析 track_total_hits 参数，返回 (取值, 错误响应)
+    
+    true 精确计数，false 不计数，正整数为计数上限；默认上限 DEFAULT_TRACK_TOTAL_HITS。
+    """
+    value = request.args.get('track_total_hits', '').strip().lower()
+    if not value:
+        return DEFAULT_TRACK_TOTAL_HITS, None
+    if value in ('true', 'exact'):
+        return True, None
+    if value == 'false':
+        return False, None
+    if value.isdigit() and int(value) > 0:
+        return int(value), None
+    return None, (jsonify({
+        "success": False,
+        "data": None,
+        "message": "track_total_hits 必须是 true、false 或正整数"
+    }), 400)
+
+def _estimate_total(es, index_pattern, time_range, range_start, level, service, match_pattern):
+    """由趋势缓存估算命中总数，无法估算时返回 None
+    
+    只使用已缓存的统计桶，不额外查询 ES；趋势缓存不区分服务与全文检索条件，
+    带这些条件时不做估算。指定级别时按桶内的级别分布求和。
+    """
+    duration = parse_duration_ms(time_range)
+    if not duration or range_start is None or (service and service != 'all') or match_pattern:
+        return None
+    interval = stats_interval(duration)
+    interval_ms = fixed_interval_ms(interval)
+    trend_cache = get_trend_cache()
+    key = trend_cache.series_key(index_pattern, interval, QueryBuilder(es, index_pattern).level_field(), [])
+    if not trend_cache.covers(key, interval_ms, range_start):
+        return None
+    buckets = trend_cache.buckets(key, interval_ms, range_start)
+    if level and level != 'all':
+        return sum(bucket['levels'].get(level.upper(), 0) for _, bucket in buckets)
+    return sum(bucket['total'] for _, bucket in buckets)
+
+def _search_log_targets(es, indices, targets_json, match_pattern, level, service, time_range, size,
+                        cursor, projection, track_total_hits, use_pit=False):
+    """多索引目标检索：有界线程池并发查询各目标，按时间戳堆归并为一页
+    
+    单个目标超时或失败时返回其余目标的结果，并在 targets 中报告各目标状态；
+    失败的目标标记为 stale，之后的翻页不再查询该目标。
+    游标记录每个目标各自的 search_after 位置；use_pit 时每个目标在各自的 PIT 内翻页，
+    游标同时记录各目标的 PIT。
+    """
     try:
-        # 检查Elasticsearch配置
-        config = load_config()
-        elk_config = config.get('monitoring', {}).get('elk', {})
-        
-        if not elk_config.get('enabled', False):
+        targets = parse_targets(indices, targets_json)
+    except ValueError as ve:
+        return jsonify({
+            "success": False,
+            "data": None,
+            "message": str(ve)
+        }), 400
+    
+    fingerprint = query_fingerprint({
+        "targets": [target.to_dict() for target in targets],
+        "match_pattern": match_pattern,
+        "level": level,
+        "service": service,
+        "time_range": time_range
+    })
+    cursor_state = None
+    if cursor:
+        try:
+            cursor_state = decode_cursor(cursor)
+        except ValueError as ve:
             return jsonify({
                 "success": False,
                 "data": None,
-                "message": "ELK Stack未启用，请在配置管理中启用"
+                "message": str(ve)
             }), 400
-            
-        elasticsearch_url = elk_config.get('elasticsearch_url')
-        if not elasticsearch_url:
+        if (cursor_state['f'] != fingerprint or len(cursor_state['s']) != len(targets)
+                or not all(isinstance(state, dict) and 'done' in state for state in cursor_state['s'])):
             return jsonify({
                 "success": False,
                 "data": None,
-                "message": "Elasticsearch URL未配置，请在配置管理中设置"
+                "message": "分页游标与查询条件不匹配"
             }), 400
+    
+    if cursor_state:
+        range_start = cursor_state['r']
+        states = cursor_state['s']
+    else:
+        duration = parse_duration_ms(time_range)
+        range_start = now_ms() - duration if duration else None
+        states = [{"after": None, "done": False, "pit": None} for _ in targets]
+    
+    def build(i, target, after):
+        # 首页按请求决定是否使用 PIT，后续页沿用该目标首页的模式（排序决胜字段需保持一致）
+        target_pit = use_pit if after is None else states[i].get('pit') is not None
+        builder = QueryBuilder(es, target.index, field_map=target.fields)
+        body = projection.apply(_build_log_query(builder, time_range, range_start, level, service,
+                                                 match_pattern, size, use_pit=target_pit))
+        if target.fields and "includes" in body.get("_source", {}):
+            body["_source"]["includes"] = body["_source"]["includes"] + target.source_fields()
+        if after is not None:
+            body["search_after"] = after
+            body["track_total_hits"] = False
+        else:
+            body["track_total_hits"] = track_total_hits
+        return resolve_index(target.index, range_start), body
+    
+    timeout = min(max(request.args.get('timeout', DEFAULT_TARGET_TIMEOUT, type=float), 1.0), MAX_TARGET_TIMEOUT)
+    merged, states, reports = multi_search(es, targets, states, build, size, timeout, use_pit=use_pit)
+    
+    logs = [targets[i].remap(projection.format(hit), hit) for i, hit in merged]
+    if cursor_state and cursor_state.get('t') is not None:
+        total = cursor_state['t']
+        total_relation = cursor_state.get('tr', 'eq')
+    else:
+        total = sum(report.get('total') or 0 for report in reports)
+        partial_total = any(report.get('total_relation', 'eq') != 'eq' or report['status'] != 'ok'
+                            for report in reports if report['status'] != 'done')
+        total_relation = 'gte' if partial_total else 'eq'
+    
+    partial = any(report.get('stale') or report.get('timed_out') for report in reports)
+    if not logs and reports and all(report.get('stale') for report in reports):
+        return jsonify({
+            "success": False,
+            "data": None,
+            "targets": reports,
+            "message": "所有索引目标查询失败"
+        }), 502
+    
+    has_more = not all(state['done'] for state in states)
+    next_cursor = encode_cursor(states, fingerprint, range_start, total=total,
+                                total_relation=total_relation) if has_more else None
+    
+    return jsonify({
+        "success": True,
+        "data": logs,
+        "total": total,
+        "filtered": len(logs),
+        "total_relation": total_relation,
+        "index_pattern": ','.join(target.index for target in targets),
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+        "partial": partial,
+        "targets": reports,
+        "message": "日志获取成功（部分索引未返回结果）" if partial else "日志获取成功"
+    })
+
+@app.route('/api/logs', methods=['GET'])
+def get_logs():
+    """获取日志数据"""
+    try:
+        es, error_response = _get_es_client()
+        if error_response:
+            return error_response
         
         # 获取查询参数
         match_pattern = request.args.get('match_pattern', '')
@@ -907,88 +1253,129 @@ def get_logs():
         time_range = request.args.get('time_range', '24h')
         index_pattern = request.args.get('index', 'logstash-*')
         size = int(request.args.get('size', 100))
+        cursor = request.args.get('cursor', '')
+        # 需要稳定快照的调用方显式开启 PIT；自动刷新等不翻页的请求不创建 PIT
+        use_pit = request.args.get('pit', 'false').lower() in ('1', 'true', 'yes')
+        projection, error_response = _parse_projection()
+        if error_response:
+            return error_response
+        track_total_hits, error_response = _parse_track_total_hits()
+        if error_response:
+            return error_response
+        
+        # 多个索引目标：并发检索并按时间戳归并
+        indices = request.args.getlist('index')
+        targets_json = request.args.get('targets', '')
+        if targets_json or len(indices) > 1:
+            return _search_log_targets(es, indices, targets_json, match_pattern, level, service,
+                                       time_range, size, cursor, projection, track_total_hits, use_pit)
+        
+        # 游标只能用于生成它的查询条件
+        fingerprint = query_fingerprint({
+            "index": index_pattern,
+            "match_pattern": match_pattern,
+            "level": level,
+            "service": service,
+            "time_range": time_range
+        })
+        cursor_state = None
+        if cursor:
+            try:
+                cursor_state = decode_cursor(cursor)
+            except ValueError as ve:
+                return jsonify({
+                    "success": False,
+                    "data": None,
+                    "message": str(ve)
+                }), 400
+            if cursor_state['f'] != fingerprint:
+                return jsonify({
+                    "success": False,
+                    "data": None,
+                    "message": "分页游标与查询条件不匹配"
+                }), 400
+        
+        # 首页将相对时间解析为绝对下界，后续页沿用，避免翻页时窗口漂移
+        if cursor_state:
+            range_start = cursor_state['r']
+        else:
+            duration = parse_duration_ms(time_range)
+            range_start = now_ms() - duration if duration else None
         
+        pit_id = None
+        release_pit = True  # 除非返回了下一页游标，否则请求结束时释放PIT
         try:
-            import requests
-            
-            # 构建Elasticsearch查询
-            query_body = {
-                "size": size,
-                "sort": [{"@timestamp": {"order": "desc"}}],
-                "query": {
-                    "bool": {
-                        "must": [],
-                        "filter": []
-                    }
-                }
-            }
-            
-            # 时间范围过滤
-            if time_range:
-                query_body["query"]["bool"]["filter"].append({
-                    "range": {
-                        "@timestamp": {
-                            "gte": f"now-{time_range}"
-                        }
-                    }
-                })
-            
-            # 日志级别过滤
-            if level != 'all':
-                query_body["query"]["bool"]["must"].append({
-                    "match": {"level": level}
-                })
+            # 游标沿用首页的模式：带 PIT 的游标继续在该 PIT 内翻页
+            if cursor_state:
+                pit_id = cursor_state.get('p')
+            elif use_pit:
+                pit_id = es.open_point_in_time(resolve_index(index_pattern, range_start), PIT_KEEP_ALIVE)
             
-            # 服务过滤
-            if service != 'all':
-                query_body["query"]["bool"]["must"].append({
-                    "match": {"service": service}
-                })
+            query_body = _build_log_query(QueryBuilder(es, index_pattern), time_range, range_start,
+                                          level, service, match_pattern,
+                                          size, use_pit=pit_id is not None)
+            projection.apply(query_body)
             
-            # 匹配模式过滤
-            if match_pattern:
-                query_body["query"]["bool"]["must"].append({
-                    "multi_match": {
-                        "query": match_pattern,
-                        "fields": ["message", "service", "source"]
-                    }
-                })
+            # 翻页时从上一页最后一条之后继续，总数沿用首页结果；首页只计数到上限
+            if cursor_state:
+                query_body["search_after"] = cursor_state['s']
+                if cursor_state.get('t') is not None:
+                    query_body["track_total_hits"] = False
+            else:
+                query_body["track_total_hits"] = track_total_hits
             
             # 执行Elasticsearch查询
-            search_url = f"{elasticsearch_url}/{index_pattern}/_search"
-            response = requests.post(search_url, json=query_body, timeout=10)
+            if pit_id:
+                query_body["pit"] = {"id": pit_id, "keep_alive": PIT_KEEP_ALIVE}
+                response = es.search(None, query_body)
+            else:
+                response = es.search(resolve_index(index_pattern, range_start), query_body)
+            
+            if response.status_code == 404 and pit_id:
+                return jsonify({
+                    "success": False,
+                    "data": None,
+                    "message": "分页游标已过期，请重新查询"
+                }), 410
             
             if response.status_code == 200:
                 es_data = response.json()
                 hits = es_data.get('hits', {}).get('hits', [])
                 
-                logs = []
-                for hit in hits:
-                    source = hit.get('_source', {})
-                    logs.append({
-                        "id": hit.get('_id'),
-                        "timestamp": source.get('@timestamp', source.get('timestamp')),
-                        "level": source.get('level', 'INFO'),
-                        "service": source.get('service', source.get('container_name', 'unknown')),
-                        "message": source.get('message', source.get('log', '')),
-                        "source": source.get('source', source.get('source_type', 'unknown')),
-                        "index": hit.get('_index'),
-                        "host": source.get('host', {}),
-                        "fields": source
-                    })
+                logs = [projection.format(hit) for hit in hits]
                 
-                total_hits = es_data.get('hits', {}).get('total', {})
-                if isinstance(total_hits, dict):
-                    total = total_hits.get('value', 0)
+                if cursor_state and cursor_state.get('t') is not None:
+                    total = cursor_state['t']
+                    total_relation = cursor_state.get('tr', 'eq')
                 else:
-                    total = total_hits
+                    total = _parse_total(es_data)
+                    total_relation = _parse_total_relation(es_data)
+                
+                # 生成下一页游标；结果已取完时释放PIT
+                if pit_id:
+                    pit_id = es_data.get('pit_id', pit_id)
+                next_cursor = None
+                if hits and len(hits) >= size and hits[-1].get('sort'):
+                    next_cursor = encode_cursor(hits[-1]['sort'], fingerprint, range_start,
+                                                pit_id=pit_id, total=total, total_relation=total_relation)
+                    release_pit = False
+                
+                # 总数只是下限时，由趋势缓存给出估算值
+                estimated_total = None
+                if total_relation != 'eq':
+                    estimated_total = _estimate_total(es, index_pattern, time_range, range_start,
+                                                      level, service, match_pattern)
                 
                 return jsonify({
                     "success": True,
                     "data": logs,
                     "total": total,
+                    "total_relation": total_relation,
+                    "estimated_total": estimated_total,
                     "filtered": len(logs),
                     "index_pattern": index_pattern,
+                    "next_cursor": next_cursor,
+                    "has_more": next_cursor is not None,
                     "message": "日志获取成功"
                 })
             else:
@@ -998,15 +1385,15 @@ def get_logs():
                     "message": f"Elasticsearch查询失败: {response.status_code}"
                 }), 500
                 
-        except Exception as req_e:
-            if 'requests' in str(type(req_e)) or hasattr(req_e, '__module__') and 'requests' in str(req_e.__module__):
-                return jsonify({
-                    "success": False,
-                    "data": None,
-                    "message": f"连接Elasticsearch失败: {str(req_e)}"
-                }), 500
-            else:
-                raise req_e
+        except requests.exceptions.RequestException as req_e:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": f"连接Elasticsearch失败: {str(req_e)}"
+            }), 500
+        finally:
+            if pit_id and release_pit:
+                es.close_point_in_time(pit_id)
         
     except Exception as e:
         return jsonify({
@@ -1015,350 +1402,1325 @@ def get_logs():
             "message": f"获取日志失败: {str(e)}"
         }), 500
 
-@app.route('/api/logs/stats', methods=['GET'])
-def get_log_stats():
-    """获取日志统计信息"""
+@app.route('/api/logs/export', methods=['GET'])
+def export_logs():
+    """流式导出匹配的日志（NDJSON/CSV），基于 PIT + search_after 分批拉取"""
     try:
-        # 检查Elasticsearch配置
-        config = load_config()
-        elk_config = config.get('monitoring', {}).get('elk', {})
+        es, error_response = _get_es_client()
+        if error_response:
+            return error_response
+        
+        # 获取查询参数
+        match_pattern = request.args.get('match_pattern', '')
+        level = request.args.get('level', 'all')
+        service = request.args.get('service', 'all')
+        time_range = request.args.get('time_range', '24h')
+        index_pattern = request.args.get('index', 'logstash-*')
+        export_format = request.args.get('format', 'ndjson').lower()
+        compress = request.args.get('compress', '').lower() == 'gzip'
+        columns = [c.strip() for c in request.args.get('columns', '').split(',') if c.strip()] or None
+        max_rows = min(max(request.args.get('max_rows', DEFAULT_MAX_ROWS, type=int), 1), EXPORT_MAX_ROWS)
         
-        if not elk_config.get('enabled', False):
+        if export_format not in EXPORT_FORMATS:
             return jsonify({
                 "success": False,
                 "data": None,
-                "message": "ELK Stack未启用，请在配置管理中启用"
+                "message": f"不支持的导出格式: {export_format}"
             }), 400
-            
-        elasticsearch_url = elk_config.get('elasticsearch_url')
-        if not elasticsearch_url:
+        try:
+            export_projection(columns or [])
+        except ValueError as ve:
             return jsonify({
                 "success": False,
                 "data": None,
-                "message": "Elasticsearch URL未配置，请在配置管理中设置"
+                "message": str(ve)
             }), 400
         
-        import requests
+        # 导出窗口在开始时固定为绝对时间，PIT 保证分批期间数据视图一致
+        duration = parse_duration_ms(time_range)
+        range_start = now_ms() - duration if duration else None
+        base_body = _build_log_query(QueryBuilder(es, index_pattern), time_range, range_start,
+                                     level, service, match_pattern, 0)
         
         try:
-            # 获取查询参数
-            time_range = request.args.get('time_range', '24h')
-            index_pattern = request.args.get('index', 'logstash-*')
-            
-            # 构建Elasticsearch聚合查询
-            query_body = {
-                "size": 0,
-                "query": {
-                    "bool": {
-                        "filter": [
-                            {
-                                "range": {
-                                    "@timestamp": {
-                                        "gte": f"now-{time_range}"
-                                    }
-                                }
-                            }
-                        ]
-                    }
+            pit_id = es.open_point_in_time(resolve_index(index_pattern, range_start), PIT_KEEP_ALIVE)
+        except requests.exceptions.RequestException as req_e:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": f"连接Elasticsearch失败: {str(req_e)}"
+            }), 500
+        
+        exporter = LogExporter(es, pit_id, base_body, columns, export_format, max_rows, compress)
+        
+        filename = f"logs-{datetime.now().strftime('%Y%m%d%H%M%S')}.{export_format}"
+        if compress:
+            filename += '.gz'
+            mimetype = 'application/gzip'
+        else:
+            mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+        
+        response = Response(exporter, mimetype=mimetype, headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+        # 客户端中途断开或迭代未开始时也释放 PIT
+        response.call_on_close(exporter.close)
+        return response
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "data": None,
+            "message": f"导出日志失败: {str(e)}"
+        }), 500
+
+@app.route('/api/logs/patterns', methods=['GET'])
+def get_log_patterns():
+    """挖掘匹配日志的消息模板，把重复的日志折叠为模板与计数"""
+    try:
+        es, error_response = _get_es_client()
+        if error_response:
+            return error_response
+        
+        match_pattern = request.args.get('match_pattern', '')
+        level = request.args.get('level', 'all')
+        service = request.args.get('service', 'all')
+        time_range = request.args.get('time_range', '1h')
+        index_pattern = request.args.get('index', 'logstash-*')
+        size = min(max(request.args.get('size', DEFAULT_PATTERN_SAMPLE, type=int), 1), MAX_PATTERN_SAMPLE)
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+        
+        duration = parse_duration_ms(time_range)
+        range_start = now_ms() - duration if duration else None
+        builder = QueryBuilder(es, index_pattern)
+        query_body = _build_log_query(builder, time_range, range_start, level, service, match_pattern, size)
+        # 只需要消息、时间与级别
+        query_body["_source"] = {"includes": PATTERN_SOURCE_FIELDS}
+        query_body["track_total_hits"] = False
+        
+        try:
+            response = es.search(resolve_index(index_pattern, range_start), query_body)
+        except requests.exceptions.RequestException as req_e:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": f"连接Elasticsearch失败: {str(req_e)}"
+            }), 500
+        if response.status_code != 200:
+            return _es_error_response(response)
+        
+        hits = response.json().get('hits', {}).get('hits', [])
+        items = [format_log_hit(hit, include_source=False) for hit in hits]
+        miner = get_pattern_miner_registry().get(index_pattern)
+        patterns = summarize_patterns(miner, items)
+        
+        return jsonify({
+            "success": True,
+            "data": patterns[:limit],
+            "total_patterns": len(patterns),
+            "sampled": len(items),
+            "index_pattern": index_pattern,
+            "miner": miner.stats(),
+            "message": "日志模板获取成功"
+        })
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "data": None,
+            "message": f"获取日志模板失败: {str(e)}"
+        }), 500
+
+def _async_search_payload(entry, es_data):
+    """将 _async_search 响应转换为日志结果（运行中时为部分结果）"""
+    response = es_data.get('response', {})
+    hits = response.get('hits', {}).get('hits', [])
+    total_hits = response.get('hits', {}).get('total', {})
+    is_running = es_data.get('is_running', False)
+    entry.completed = not is_running
+    buckets = sorted(parse_histogram_buckets(response).items())
+    _, level_counts = _stats_from_buckets(buckets)
+    return {
+        "id": entry.id,
+        "is_running": is_running,
+        "is_partial": es_data.get('is_partial', False),
+        "start_time": es_data.get('start_time_in_millis'),
+        "expiration_time": es_data.get('expiration_time_in_millis'),
+        "data": [entry.projection.format(hit) for hit in hits],
+        "total": _parse_total(response),
+        "total_relation": total_hits.get('relation', 'eq') if isinstance(total_hits, dict) else 'eq',
+        "levels": level_counts,
+        "trends": _trend_rows(buckets),
+        "shards": response.get('_shards'),
+        "index_pattern": entry.index
+    }
+
+@app.route('/api/logs/async', methods=['POST'])
+def submit_async_log_search():
+    """提交异步日志检索（适合 7d/30d 等长时间范围），立即返回检索 id"""
+    try:
+        es, error_response = _get_es_client()
+        if error_response:
+            return error_response
+        
+        match_pattern = request.args.get('match_pattern', '')
+        level = request.args.get('level', 'all')
+        service = request.args.get('service', 'all')
+        time_range = request.args.get('time_range', '7d')
+        index_pattern = request.args.get('index', 'logstash-*')
+        size = min(max(request.args.get('size', 100, type=int), 0), 1000)
+        projection, error_response = _parse_projection()
+        if error_response:
+            return error_response
+        
+        registry = get_async_search_registry()
+        if registry.full():
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": "进行中的异步检索过多，请稍后重试"
+            }), 429
+        
+        duration = parse_duration_ms(time_range)
+        range_start = now_ms() - duration if duration else None
+        builder = QueryBuilder(es, index_pattern)
+        query_body = projection.apply(_build_log_query(builder, time_range, range_start, level, service,
+                                                       match_pattern, size))
+        query_body["track_total_hits"] = True
+        query_body["aggs"] = {
+            "time_series": {
+                "date_histogram": {
+                    "field": builder.field('timestamp'),
+                    "fixed_interval": stats_interval(duration) if duration else '1h',
+                    "min_doc_count": 0
                 },
                 "aggs": {
-                    "log_levels": {
-                        "terms": {
-                            "field": "level.keyword",
-                            "size": 10
-                        }
-                    },
-                    "services": {
-                        "cardinality": {
-                            "field": "service.keyword"
-                        }
-                    }
+                    "log_levels": _level_terms_agg(builder.level_field())
                 }
             }
-            
-            # 执行Elasticsearch查询
-            search_url = f"{elasticsearch_url}/{index_pattern}/_search"
-            response = requests.post(search_url, json=query_body, timeout=10)
-            
-            if response.status_code == 200:
-                es_data = response.json()
-                
-                # 获取总日志数
-                total_hits = es_data.get('hits', {}).get('total', {})
-                if isinstance(total_hits, dict):
-                    total_logs = total_hits.get('value', 0)
-                else:
-                    total_logs = total_hits
-                
-                # 获取日志级别统计
-                level_buckets = es_data.get('aggregations', {}).get('log_levels', {}).get('buckets', [])
-                error_logs = 0
-                warning_logs = 0
-                
-                for bucket in level_buckets:
-                    level = bucket.get('key', '').upper()
-                    count = bucket.get('doc_count', 0)
-                    if level in ['ERROR', 'FATAL']:
-                        error_logs += count
-                    elif level in ['WARN', 'WARNING']:
-                        warning_logs += count
-                
-                # 获取活跃服务数
-                active_services = es_data.get('aggregations', {}).get('services', {}).get('value', 0)
-                
+        }
+        
+        try:
+            response = es.submit_async_search(resolve_index(index_pattern, range_start), query_body,
+                                              wait_timeout=SUBMIT_WAIT_TIMEOUT, keep_alive=ASYNC_KEEP_ALIVE)
+        except requests.exceptions.RequestException as req_e:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": f"连接Elasticsearch失败: {str(req_e)}"
+            }), 500
+        if response.status_code != 200:
+            return _es_error_response(response)
+        
+        es_data = response.json()
+        entry = registry.register(es, es_data['id'], index_pattern, projection, {
+            "match_pattern": match_pattern,
+            "level": level,
+            "service": service,
+            "time_range": time_range,
+            "size": size
+        })
+        
+        return jsonify({
+            "success": True,
+            "data": _async_search_payload(entry, es_data),
+            "message": "异步检索已提交"
+        })
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "data": None,
+            "message": f"提交异步检索失败: {str(e)}"
+        }), 500
+
+@app.route('/api/logs/async/<path:search_id>', methods=['GET'])
+def poll_async_log_search(search_id):
+    """轮询异步日志检索，返回当前已有的（部分）结果"""
+    try:
+        es, error_response = _get_es_client()
+        if error_response:
+            return error_response
+        
+        entry = get_async_search_registry().touch(search_id)
+        if entry is None:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": "异步检索不存在或已过期"
+            }), 404
+        
+        wait = min(max(request.args.get('wait', 1, type=float), 0), MAX_POLL_WAIT)
+        try:
+            response = entry.es.get_async_search(search_id, wait_timeout=f"{int(wait * 1000)}ms",
+                                                 keep_alive=ASYNC_KEEP_ALIVE)
+        except requests.exceptions.RequestException as req_e:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": f"连接Elasticsearch失败: {str(req_e)}"
+            }), 500
+        if response.status_code == 404:
+            get_async_search_registry().remove(search_id)
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": "异步检索不存在或已过期"
+            }), 404
+        if response.status_code != 200:
+            return _es_error_response(response)
+        
+        return jsonify({
+            "success": True,
+            "data": _async_search_payload(entry, response.json()),
+            "message": "异步检索结果获取成功"
+        })
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "data": None,
+            "message": f"获取异步检索结果失败: {str(e)}"
+        }), 500
+
+@app.route('/api/logs/async/<path:search_id>', methods=['DELETE'])
+def cancel_async_log_search(search_id):
+    """取消异步日志检索（仍在运行时终止 ES 任务）并释放结果"""
+    try:
+        entry = get_async_search_registry().remove(search_id)
+        if entry is None:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": "异步检索不存在或已过期"
+            }), 404
+        
+        deleted = entry.es.delete_async_search(search_id)
+        return jsonify({
+            "success": True,
+            "data": {"id": search_id, "deleted": deleted},
+            "message": "异步检索已取消"
+        })
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "data": None,
+            "message": f"取消异步检索失败: {str(e)}"
+        }), 500
+
+def _parse_ingest_records():
+    """解析写入请求体：JSON 数组（或单个对象）与 NDJSON，格式非法时抛出 ValueError"""
+    raw = request.get_data(cache=False)
+    if not raw.strip():
+        raise ValueError("请求体为空")
+    text = raw.decode('utf-8')
+    if request.mimetype == 'application/json' or text.lstrip()[:1] == '[':
+        records = json.loads(text)
+        return records if isinstance(records, list) else [records]
+    records = []
+    for line_number, line in enumerate(text.splitlines(), 1):
+        if line.strip():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                raise ValueError(f"第 {line_number} 行不是有效的JSON")
+    return records
+
+@app.route('/api/logs/ingest', methods=['POST'])
+def ingest_logs():
+    """接收日志（NDJSON 或 JSON 数组），缓冲后由后台批量写入 ES"""
+    try:
+        es, error_response = _get_es_client()
+        if error_response:
+            return error_response
+        
+        if request.content_length and request.content_length > MAX_INGEST_REQUEST_BYTES:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": f"请求体超过 {MAX_INGEST_REQUEST_BYTES // (1024 * 1024)}MB 限制"
+            }), 413
+        
+        index = request.args.get('index', '').strip()
+        if index and not INGEST_INDEX_PATTERN.match(index):
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": f"无效的索引名称: {index}"
+            }), 400
+        
+        try:
+            records = _parse_ingest_records()
+        except (ValueError, UnicodeDecodeError) as ve:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": f"日志格式错误: {str(ve)}"
+            }), 400
+        if len(records) > MAX_INGEST_REQUEST_DOCS:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": f"单次最多写入 {MAX_INGEST_REQUEST_DOCS} 条日志"
+            }), 413
+        
+        target_index = resolve_ingest_index(index or None)
+        ingestor = get_log_ingestor()
+        try:
+            accepted = ingestor.offer(target_index, records)
+        except ValueError as ve:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": f"日志格式错误: {str(ve)}"
+            }), 400
+        
+        if not accepted:
+            response = jsonify({
+                "success": False,
+                "data": None,
+                "message": "写入队列已满，请稍后重试"
+            })
+            response.headers['Retry-After'] = '1'
+            return response, 429
+        
+        return jsonify({
+            "success": True,
+            "data": {"accepted": len(records), "index": target_index},
+            "message": "日志已接收"
+        }), 202
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "data": None,
+            "message": f"接收日志失败: {str(e)}"
+        }), 500
+
+@app.route('/api/logs/ingest/stats', methods=['GET'])
+def get_ingest_stats():
+    """获取日志写入队列与批量写入统计"""
+    try:
+        return jsonify({
+            "success": True,
+            "data": get_log_ingestor().stats(),
+            "message": "写入统计获取成功"
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "data": None,
+            "message": f"获取写入统计失败: {str(e)}"
+        }), 500
+
+def _facets_body(builder, facet_fields, time_range, level, service, match_pattern, size, sample):
+    """构建字段分布聚合：terms 取前 N 个值，cardinality 估算不同值数量
+    
+    抽样时 terms 聚合放在 sampler 下，每个分片只统计前 FACET_SAMPLE_SHARD_SIZE 条，
+    cardinality 仍统计整个窗口（HyperLogLog 内存有界）。
+    """
+    query_body = _build_log_query(builder, time_range, None, level, service, match_pattern, 0)
+    query_body.pop("sort", None)
+    query_body["track_total_hits"] = True
+    
+    terms_aggs = {}
+    aggs = {}
+    for i, (_, agg_field) in enumerate(facet_fields):
+        if agg_field is None:
+            continue
+        terms_aggs[f"f{i}"] = {"terms": {"field": agg_field, "size": size}}
+        aggs[f"f{i}_cardinality"] = {"cardinality": {"field": agg_field}}
+    if sample:
+        aggs["sample"] = {
+            "sampler": {"shard_size": FACET_SAMPLE_SHARD_SIZE},
+            "aggs": terms_aggs
+        }
+    else:
+        aggs.update(terms_aggs)
+    query_body["aggs"] = aggs
+    return query_body
+
+def _parse_facets(es_data, facet_fields, sample):
+    """解析字段分布聚合结果"""
+    aggregations = es_data.get('aggregations', {})
+    terms_source = aggregations.get('sample', {}) if sample else aggregations
+    facets = []
+    for i, (field, agg_field) in enumerate(facet_fields):
+        if agg_field is None:
+            facets.append({
+                "field": field,
+                "agg_field": None,
+                "values": [],
+                "cardinality": None,
+                "error": "字段不存在或不可聚合（需要 keyword 类型）"
+            })
+            continue
+        terms = terms_source.get(f"f{i}", {})
+        facets.append({
+            "field": field,
+            "agg_field": agg_field,
+            "values": [
+                {"value": bucket.get('key_as_string', bucket.get('key')), "count": bucket.get('doc_count', 0)}
+                for bucket in terms.get('buckets', [])
+            ],
+            "other_count": terms.get('sum_other_doc_count', 0),
+            "cardinality": aggregations.get(f"f{i}_cardinality", {}).get('value')
+        })
+    return facets
+
+@app.route('/api/logs/facets', methods=['GET'])
+def get_log_facets():
+    """获取当前查询条件下若干字段的分布（前 N 个值与不同值数量）"""
+    try:
+        es, error_response = _get_es_client()
+        if error_response:
+            return error_response
+        
+        match_pattern = request.args.get('match_pattern', '')
+        level = request.args.get('level', 'all')
+        service = request.args.get('service', 'all')
+        time_range = request.args.get('time_range', '24h')
+        index_pattern = request.args.get('index', 'logstash-*')
+        size = min(max(request.args.get('size', 10, type=int), 1), 100)
+        sample_mode = request.args.get('sample', 'auto').lower()
+        
+        fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+        fields = list(dict.fromkeys(fields or DEFAULT_FACET_FIELDS))
+        if len(fields) > MAX_FACET_FIELDS:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": f"最多同时统计 {MAX_FACET_FIELDS} 个字段"
+            }), 400
+        for field in fields:
+            if not FACET_FIELD_PATTERN.match(field):
                 return jsonify({
-                    "success": True,
-                    "data": {
-                        "totalLogs": total_logs,
-                        "errorLogs": error_logs,
-                        "warningLogs": warning_logs,
-                        "activeServices": active_services
-                    },
-                    "message": "日志统计获取成功"
+                    "success": False,
+                    "data": None,
+                    "message": f"无效的字段名: {field}"
+                }), 400
+        
+        duration = parse_duration_ms(time_range)
+        if sample_mode in ('true', '1', 'yes'):
+            sample = True
+        elif sample_mode in ('false', '0', 'no'):
+            sample = False
+        else:
+            sample = duration is None or duration > FACET_SAMPLER_THRESHOLD_MS
+        
+        # 相对时间窗口按分钟取整，同一分钟内相同条件的请求直接命中缓存
+        window = round_down(now_ms(), FACET_CACHE_ROUNDING_MS)
+        cache_key = (query_fingerprint({
+            "index": index_pattern,
+            "match_pattern": match_pattern,
+            "level": level,
+            "service": service,
+            "time_range": time_range,
+            "fields": fields,
+            "size": size,
+            "sample": sample
+        }), window)
+        cached = _facet_cache.get(cache_key)
+        if cached is not None:
+            return jsonify(dict(cached, cached=True))
+        
+        builder = QueryBuilder(es, index_pattern)
+        facet_fields = [(field, builder.exact_field(field)) for field in fields]
+        query_body = _facets_body(builder, facet_fields, time_range, level, service, match_pattern, size, sample)
+        range_start = window - duration if duration else None
+        
+        try:
+            response = es.search(resolve_index(index_pattern, range_start), query_body)
+        except requests.exceptions.RequestException as req_e:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": f"连接Elasticsearch失败: {str(req_e)}"
+            }), 500
+        if response.status_code != 200:
+            return _es_error_response(response)
+        
+        es_data = response.json()
+        payload = {
+            "success": True,
+            "data": _parse_facets(es_data, facet_fields, sample),
+            "total": _parse_total(es_data),
+            "sampled": sample,
+            "sample_doc_count": es_data.get('aggregations', {}).get('sample', {}).get('doc_count') if sample else None,
+            "index_pattern": index_pattern,
+            "message": "字段分布获取成功"
+        }
+        _facet_cache.set(cache_key, payload)
+        return jsonify(dict(payload, cached=False))
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "data": None,
+            "message": f"获取字段分布失败: {str(e)}"
+        }), 500
+
+@app.route('/api/logs/<index>/<doc_id>', methods=['GET'])
+def get_log_detail(index, doc_id):
+    """获取单条日志的完整内容（列表接口默认只返回紧凑投影）"""
+    try:
+        es, error_response = _get_es_client()
+        if error_response:
+            return error_response
+        
+        try:
+            if any(c in index for c in '*,'):
+                # 索引模式无法使用 _doc 接口，按 id 查询
+                response = es.search(index, {
+                    "size": 1,
+                    "query": {"ids": {"values": [doc_id]}}
                 })
+                if response.status_code != 200:
+                    return _es_error_response(response)
+                hits = response.json().get('hits', {}).get('hits', [])
+                hit = hits[0] if hits else None
             else:
+                response = es.get(f"/{quote(index, safe='')}/_doc/{quote(doc_id, safe='')}")
+                if response.status_code not in (200, 404):
+                    return _es_error_response(response)
+                hit = response.json()
+                if not hit.get('found'):
+                    hit = None
+            
+            if hit is None:
                 return jsonify({
                     "success": False,
                     "data": None,
-                    "message": f"Elasticsearch查询失败: {response.status_code}"
-                }), 500
+                    "message": "日志不存在"
+                }), 404
+            
+            return jsonify({
+                "success": True,
+                "data": format_log_hit(hit),
+                "message": "日志详情获取成功"
+            })
                 
-        except Exception as req_e:
-            if 'requests' in str(type(req_e)) or hasattr(req_e, '__module__') and 'requests' in str(req_e.__module__):
-                return jsonify({
-                    "success": False,
-                    "data": None,
-                    "message": f"连接Elasticsearch失败: {str(req_e)}"
-                }), 500
-            else:
-                raise req_e
+        except requests.exceptions.RequestException as req_e:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": f"连接Elasticsearch失败: {str(req_e)}"
+            }), 500
         
     except Exception as e:
         return jsonify({
             "success": False,
             "data": None,
-            "message": f"获取日志统计失败: {str(e)}"
+            "message": f"获取日志详情失败: {str(e)}"
         }), 500
 
-@app.route('/api/logs/trends', methods=['GET'])
-def get_log_trends():
-    """获取日志趋势数据"""
+@app.route('/api/logs/<index>/<doc_id>/context', methods=['GET'])
+def get_log_context(index, doc_id):
+    """获取某条日志前后来自同一主机/服务/容器的日志"""
     try:
-        # 检查Elasticsearch配置
-        config = load_config()
-        elk_config = config.get('monitoring', {}).get('elk', {})
+        es, error_response = _get_es_client()
+        if error_response:
+            return error_response
+        
+        before = min(max(request.args.get('before', DEFAULT_CONTEXT_LINES, type=int), 0), MAX_CONTEXT_LINES)
+        after = min(max(request.args.get('after', DEFAULT_CONTEXT_LINES, type=int), 0), MAX_CONTEXT_LINES)
+        window_ms = parse_duration_ms(request.args.get('window', '1h')) or CONTEXT_WINDOW_MS
+        window_ms = min(window_ms, MAX_CONTEXT_WINDOW_MS)
+        projection, error_response = _parse_projection()
+        if error_response:
+            return error_response
         
-        if not elk_config.get('enabled', False):
+        try:
+            context = LogContextQuery(es, QueryBuilder(es, index), index, doc_id, window_ms)
+            anchor, before_hits, after_hits, matched = context.run(before, after)
+        except ContextError as ce:
             return jsonify({
                 "success": False,
                 "data": None,
-                "message": "ELK Stack未启用，请在配置管理中启用"
-            }), 400
-            
-        elasticsearch_url = elk_config.get('elasticsearch_url')
-        if not elasticsearch_url:
+                "message": str(ce)
+            }), ce.status
+        except requests.exceptions.RequestException as req_e:
             return jsonify({
                 "success": False,
                 "data": None,
-                "message": "Elasticsearch URL未配置，请在配置管理中设置"
-            }), 400
+                "message": f"连接Elasticsearch失败: {str(req_e)}"
+            }), 500
         
-        import requests
-        from datetime import datetime, timedelta
+        return jsonify({
+            "success": True,
+            "data": {
+                "anchor": projection.format(anchor),
+                "before": [projection.format(hit) for hit in before_hits],
+                "after": [projection.format(hit) for hit in after_hits],
+                "filters": matched
+            },
+            "has_more_before": len(before_hits) >= before > 0,
+            "has_more_after": len(after_hits) >= after > 0,
+            "message": "日志上下文获取成功"
+        })
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "data": None,
+            "message": f"获取日志上下文失败: {str(e)}"
+        }), 500
+
+def _plan_trend_refresh(index_pattern, interval, level_field, filters, start_ms, now):
+    """规划趋势桶的增量刷新，返回 (刷新计划, 查询体)，查询体只覆盖未关闭的桶"""
+    trend_cache = get_trend_cache()
+    interval_ms = fixed_interval_ms(interval)
+    key = trend_cache.series_key(index_pattern, interval, level_field, filters)
+    refresh_from = trend_cache.plan(key, interval_ms, start_ms)
+    plan = (key, interval_ms, refresh_from, start_ms, now)
+    # 终点按分钟取整，同一分钟内的重复刷新生成相同的查询体
+    return plan, trend_cache.build_body(refresh_from, round_up(now), interval, level_field, filters)
+
+def _trend_refresh_target(index_pattern, plan):
+    """增量刷新只需查询刷新起点之后的日期索引"""
+    return resolve_index(index_pattern, plan[2], plan[4])
+
+def _apply_trend_refresh(plan, es_data):
+    """合并刷新结果到趋势缓存，返回窗口内的桶列表"""
+    key, interval_ms, refresh_from, start_ms, now = plan
+    trend_cache = get_trend_cache()
+    trend_cache.apply(key, interval_ms, refresh_from, now, es_data, start_ms)
+    return trend_cache.buckets(key, interval_ms, start_ms)
+
+def _refresh_trend_buckets(es, index_pattern, interval, level_field, filters, start_ms, now):
+    """从趋势缓存获取桶，仅向ES查询未关闭的桶，返回 (桶列表, 错误响应)"""
+    plan, body = _plan_trend_refresh(index_pattern, interval, level_field, filters, start_ms, now)
+    response = es.search(_trend_refresh_target(index_pattern, plan), body)
+    if response.status_code != 200:
+        return None, _es_error_response(response)
+    return _apply_trend_refresh(plan, response.json()), None
+
+def _level_terms_agg(level_field):
+    """日志级别分布聚合"""
+    return {
+        "terms": {
+            "field": level_field,
+            "size": 10
+        }
+    }
+
+def _stats_direct_body(time_range, level_field):
+    """无法使用趋势缓存时，直接聚合整个窗口的统计查询"""
+    return {
+        "size": 0,
+        "query": {
+            "bool": {
+                "filter": [time_range_filter(time_range=time_range)]
+            }
+        },
+        "aggs": {
+            "log_levels": _level_terms_agg(level_field)
+        }
+    }
+
+def _trends_direct_body(time_range, interval, level_field):
+    """无法使用趋势缓存时，直接查询整个窗口的趋势查询"""
+    return {
+        "size": 0,
+        "query": {
+            "bool": {
+                "filter": [time_range_filter(time_range=time_range)]
+            }
+        },
+        "aggs": {
+            "time_series": {
+                "date_histogram": {
+                    "field": "@timestamp",
+                    "fixed_interval": interval,
+                    "min_doc_count": 0
+                },
+                "aggs": {
+                    "log_levels": _level_terms_agg(level_field)
+                }
+            }
+        }
+    }
+
+def _active_services_body(time_range, service_field):
+    """活跃服务数（基数聚合）查询"""
+    return {
+        "size": 0,
+        "track_total_hits": False,
+        "query": {
+            "bool": {
+                "filter": [time_range_filter(time_range=time_range)]
+            }
+        },
+        "aggs": {
+            "services": {
+                "cardinality": {
+                    "field": service_field
+                }
+            }
+        }
+    }
+
+def _parse_active_services(es_data):
+    return es_data.get('aggregations', {}).get('services', {}).get('value', 0)
+
+def _count_active_services(es, index_pattern, time_range, service_field):
+    """统计活跃服务数（基数聚合无法由趋势桶累加，单独查询并短暂缓存）"""
+    cache_key = (index_pattern, time_range, service_field)
+    active_services = _active_services_cache.get(cache_key)
+    if active_services is not None:
+        return active_services, None
+    
+    target = resolve_index(index_pattern, relative_start_ms(f"now-{time_range}"))
+    response = es.search(target, _active_services_body(time_range, service_field))
+    if response.status_code != 200:
+        return None, _es_error_response(response)
+    
+    active_services = _parse_active_services(response.json())
+    _active_services_cache.set(cache_key, active_services)
+    return active_services, None
+
+def _summarize_levels(level_counts):
+    """按级别归类日志数量，返回 (错误数, 警告数, 信息数)"""
+    errors = warnings = info = 0
+    for level, count in level_counts.items():
+        level = level.upper()
+        if level in ['ERROR', 'FATAL']:
+            errors += count
+        elif level in ['WARN', 'WARNING']:
+            warnings += count
+        elif level in ['INFO', 'DEBUG', 'TRACE']:
+            info += count
+    return errors, warnings, info
+
+def _stats_from_buckets(buckets):
+    """由趋势桶汇总 (总数, 级别分布)"""
+    total_logs = 0
+    level_counts = {}
+    for _, bucket in buckets:
+        total_logs += bucket['total']
+        for level, count in bucket['levels'].items():
+            level_counts[level] = level_counts.get(level, 0) + count
+    return total_logs, level_counts
+
+def _stats_from_direct(es_data):
+    """由直接聚合结果解析 (总数, 级别分布)"""
+    level_counts = {}
+    for bucket in es_data.get('aggregations', {}).get('log_levels', {}).get('buckets', []):
+        level = str(bucket.get('key', '')).upper()
+        level_counts[level] = level_counts.get(level, 0) + bucket.get('doc_count', 0)
+    return _parse_total(es_data), level_counts
+
+def _stats_payload(total_logs, level_counts, active_services):
+    """组装日志统计结果"""
+    error_logs, warning_logs, _ = _summarize_levels(level_counts)
+    return {
+        "totalLogs": total_logs,
+        "errorLogs": error_logs,
+        "warningLogs": warning_logs,
+        "activeServices": active_services
+    }
+
+@app.route('/api/logs/stats', methods=['GET'])
+def get_log_stats():
+    """获取日志统计信息"""
+    try:
+        es, error_response = _get_es_client()
+        if error_response:
+            return error_response
         
         try:
             # 获取查询参数
             time_range = request.args.get('time_range', '24h')
             index_pattern = request.args.get('index', 'logstash-*')
-            interval = request.args.get('interval', '1h')
+            builder = QueryBuilder(es, index_pattern)
+            level_field = request.args.get('level_field') or builder.level_field()
+            service_field = request.args.get('service_field') or builder.service_field()
             
-            # 构建Elasticsearch时间序列聚合查询
-            query_body = {
-                "size": 0,
-                "query": {
-                    "bool": {
-                        "filter": [
-                            {
-                                "range": {
-                                    "@timestamp": {
-                                        "gte": f"now-{time_range}"
-                                    }
-                                }
-                            }
-                        ]
-                    }
-                },
-                "aggs": {
-                    "time_series": {
-                        "date_histogram": {
-                            "field": "@timestamp",
-                            "fixed_interval": interval,
-                            "min_doc_count": 0
-                        },
-                        "aggs": {
-                            "log_levels": {
-                                "terms": {
-                                    "field": "level.keyword",
-                                    "size": 10
-                                }
-                            }
-                        }
-                    }
-                }
-            }
+            duration = parse_duration_ms(time_range)
+            if duration:
+                # 总数和级别分布由趋势桶缓存汇总，只需刷新最新的桶
+                now = now_ms()
+                buckets, error_response = _refresh_trend_buckets(
+                    es, index_pattern, stats_interval(duration), level_field, [], now - duration, now
+                )
+                if error_response:
+                    return error_response
+                total_logs, level_counts = _stats_from_buckets(buckets)
+            else:
+                # 无法解析的时间范围，直接聚合整个窗口
+                response = es.search(index_pattern, _stats_direct_body(time_range, level_field))
+                if response.status_code != 200:
+                    return _es_error_response(response)
+                total_logs, level_counts = _stats_from_direct(response.json())
             
-            # 执行Elasticsearch查询
-            search_url = f"{elasticsearch_url}/{index_pattern}/_search"
-            response = requests.post(search_url, json=query_body, timeout=10)
+            # 获取活跃服务数
+            active_services, error_response = _count_active_services(es, index_pattern, time_range, service_field)
+            if error_response:
+                return error_response
             
-            if response.status_code == 200:
-                es_data = response.json()
+            return jsonify({
+                "success": True,
+                "data": _stats_payload(total_logs, level_counts, active_services),
+                "message": "日志统计获取成功"
+            })
                 
-                # 处理时间序列数据
-                time_buckets = es_data.get('aggregations', {}).get('time_series', {}).get('buckets', [])
-                trends = []
+        except requests.exceptions.RequestException as req_e:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": f"连接Elasticsearch失败: {str(req_e)}"
+            }), 500
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "data": None,
+            "message": f"获取日志统计失败: {str(e)}"
+        }), 500
+
+def _trend_rows(buckets):
+    """将 (桶起始毫秒, {total, levels}) 列表转换为趋势数据"""
+    trends = []
+    for key, bucket in buckets:
+        errors, warnings, info = _summarize_levels(bucket['levels'])
+        dt = datetime.utcfromtimestamp(key / 1000)
+        trends.append({
+            "time": dt.strftime("%H:%M"),
+            "timestamp": dt.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "total": bucket['total'],
+            "errors": errors,
+            "warnings": warnings,
+            "info": info
+        })
+    return trends
+
+@app.route('/api/logs/trends', methods=['GET'])
+def get_log_trends():
+    """获取日志趋势数据"""
+    try:
+        es, error_response = _get_es_client()
+        if error_response:
+            return error_response
+        
+        try:
+            # 获取查询参数
+            time_range = request.args.get('time_range', '24h')
+            index_pattern = request.args.get('index', 'logstash-*')
+            interval = request.args.get('interval', '1h')
+            level_field = request.args.get('level_field') or QueryBuilder(es, index_pattern).level_field()
+            
+            duration = parse_duration_ms(time_range)
+            if duration and fixed_interval_ms(interval):
+                # 已关闭的桶来自缓存，只查询最新的未关闭桶
+                now = now_ms()
+                buckets, error_response = _refresh_trend_buckets(
+                    es, index_pattern, interval, level_field, [], now - duration, now
+                )
+                if error_response:
+                    return error_response
+            else:
+                # 无法对齐缓存时直接查询整个窗口
+                response = es.search(index_pattern, _trends_direct_body(time_range, interval, level_field))
+                if response.status_code != 200:
+                    return _es_error_response(response)
+                buckets = sorted(parse_histogram_buckets(response.json()).items())
+            
+            return jsonify({
+                "success": True,
+                "data": _trend_rows(buckets),
+                "message": "日志趋势获取成功"
+            })
                 
-                for bucket in time_buckets:
-                    timestamp = bucket.get('key_as_string', bucket.get('key'))
-                    total = bucket.get('doc_count', 0)
-                    
-                    # 统计各级别日志数量
-                    level_buckets = bucket.get('log_levels', {}).get('buckets', [])
-                    errors = 0
-                    warnings = 0
-                    info = 0
-                    
-                    for level_bucket in level_buckets:
-                        level = level_bucket.get('key', '').upper()
-                        count = level_bucket.get('doc_count', 0)
-                        if level in ['ERROR', 'FATAL']:
-                            errors += count
-                        elif level in ['WARN', 'WARNING']:
-                            warnings += count
-                        elif level in ['INFO', 'DEBUG', 'TRACE']:
-                            info += count
-                    
-                    # 格式化时间
-                    if isinstance(timestamp, str):
-                        try:
-                            dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                            time_str = dt.strftime("%H:%M")
-                        except:
-                            time_str = str(timestamp)
+        except requests.exceptions.RequestException as e:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": f"连接Elasticsearch失败: {str(e)}"
+            }), 500
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "data": None,
+            "message": f"获取日志趋势失败: {str(e)}"
+        }), 500
+
+def _msearch_error(item):
+    """提取 _msearch 单个子查询的错误信息，成功时返回 None"""
+    if 'error' not in item and item.get('status', 200) == 200:
+        return None
+    error = item.get('error')
+    if isinstance(error, dict):
+        error = error.get('reason') or error.get('type')
+    return f"Elasticsearch查询失败: {error or item.get('status')}"
+
+@app.route('/api/logs/overview', methods=['GET'])
+def get_log_overview():
+    """日志分析页概览：日志、统计、趋势合并为一次 _msearch，索引列表来自索引目录
+    
+    sections 参数（逗号分隔）指定需要的部分，默认全部：logs, stats, trends, indices。
+    单个部分失败不影响其他部分，错误信息记录在 errors 中。
+    """
+    try:
+        es, error_response = _get_es_client()
+        if error_response:
+            return error_response
+        
+        # 获取查询参数
+        sections = [s.strip() for s in request.args.get('sections', '').split(',') if s.strip()]
+        sections = sections or list(OVERVIEW_SECTIONS)
+        invalid = [s for s in sections if s not in OVERVIEW_SECTIONS]
+        if invalid:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": f"不支持的概览部分: {', '.join(invalid)}"
+            }), 400
+        
+        match_pattern = request.args.get('match_pattern', '')
+        level = request.args.get('level', 'all')
+        service = request.args.get('service', 'all')
+        time_range = request.args.get('time_range', '24h')
+        index_pattern = request.args.get('index', 'logstash-*')
+        size = int(request.args.get('size', 100))
+        interval = request.args.get('interval', '1h')
+        builder = QueryBuilder(es, index_pattern)
+        level_field = request.args.get('level_field') or builder.level_field()
+        service_field = request.args.get('service_field') or builder.service_field()
+        projection, error_response = _parse_projection()
+        if error_response:
+            return error_response
+        track_total_hits, error_response = _parse_track_total_hits()
+        if error_response:
+            return error_response
+        
+        now = now_ms()
+        duration = parse_duration_ms(time_range)
+        range_start = now - duration if duration else None
+        
+        # 收集需要发送的子查询：名称 -> (索引, 查询体)
+        searches = {}
+        trend_plan = stats_plan = None
+        active_services = None
+        
+        if 'logs' in sections:
+            searches['logs'] = (resolve_index(index_pattern, range_start, now), projection.apply(_build_log_query(
+                QueryBuilder(es, index_pattern), time_range, range_start, level, service, match_pattern, size
+            )))
+            searches['logs'][1]["track_total_hits"] = track_total_hits
+        
+        if 'trends' in sections:
+            if duration and fixed_interval_ms(interval):
+                trend_plan, body = _plan_trend_refresh(index_pattern, interval, level_field, [], range_start, now)
+                searches['trends'] = (_trend_refresh_target(index_pattern, trend_plan), body)
+            else:
+                searches['trends'] = (index_pattern, _trends_direct_body(time_range, interval, level_field))
+        
+        if 'stats' in sections:
+            if duration and not (trend_plan and stats_interval(duration) == interval):
+                stats_plan, body = _plan_trend_refresh(
+                    index_pattern, stats_interval(duration), level_field, [], range_start, now
+                )
+                searches['stats'] = (_trend_refresh_target(index_pattern, stats_plan), body)
+            elif not duration:
+                searches['stats'] = (index_pattern, _stats_direct_body(time_range, level_field))
+            
+            active_services = _active_services_cache.get((index_pattern, time_range, service_field))
+            if active_services is None:
+                searches['services'] = (resolve_index(index_pattern, range_start, now),
+                                        _active_services_body(time_range, service_field))
+        
+        data = {}
+        errors = {}
+        try:
+            results = {}
+            if searches:
+                names = list(searches)
+                response = es.msearch([searches[name] for name in names])
+                if response.status_code != 200:
+                    return _es_error_response(response)
+                for name, item in zip(names, response.json().get('responses', [])):
+                    error = _msearch_error(item)
+                    if error:
+                        errors[name] = error
                     else:
-                        dt = datetime.fromtimestamp(timestamp / 1000)
-                        time_str = dt.strftime("%H:%M")
-                    
-                    trends.append({
-                        "time": time_str,
-                        "timestamp": timestamp,
-                        "total": total,
-                        "errors": errors,
-                        "warnings": warnings,
-                        "info": info
-                    })
-                
-                return jsonify({
-                    "success": True,
-                    "data": trends,
-                    "message": "日志趋势获取成功"
+                        results[name] = item
+            
+            if 'indices' in sections:
+                try:
+                    data['indices'] = _load_index_catalog().query()
+                except RuntimeError as re_e:
+                    errors['indices'] = str(re_e)
+        except requests.exceptions.RequestException as req_e:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": f"连接Elasticsearch失败: {str(req_e)}"
+            }), 500
+        
+        if 'logs' in results:
+            hits = results['logs'].get('hits', {}).get('hits', [])
+            total = _parse_total(results['logs'])
+            total_relation = _parse_total_relation(results['logs'])
+            next_cursor = None
+            if hits and len(hits) >= size and hits[-1].get('sort'):
+                # 与 /api/logs 使用相同的游标，可直接用于后续翻页
+                fingerprint = query_fingerprint({
+                    "index": index_pattern,
+                    "match_pattern": match_pattern,
+                    "level": level,
+                    "service": service,
+                    "time_range": time_range
                 })
+                next_cursor = encode_cursor(hits[-1]['sort'], fingerprint, range_start, total=total,
+                                            total_relation=total_relation)
+            data['logs'] = {
+                "data": [projection.format(hit) for hit in hits],
+                "total": total,
+                "total_relation": total_relation,
+                "estimated_total": None,
+                "filtered": len(hits),
+                "index_pattern": index_pattern,
+                "next_cursor": next_cursor,
+                "has_more": next_cursor is not None
+            }
+        
+        trend_buckets = None
+        if 'trends' in results:
+            if trend_plan:
+                trend_buckets = _apply_trend_refresh(trend_plan, results['trends'])
             else:
-                return jsonify({
-                    "success": False,
-                    "data": None,
-                    "message": f"Elasticsearch查询失败: {response.status_code}"
-                }), 500
-                
-        except requests.exceptions.RequestException as e:
+                trend_buckets = sorted(parse_histogram_buckets(results['trends']).items())
+            data['trends'] = _trend_rows(trend_buckets)
+        
+        if 'stats' in sections and 'stats' not in errors:
+            if 'services' in results:
+                active_services = _parse_active_services(results['services'])
+                _active_services_cache.set((index_pattern, time_range, service_field), active_services)
+            
+            if stats_plan and 'stats' in results:
+                stats = _stats_from_buckets(_apply_trend_refresh(stats_plan, results['stats']))
+            elif 'stats' in results:
+                stats = _stats_from_direct(results['stats'])
+            elif trend_buckets is not None:
+                # 统计间隔与趋势间隔相同，直接复用趋势桶
+                stats = _stats_from_buckets(trend_buckets)
+            else:
+                stats = None
+                errors['stats'] = errors.get('trends')
+            
+            if stats is not None:
+                if active_services is None:
+                    errors['stats'] = errors.get('services')
+                else:
+                    data['stats'] = _stats_payload(stats[0], stats[1], active_services)
+        errors.pop('services', None)
+        
+        # 日志总数只是下限时，由（本次已刷新的）趋势缓存给出估算值
+        if 'logs' in data and data['logs']['total_relation'] != 'eq':
+            data['logs']['estimated_total'] = _estimate_total(es, index_pattern, time_range, range_start,
+                                                              level, service, match_pattern)
+        
+        return jsonify({
+            "success": True,
+            "data": data,
+            "errors": errors,
+            "message": "日志概览获取成功"
+        })
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "data": None,
+            "message": f"获取日志概览失败: {str(e)}"
+        }), 500
+
+@app.route('/api/prom/query_range', methods=['GET', 'POST'])
+def prom_query_range():
+    """Prometheus query_range 代理，按步长对齐并分片缓存已结束的时间段
+    
+    响应与 Prometheus API 格式一致（status/data），便于前端直接替换查询地址。
+    max_points（或 width，面板像素宽度）: 每条序列最多返回的点数，超出时按 LTTB 降采样；
+    adjust_step=true 时先选择更粗的步长再查询（结果中的 step 为实际使用的步长）。
+    """
+    try:
+        prom, error_response = _get_prom_client()
+        if error_response:
+            return error_response
+        
+        params = request.values
+        expr = params.get('query', '').strip()
+        if not expr:
+            return jsonify({
+                "status": "error",
+                "errorType": "bad_data",
+                "error": "缺少 query 参数"
+            }), 400
+        try:
+            now = time.time()
+            end = _parse_prom_time(params.get('end'), now)
+            start = _parse_prom_time(params.get('start'), end - 3600)
+            step = _parse_prom_step(params.get('step', '60'))
+            max_points = parse_max_points(params.get('max_points') or params.get('width'))
+        except ValueError as ve:
+            return jsonify({
+                "status": "error",
+                "errorType": "bad_data",
+                "error": str(ve)
+            }), 400
+        if max_points and params.get('adjust_step', 'false').lower() == 'true':
+            step = coarser_step(start, end, step, max_points)
+        
+        try:
+            result, shards = get_prom_range_cache().query_range(prom, expr, start, end, step, now=now)
+        except PromQueryError as pe:
+            return jsonify({
+                "status": "error",
+                "errorType": pe.error_type,
+                "error": str(pe)
+            }), pe.status
+        except requests.exceptions.RequestException as req_e:
+            return jsonify({
+                "status": "error",
+                "errorType": "unavailable",
+                "error": f"连接Prometheus失败: {str(req_e)}"
+            }), 502
+        
+        if max_points:
+            result = downsample_matrix(result, max_points)
+        
+        return jsonify({
+            "status": "success",
+            "data": {
+                "resultType": "matrix",
+                "result": result
+            },
+            "cache": shards,
+            "step": step
+        })
+        
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "errorType": "internal",
+            "error": f"Prometheus范围查询失败: {str(e)}"
+        }), 500
+
+@app.route('/api/prom/cache/stats', methods=['GET'])
+def prom_cache_stats():
+    """获取 Prometheus 范围查询缓存统计"""
+    try:
+        return jsonify({
+            "success": True,
+            "data": get_prom_range_cache().stats(),
+            "message": "缓存统计获取成功"
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "data": None,
+            "message": f"获取缓存统计失败: {str(e)}"
+        }), 500
+
+@app.route('/api/prom/batch', methods=['POST'])
+def prom_batch():
+    """批量执行 PromQL 查询
+    
+    请求体: {"queries": [{"id", "query", "type": "instant"|"range", "time" | "start", "end", "step",
+                          "max_points", "adjust_step"}]}
+    相同的查询只执行一次，去重后的查询在有界线程池中并发执行；
+    结果按 id 返回，格式与 Prometheus API 一致，单条查询失败不影响其他查询。
+    """
+    try:
+        prom, error_response = _get_prom_client()
+        if error_response:
+            return error_response
+        
+        data = request.get_json(silent=True) or {}
+        now = time.time()
+        try:
+            queries, results = parse_batch_queries(data.get('queries'), now, _parse_prom_time, _parse_prom_step)
+        except ValueError as ve:
             return jsonify({
                 "success": False,
                 "data": None,
-                "message": f"连接Elasticsearch失败: {str(e)}"
-            }), 500
+                "message": str(ve)
+            }), 400
+        
+        started = time.monotonic()
+        executed = 0
+        if queries:
+            batch_results, executed = run_batch(prom, queries, now=now)
+            results.update(batch_results)
+        
+        return jsonify({
+            "success": True,
+            "data": {
+                "results": results,
+                "total": len(results),
+                "executed": executed,
+                "failed": sum(1 for result in results.values() if result.get('status') != 'success'),
+                "took_ms": round((time.monotonic() - started) * 1000, 1)
+            },
+            "message": "批量查询完成"
+        })
         
     except Exception as e:
         return jsonify({
             "success": False,
             "data": None,
-            "message": f"获取日志趋势失败: {str(e)}"
+            "message": f"批量查询失败: {str(e)}"
         }), 500
 
+def _first_sample_value(result):
+    """即时查询结果中第一条序列的数值，无数据或查询失败时返回 0"""
+    if result.get('status') != 'success':
+        return 0
+    samples = result.get('data', {}).get('result') or []
+    if not samples:
+        return 0
+    try:
+        return float(samples[0]['value'][1])
+    except (KeyError, IndexError, TypeError, ValueError):
+        return 0
+
 @app.route('/api/system/metrics', methods=['GET'])
 def get_system_metrics():
     """获取系统指标"""
     try:
         # 检查Prometheus配置
-        config = load_config()
-        prometheus_config = config.get('monitoring', {}).get('prometheus', {})
-        
-        if not prometheus_config.get('enabled', False):
-            return jsonify({
-                "success": False,
-                "data": None,
-                "message": "Prometheus未启用，请在配置管理中启用"
-            }), 400
-            
-        prometheus_url = prometheus_config.get('url')
-        if not prometheus_url:
-            return jsonify({
-                "success": False,
-                "data": None,
-                "message": "Prometheus URL未配置，请在配置管理中设置"
-            }), 400
+        prom, error_response = _get_prom_client()
+        if error_response:
+            return error_response
         
         # 获取查询参数
         query_type = request.args.get('query_type', 'node_exporter')
         
-        import requests
-        
-        try:
-            # 根据查询类型构建不同的查询
-            if query_type == 'cadvisor':
-                cpu_query = 'rate(container_cpu_usage_seconds_total[5m]) * 100'
-                memory_query = '(container_memory_usage_bytes / container_spec_memory_limit_bytes) * 100'
-            elif query_type == 'kubernetes':
-                cpu_query = 'rate(container_cpu_usage_seconds_total{container!="POD",container!=""}[5m]) * 100'
-                memory_query = '(container_memory_working_set_bytes{container!="POD",container!=""} / container_spec_memory_limit_bytes) * 100'
-            else:  # node_exporter
-                cpu_query = '100 - (avg(rate(node_cpu_seconds_total{mode="idle"}[5m])) * 100)'
-                memory_query = '(1 - (node_memory_MemAvailable_bytes / node_memory_MemTotal_bytes)) * 100'
-            
-            # 查询CPU使用率
-            cpu_response = requests.get(f'{prometheus_url}/api/v1/query', 
-                                      params={'query': cpu_query}, timeout=10)
-            
-            # 查询内存使用率
-            memory_response = requests.get(f'{prometheus_url}/api/v1/query', 
-                                         params={'query': memory_query}, timeout=10)
-            
-            cpu_value = 0
-            memory_value = 0
-            
-            if cpu_response.status_code == 200:
-                cpu_data = cpu_response.json()
-                if cpu_data.get('data', {}).get('result'):
-                    cpu_value = float(cpu_data['data']['result'][0]['value'][1])
-            
-            if memory_response.status_code == 200:
-                memory_data = memory_response.json()
-                if memory_data.get('data', {}).get('result'):
-                    memory_value = float(memory_data['data']['result'][0]['value'][1])
-            
-            return jsonify({
-                "success": True,
-                "data": {
-                    "cpu": round(cpu_value, 2),
-                    "memory": round(memory_value, 2),
-                    "query_type": query_type
-                },
-                "message": "系统指标获取成功"
-            })
-            
-        except Exception as req_e:
-            if 'requests' in str(type(req_e)) or hasattr(req_e, '__module__') and 'requests' in str(req_e.__module__):
-                # 如果Prometheus不可用，返回模拟数据
-                import random
+        # 根据查询类型构建不同的查询
+        if query_type == 'cadvisor':
+            cpu_query = 'rate(container_cpu_usage_seconds_total[5m]) * 100'
+            memory_query = '(container_memory_usage_bytes / container_spec_memory_limit_bytes) * 100'
+        elif query_type == 'kubernetes':
+            cpu_query = 'rate(container_cpu_usage_seconds_total{container!="POD",container!=""}[5m]) * 100'
+            memory_query = '(container_memory_working_set_bytes{container!="POD",container!=""} / container_spec_memory_limit_bytes) * 100'
+        else:  # node_exporter
+            cpu_query = '100 - (avg(rate(node_cpu_seconds_total{mode="idle"}[5m])) * 100)'
+            memory_query = '(1 - (node_memory_MemAvailable_bytes / node_memory_MemTotal_bytes)) * 100'
+        
+        # CPU和内存使用率并发查询
+        now = time.time()
+        queries, _ = parse_batch_queries([
+            {"id": "cpu", "query": cpu_query},
+            {"id": "memory", "query": memory_query}
+        ], now, _parse_prom_time, _parse_prom_step)
+        results, _ = run_batch(prom, queries, now=now)
+        
+        if all(result.get('errorType') == 'unavailable' for result in results.values()):
+            # 如果Prometheus不可用，返回模拟数据
+            import random
             return jsonify({
                 "success": True,
                 "data": {
@@ -1369,6 +2731,16 @@ def get_system_metrics():
                 "message": "系统指标获取成功（模拟数据）"
             })
         
+        return jsonify({
+            "success": True,
+            "data": {
+                "cpu": round(_first_sample_value(results['cpu']), 2),
+                "memory": round(_first_sample_value(results['memory']), 2),
+                "query_type": query_type
+            },
+            "message": "系统指标获取成功"
+        })
+        
     except Exception as e:
         return jsonify({
             "success": False,
@@ -1509,16 +2881,46 @@ def batch_check_services():
             "message": f"批量检查服务失败: {str(e)}"
         }), 500
 
+def migrate_custom_indices():
+    """一次性将 config.json 中的 custom_indices 迁移到数据库"""
+    legacy_indices = config_store.snapshot().get('custom_indices')
+    if legacy_indices is None:
+        return
+    
+    try:
+        result = enhanced_data_service.bulk_create_custom_indices(
+            [index for index in thaw_config(legacy_indices) if isinstance(index, dict)]
+        )
+        config_store.update(lambda config: config.pop('custom_indices', None))
+        print(f"自定义索引迁移完成: 新增 {len(result['created'])} 个, 跳过 {len(result['skipped'])} 个")
+    except Exception as e:
+        print(f"自定义索引迁移失败: {e}")
+
+migrate_custom_indices()
+
 @app.route('/api/custom-indices', methods=['GET'])
 def get_custom_indices():
-    """获取自定义索引列表"""
+    """获取自定义索引列表（支持 search、page、page_size 参数）"""
     try:
-        config = load_config()
-        custom_indices = config.get('custom_indices', [])
+        search = request.args.get('search', '').strip()
+        page = request.args.get('page', type=int)
+        page_size = request.args.get('page_size', type=int)
+        
+        # 未指定分页参数时返回全部，兼容现有前端
+        if page is not None or page_size is not None:
+            page = max(page or 1, 1)
+            page_size = min(max(page_size or 50, 1), 1000)
+        
+        custom_indices, total = enhanced_data_service.get_custom_indices(
+            search=search or None, page=page, page_size=page_size
+        )
         
         return jsonify({
             "success": True,
             "data": custom_indices,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
             "message": "获取自定义索引列表成功"
         })
         
@@ -1551,30 +2953,10 @@ def add_custom_index():
                 "message": "索引名称不能为空"
             }), 400
         
-        config = load_config()
-        custom_indices = config.get('custom_indices', [])
-        
-        # 检查是否已存在
-        for index in custom_indices:
-            if index['name'] == index_name:
-                return jsonify({
-                    "success": False,
-                    "data": None,
-                    "message": "索引名称已存在"
-                }), 400
-        
-        # 添加新索引
-        new_index = {
+        new_index = enhanced_data_service.create_custom_index({
             "name": index_name,
-            "description": description,
-            "created_at": datetime.now().isoformat()
-        }
-        
-        custom_indices.append(new_index)
-        config['custom_indices'] = custom_indices
-        
-        # 保存配置
-        save_config(config)
+            "description": description
+        })
         
         return jsonify({
             "success": True,
@@ -1582,6 +2964,12 @@ def add_custom_index():
             "message": "自定义索引添加成功"
         })
         
+    except ValueError as ve:
+        return jsonify({
+            "success": False,
+            "data": None,
+            "message": str(ve)
+        }), 400
     except Exception as e:
         return jsonify({
             "success": False,
@@ -1589,25 +2977,79 @@ def add_custom_index():
             "message": f"添加自定义索引失败: {str(e)}"
         }), 500
 
-@app.route('/api/custom-indices/<index_name>', methods=['DELETE'])
-def delete_custom_index(index_name):
-    """删除自定义索引"""
+@app.route('/api/custom-indices/bulk', methods=['POST'])
+def bulk_add_custom_indices():
+    """批量添加自定义索引"""
     try:
-        config = load_config()
-        custom_indices = config.get('custom_indices', [])
+        data = request.get_json()
+        if not data or not isinstance(data.get('indices'), list):
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": "请提供索引列表"
+            }), 400
+        
+        items = []
+        for item in data['indices']:
+            if isinstance(item, str):
+                item = {"name": item}
+            if not isinstance(item, dict):
+                continue
+            name = str(item.get('name', '')).strip()
+            if name:
+                items.append({
+                    "name": name,
+                    "description": str(item.get('description', '')).strip()
+                })
         
-        # 查找并删除索引
-        updated_indices = [index for index in custom_indices if index['name'] != index_name]
+        result = enhanced_data_service.bulk_create_custom_indices(items)
+        
+        return jsonify({
+            "success": True,
+            "data": result,
+            "message": f"批量添加完成: 新增 {len(result['created'])} 个, 跳过 {len(result['skipped'])} 个"
+        })
         
-        if len(updated_indices) == len(custom_indices):
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "data": None,
+            "message": f"批量添加自定义索引失败: {str(e)}"
+        }), 500
+
+@app.route('/api/custom-indices/bulk-delete', methods=['POST'])
+def bulk_delete_custom_indices():
+    """批量删除自定义索引"""
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('names'), list):
             return jsonify({
                 "success": False,
                 "data": None,
-                "message": "索引不存在"
-            }), 404
+                "message": "请提供索引名称列表"
+            }), 400
+        
+        names = [str(name).strip() for name in data['names'] if str(name).strip()]
+        deleted = enhanced_data_service.bulk_delete_custom_indices(names)
+        
+        return jsonify({
+            "success": True,
+            "data": {"deleted": deleted},
+            "message": f"批量删除完成: 删除 {deleted} 个"
+        })
         
-        config['custom_indices'] = updated_indices
-        save_config(config)
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "data": None,
+            "message": f"批量删除自定义索引失败: {str(e)}"
+        }), 500
+
+@app.route('/api/custom-indices/<index_name>', methods=['DELETE'])
+def delete_custom_index(index_name):
+    """删除自定义索引"""
+    try:
+        enhanced_data_service.delete_custom_index(index_name)
         
         return jsonify({
             "success": True,
@@ -1615,6 +3057,12 @@ def delete_custom_index(index_name):
             "message": "自定义索引删除成功"
         })
         
+    except ValueError as ve:
+        return jsonify({
+            "success": False,
+            "data": None,
+            "message": str(ve)
+        }), 404
     except Exception as e:
         return jsonify({
             "success": False,
@@ -1634,35 +3082,24 @@ def update_custom_index(index_name):
                 "message": "请提供更新数据"
             }), 400
         
-        config = load_config()
-        custom_indices = config.get('custom_indices', [])
+        updates = {}
+        if 'description' in data:
+            updates['description'] = data['description'].strip()
         
-        # 查找并更新索引
-        updated = False
-        for index in custom_indices:
-            if index['name'] == index_name:
-                if 'description' in data:
-                    index['description'] = data['description'].strip()
-                index['updated_at'] = datetime.now().isoformat()
-                updated = True
-                break
-        
-        if not updated:
-            return jsonify({
-                "success": False,
-                "data": None,
-                "message": "索引不存在"
-            }), 404
-        
-        config['custom_indices'] = custom_indices
-        save_config(config)
+        updated_index = enhanced_data_service.update_custom_index(index_name, updates)
         
         return jsonify({
             "success": True,
-            "data": None,
+            "data": updated_index,
             "message": "自定义索引更新成功"
         })
         
+    except ValueError as ve:
+        return jsonify({
+            "success": False,
+            "data": None,
+            "message": str(ve)
+        }), 404
     except Exception as e:
         return jsonify({
             "success": False,
@@ -1751,6 +3188,145 @@ def get_dashboard(dashboard_id):
             "message": f"获取仪表板失败: {str(e)}"
         }), 500
 
+def _parse_dashboard_time(value, now):
+    """解析仪表板时间参数：now、now-1h、Unix 秒/毫秒或 RFC3339，无法解析时抛出 ValueError"""
+    if value == 'now':
+        return now
+    if value and str(value).startswith('now-'):
+        start_ms = relative_start_ms(value, round(now * 1000))
+        if start_ms is None:
+            raise ValueError(f"无效的时间: {value}")
+        return start_ms / 1000
+    timestamp = _parse_prom_time(value)
+    # Grafana 风格的 URL 使用毫秒时间戳
+    return timestamp / 1000 if timestamp > 1e11 else timestamp
+
+@app.route('/api/dashboards/<dashboard_id>/data', methods=['GET'])
+def get_dashboard_data(dashboard_id):
+    """在服务端展开变量并并发查询仪表板的所有面板
+    
+    参数: from/to（默认为仪表板的时间范围）、step（范围查询步长，默认60秒）、
+    var-<name>（变量值，多选变量可重复传入，$__all 表示全选）、
+    max_points（每条序列最多返回的点数，面板配置了 maxDataPoints 时取较小值）、
+    adjust_step=true（按点数预算选择更粗的步长）。
+    面板查询的编译结果按仪表板版本缓存，查询经 Prometheus 批量执行（去重、并发、分片缓存）。
+    """
+    try:
+        prom, error_response = _get_prom_client()
+        if error_response:
+            return error_response
+        
+        dashboard = enhanced_data_service.get_dashboard_by_id(dashboard_id)
+        if not dashboard:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": f"仪表板 {dashboard_id} 不存在"
+            }), 404
+        
+        now = round(time.time(), 3)
+        try:
+            to_ts = _parse_dashboard_time(request.args.get('to', 'now'), now)
+            default_from = f"now-{dashboard.get('timeRange') or '1h'}"
+            from_ts = _parse_dashboard_time(request.args.get('from', default_from), now)
+            step = _parse_prom_step(request.args.get('step', '60'))
+            max_points = parse_max_points(request.args.get('max_points') or request.args.get('width'))
+        except ValueError as ve:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": str(ve)
+            }), 400
+        adjust_step = request.args.get('adjust_step', 'false').lower() == 'true'
+        if from_ts >= to_ts:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": "from 必须早于 to"
+            }), 400
+        
+        compiled = compile_dashboard(dashboard)
+        overrides = {
+            key[4:]: request.args.getlist(key)
+            for key in request.args.keys() if key.startswith('var-') and len(key) > 4
+        }
+        variables = resolve_variables(compiled.variables, overrides, {
+            "__interval": f"{int(step)}s",
+            "__range": f"{int(to_ts - from_ts)}s"
+        })
+        
+        panels = panel_queries(compiled, variables)
+        queries = []
+        for position, (panel, expr) in enumerate(panels):
+            if panel.instant:
+                queries.append(BatchQuery(str(position), 'instant', expr, time=to_ts))
+                continue
+            panel_step = step
+            min_interval = parse_duration_ms(panel.min_interval)
+            if min_interval:
+                panel_step = max(step, min_interval / 1000)
+            panel_points = max_points
+            try:
+                panel_max = parse_max_points(panel.max_data_points)
+            except ValueError:
+                panel_max = None
+            if panel_max:
+                panel_points = min(panel_points, panel_max) if panel_points else panel_max
+            if panel_points and adjust_step:
+                panel_step = coarser_step(from_ts, to_ts, panel_step, panel_points)
+            queries.append(BatchQuery(str(position), 'range', expr, start=from_ts, end=to_ts, step=panel_step,
+                                      max_points=panel_points))
+        
+        started = time.monotonic()
+        results, executed = run_batch(prom, queries, now=now) if queries else ({}, 0)
+        
+        panel_data = []
+        for position, (panel, expr) in enumerate(panels):
+            result = results[str(position)]
+            item = {
+                "id": panel.id,
+                "title": panel.title,
+                "type": panel.type,
+                "query": expr,
+                "status": result.get('status')
+            }
+            if result.get('status') == 'success':
+                item["resultType"] = result['data'].get('resultType')
+                item["result"] = result['data'].get('result', [])
+                if 'step' in result:
+                    item["step"] = result['step']
+            else:
+                item["errorType"] = result.get('errorType')
+                item["error"] = result.get('error')
+            panel_data.append(item)
+        
+        return jsonify({
+            "success": True,
+            "data": {
+                "dashboard": {
+                    "id": dashboard['id'],
+                    "title": dashboard['title'],
+                    "version": dashboard.get('version')
+                },
+                "from": from_ts,
+                "to": to_ts,
+                "step": step,
+                "variables": {name: value.to_json() for name, value in variables.items()
+                              if not name.startswith('__')},
+                "panels": panel_data,
+                "executed": executed,
+                "took_ms": round((time.monotonic() - started) * 1000, 1)
+            },
+            "message": "获取仪表板数据成功"
+        })
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "data": None,
+            "message": f"获取仪表板数据失败: {str(e)}"
+        }), 500
+
 @app.route('/api/dashboards/<dashboard_id>', methods=['PUT'])
 def update_dashboard(dashboard_id):
     """更新仪表板"""
@@ -1934,6 +3510,129 @@ def delete_variable(variable_id):
             "message": f"删除变量失败: {str(e)}"
         }), 500
 
+def _variable_time_range(params):
+    """解析变量解析请求中的 from/to（可选），无法解析时抛出 ValueError"""
+    now = round(time.time(), 3)
+    start = _parse_dashboard_time(params['from'], now) if params.get('from') else None
+    end = _parse_dashboard_time(params['to'], now) if params.get('to') else None
+    return start, end
+
+def _variable_error_response(e):
+    """变量解析失败时的统一响应"""
+    if isinstance(e, VariableQueryError):
+        status, message = e.status, str(e)
+    elif isinstance(e, PromQueryError):
+        status, message = e.status, f"Prometheus查询失败: {str(e)}"
+    elif isinstance(e, requests.exceptions.RequestException):
+        status, message = 502, f"连接Prometheus失败: {str(e)}"
+    else:
+        status, message = 500, f"解析变量选项失败: {str(e)}"
+    return jsonify({
+        "success": False,
+        "data": None,
+        "message": message
+    }), status
+
+@app.route('/api/variables/<variable_id>/options', methods=['GET'])
+def get_variable_options(variable_id):
+    """获取变量的可选值
+    
+    查询型变量按 refresh 策略解析：never 且已有可选值时直接返回；已有可选值时立即返回
+    上次保存的结果并在后台刷新；refresh=true 时同步重新解析。解析结果写回 Variable.options。
+    on_time_range_change 的变量使用 from/to 限定时间范围。
+    """
+    try:
+        variable = enhanced_data_service.get_variable_by_id(variable_id)
+        if not variable:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": "变量不存在"
+            }), 404
+        
+        force = request.args.get('refresh', 'false').lower() == 'true'
+        stored = variable.get('options') or []
+        prom = None
+        if variable.get('type', 'query') == 'query' and variable.get('query') and (
+                force or not stored or variable.get('refresh') != 'never'):
+            # Prometheus 不可用时退回已保存的可选值
+            prom, error_response = _get_prom_client()
+            if error_response and not stored:
+                return error_response
+        
+        if prom is None:
+            result = {"options": stored, "source": "stored", "refreshing": False}
+        else:
+            try:
+                start, end = _variable_time_range(request.args)
+            except ValueError as ve:
+                return jsonify({
+                    "success": False,
+                    "data": None,
+                    "message": str(ve)
+                }), 400
+            result = get_variable_resolver().resolve_variable(prom, variable, start, end, force=force)
+        
+        result.update({
+            "id": variable['id'],
+            "name": variable['name'],
+            "refresh": variable.get('refresh')
+        })
+        return jsonify({
+            "success": True,
+            "data": result,
+            "message": "获取变量选项成功"
+        })
+        
+    except Exception as e:
+        return _variable_error_response(e)
+
+@app.route('/api/variables/resolve', methods=['POST'])
+def resolve_variable_options():
+    """解析未保存的变量查询（仪表板内嵌变量），参数: query、regex、sort、refresh、from、to"""
+    try:
+        data = request.get_json(silent=True) or {}
+        query = (data.get('query') or '').strip()
+        if not query:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": "请提供变量查询"
+            }), 400
+        refresh = data.get('refresh') or 'on_dashboard_load'
+        if refresh not in REFRESH_POLICIES:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": f"不支持的刷新策略: {refresh}"
+            }), 400
+        
+        prom, error_response = _get_prom_client()
+        if error_response:
+            return error_response
+        try:
+            start, end = _variable_time_range(data)
+        except ValueError as ve:
+            return jsonify({
+                "success": False,
+                "data": None,
+                "message": str(ve)
+            }), 400
+        
+        options, cached = get_variable_resolver().resolve_query(
+            prom, query, data.get('regex') or '', data.get('sort') or 'disabled', refresh, start, end)
+        return jsonify({
+            "success": True,
+            "data": {
+                "options": options,
+                "source": "cache" if cached else "prometheus"
+            },
+            "message": "解析变量选项成功"
+        })
+        
+    except Exception as e:
+        return _variable_error_response(e)
+
 @app.route('/api/variable-values', methods=['GET', 'POST'])
 def handle_variable_values():
     """处理变量值的获取和保存"""
@@ -0,0 +1,314 @@
+"""配置存储 - 进程内缓存配置快照，仅在配置文件变化时重新加载"""
+
+import copy
+import json
+import os
+import stat
+import tempfile
+import threading
+from contextlib import contextmanager
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+_EMPTY = MappingProxyType({})
+
+
+def freeze_config(value: Any) -> Any:
+    """将配置递归转换为只读视图（dict -> MappingProxyType, list -> tuple）"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze_config(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze_config(v) for v in value)
+    return value
+
+
+def thaw_config(value: Any) -> Any:
+    """将只读视图还原为可修改的普通 dict/list"""
+    if isinstance(value, Mapping):
+        return {k: thaw_config(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw_config(v) for v in value]
+    return value
+
+
+class ConfigConflictError(Exception):
+    """配置版本冲突（If-Match 与当前版本不一致）"""
+
+    def __init__(self, current_revision: int):
+        super().__init__(f"配置已被修改，当前版本为 {current_revision}")
+        self.current_revision = current_revision
+
+
+class ReadWriteLock:
+    """读写锁（写优先），允许多个读者或单个写者"""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class ConfigStore:
+    """配置存储
+
+    保存已解析的只读配置快照，只有当配置文件的 inode/mtime/size 变化，
+    或通过 save() 写入时才会重新加载，避免每个请求都读取并解析 JSON。
+    版本号保存在旁路文件 <path>.revision 中，不写入配置文档本身。
+    """
+
+    def __init__(self, path: str, default_config: Dict[str, Any]):
+        self.path = path
+        self.revision_path = path + '.revision'
+        self.default_config = copy.deepcopy(default_config)
+        self._lock = ReadWriteLock()
+        # (只读快照, 版本号)，整体替换以保证读取的一致性
+        self._state: Optional[Tuple[Mapping[str, Any], int]] = None
+        self._file_key: Optional[Tuple[int, int, int]] = None
+
+    def _stat_key(self) -> Optional[Tuple[int, int, int]]:
+        """获取配置文件的标识（inode, mtime, size），文件不存在时返回 None"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _next_revision(self, file_revision: Any = 0) -> int:
+        """计算下一个版本号，保证单调递增"""
+        current = self._state[1] if self._state else 0
+        try:
+            file_revision = int(file_revision or 0)
+        except (TypeError, ValueError):
+            file_revision = 0
+        return max(file_revision, current + 1)
+
+    def _read_revision_file(self) -> int:
+        """读取旁路文件中保存的版本号，不存在或无法解析时返回 0"""
+        try:
+            with open(self.revision_path, 'r', encoding='utf-8') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _reload(self, file_key: Optional[Tuple[int, int, int]]):
+        """从磁盘重新加载配置（调用方需持有写锁）"""
+        if file_key is None:
+            # 如果配置文件不存在，创建默认配置
+            self._commit(copy.deepcopy(self.default_config))
+            return
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # 兼容旧版本写入配置文档中的 revision 字段
+            legacy_revision = data.pop('revision', 0) if isinstance(data, dict) else 0
+            try:
+                legacy_revision = int(legacy_revision or 0)
+            except (TypeError, ValueError):
+                legacy_revision = 0
+            revision = self._next_revision(max(self._read_revision_file(), legacy_revision))
+            self._state = (freeze_config(data), revision)
+        except Exception as e:
+            print(f"加载配置文件失败: {e}")
+            # 保留上一次成功加载的快照，文件再次变化前不重复解析
+            if self._state is None:
+                self._state = (freeze_config(self.default_config), self._next_revision())
+        self._file_key = file_key
+
+    def _write_atomic(self, path: str, content: str):
+        """原子写入文件：写临时文件、fsync 后重命名覆盖"""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.config.', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            try:
+                os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode))
+            except FileNotFoundError:
+                os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+        # 同步目录项，确保重命名落盘（部分平台不支持）
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
+
+    def _commit(self, config: Dict[str, Any]) -> int:
+        """写入新配置并生成新版本（调用方需持有写锁）"""
+        revision = self._next_revision(self._read_revision_file())
+        # 版本号不属于用户配置，客户端整体回写时携带的 revision 字段一并丢弃
+        config.pop('revision', None)
+        # 先写版本号：中途失败时最多多跳过一个版本，不会出现内容变化而版本号不变
+        self._write_atomic(self.revision_path, f"{revision}\n")
+        self._write_atomic(self.path, json.dumps(config, ensure_ascii=False, indent=2))
+        self._state = (freeze_config(config), revision)
+        self._file_key = self._stat_key()
+        return revision
+
+    def _ensure_fresh(self):
+        """文件变化时重新加载（调用方需持有写锁）"""
+        file_key = self._stat_key()
+        if self._state is None or file_key != self._file_key:
+            self._reload(file_key)
+
+    def snapshot_with_revision(self) -> Tuple[Mapping[str, Any], int]:
+        """获取只读配置快照及其版本号"""
+        file_key = self._stat_key()
+        with self._lock.read():
+            state = self._state
+            if state is not None and file_key == self._file_key:
+                return state
+
+        with self._lock.write():
+            self._ensure_fresh()
+            return self._state
+
+    def snapshot(self) -> Mapping[str, Any]:
+        """获取只读配置快照"""
+        return self.snapshot_with_revision()[0]
+
+    @property
+    def revision(self) -> int:
+        """当前配置版本号"""
+        return self.snapshot_with_revision()[1]
+
+    def load(self) -> Dict[str, Any]:
+        """获取可修改的配置副本"""
+        return thaw_config(self.snapshot())
+
+    def save(self, config: Dict[str, Any]) -> bool:
+        """整体保存配置并刷新快照"""
+        try:
+            with self._lock.write():
+                self._commit(copy.deepcopy(config))
+            return True
+        except Exception as e:
+            print(f"保存配置文件失败: {e}")
+            return False
+
+    def update(self, mutator: Callable[[Dict[str, Any]], Any],
+               expected_revision: Optional[int] = None) -> Tuple[Dict[str, Any], int, Any]:
+        """在写锁内执行读-改-写
+
+        mutator 接收可修改的配置副本并就地修改，其返回值原样透传；
+        mutator 抛出异常时不会写入任何内容。
+        指定 expected_revision 时，若与当前版本不一致则抛出 ConfigConflictError。
+        返回 (新配置, 新版本号, mutator 返回值)。
+        """
+        with self._lock.write():
+            self._ensure_fresh()
+            current, revision = self._state
+            if expected_revision is not None and expected_revision != revision:
+                raise ConfigConflictError(revision)
+
+            config = thaw_config(current)
+            result = mutator(config)
+            new_revision = self._commit(config)
+            return config, new_revision, result
+
+    def section(self, *keys: str) -> Mapping[str, Any]:
+        """获取嵌套配置节的只读视图，不存在时返回空映射"""
+        node: Any = self.snapshot()
+        for key in keys:
+            if not isinstance(node, Mapping):
+                return _EMPTY
+            node = node.get(key)
+            if node is None:
+                return _EMPTY
+        return node if isinstance(node, Mapping) else _EMPTY
+
+    # ==================== 类型化访问器 ====================
+
+    def elk_config(self) -> Mapping[str, Any]:
+        """ELK 配置节"""
+        return self.section('monitoring', 'elk')
+
+    def elk_enabled(self) -> bool:
+        """ELK 是否启用"""
+        return bool(self.elk_config().get('enabled', False))
+
+    def elasticsearch_url(self) -> str:
+        """Elasticsearch 地址（去除末尾斜杠）"""
+        return (self.elk_config().get('elasticsearch_url') or '').rstrip('/')
+
+    def prometheus_config(self) -> Mapping[str, Any]:
+        """Prometheus 配置节"""
+        return self.section('monitoring', 'prometheus')
+
+    def prometheus_enabled(self) -> bool:
+        """Prometheus 是否启用"""
+        return bool(self.prometheus_config().get('enabled', False))
+
+    def prometheus_url(self) -> str:
+        """Prometheus 地址（去除末尾斜杠）"""
+        return (self.prometheus_config().get('url') or '').rstrip('/')
+
+    def prometheus_timeout(self) -> float:
+        """Prometheus 查询超时（秒）"""
+        try:
+            return float(self.prometheus_config().get('timeout', 30))
+        except (TypeError, ValueError):
+            return 30.0
+
+
+# 单例实例
+_config_store = None
+
+
+def init_config_store(path: str, default_config: Dict[str, Any]) -> ConfigStore:
+    """初始化配置存储实例"""
+    global _config_store
+    _config_store = ConfigStore(path, default_config)
+    return _config_store
+
+
+def get_config_store() -> ConfigStore:
+    """获取配置存储实例"""
+    if _config_store is None:
+        raise RuntimeError("配置存储尚未初始化")
+    return _config_store
@@ -0,0 +1,181 @@
+"""仪表板数据 - 服务端展开模板变量并生成各面板的查询
+
+面板查询中的 $name / ${name} 占位符在首次使用时编译为“字面量 + 占位符”片段列表，
+按 (仪表板ID, 版本) 缓存；每次请求只需按当前变量值拼接，无需重新解析查询。
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from ttl_cache import TTLCache
+
+INSTANT_PANEL_TYPES = ('stat', 'gauge', 'bar')
+ALL_VALUES = ('$__all', 'All', 'all')
+COMPILED_CACHE_SIZE = 256
+COMPILED_CACHE_TTL = 60 * 60
+
+_PLACEHOLDER = re.compile(r'\$\{(\w+)\}|\$(\w+)')
+# 占位符前紧邻的标签匹配运算符，如 instance="$instance" 中的 ="
+_MATCHER_BEFORE = re.compile(r'(=~|!~|!=|=)(\s*")$')
+_REGEX_META = re.compile(r'([\\.^$*+?()\[\]{}|])')
+
+_compiled_cache = TTLCache(maxsize=COMPILED_CACHE_SIZE, ttl=COMPILED_CACHE_TTL)
+
+
+def _regex_escape(value: str) -> str:
+    """转义正则元字符（PromQL 字符串中反斜杠本身也需要转义）"""
+    return _REGEX_META.sub(r'\\\\\1', value)
+
+
+class VariableValue:
+    """一个变量在本次请求中的取值"""
+
+    def __init__(self, values: List[str], regex: bool = False, all_value: Optional[str] = None):
+        self.values = values
+        self.regex = regex          # 多选/包含全选的变量按正则展开
+        self.all_value = all_value  # 选择“全部”且配置了自定义全选值时直接使用该值
+
+    def render(self) -> str:
+        if self.all_value is not None:
+            return self.all_value
+        if not self.regex:
+            return self.values[0] if self.values else ''
+        if not self.values:
+            return '.*'
+        escaped = [_regex_escape(value) for value in self.values]
+        return escaped[0] if len(escaped) == 1 else '(' + '|'.join(escaped) + ')'
+
+    def to_json(self) -> Any:
+        if self.all_value is not None:
+            return '$__all'
+        if self.regex:
+            return self.values
+        return self.values[0] if self.values else ''
+
+
+class CompiledQuery:
+    """编译后的面板查询：字面量与占位符交替排列"""
+
+    def __init__(self, query: str):
+        # 片段为 str（字面量）或 (变量名, 紧邻的匹配运算符)
+        self.parts: List[Any] = []
+        last = 0
+        for match in _PLACEHOLDER.finditer(query):
+            name = match.group(1) or match.group(2)
+            literal = query[last:match.start()]
+            operator = _MATCHER_BEFORE.search(literal)
+            if operator:
+                self.parts.append(literal[:operator.start()])
+                self.parts.append((name, operator.group(1), operator.group(2)))
+            else:
+                self.parts.append(literal)
+                self.parts.append((name, None, ''))
+            last = match.end()
+        self.parts.append(query[last:])
+
+    def render(self, variables: Dict[str, VariableValue]) -> str:
+        """按变量值拼接查询，未定义的占位符原样保留
+
+        按正则展开的变量位于 = / != 匹配器中时，自动改写为 =~ / !~。
+        """
+        output = []
+        for part in self.parts:
+            if isinstance(part, str):
+                output.append(part)
+                continue
+            name, operator, spacing = part
+            variable = variables.get(name)
+            if variable is None:
+                output.append((operator or '') + spacing + '$' + name)
+                continue
+            if operator and (variable.regex or variable.all_value is not None):
+                operator = {'=': '=~', '!=': '!~'}.get(operator, operator)
+            output.append((operator or '') + spacing + variable.render())
+        return ''.join(output)
+
+
+class CompiledPanel:
+    def __init__(self, index: int, panel: Dict[str, Any]):
+        self.id = str(panel.get('id') or index)
+        self.title = panel.get('title', '')
+        self.type = panel.get('type') or panel.get('chartType') or 'line'
+        query = panel.get('query') or ''
+        if panel.get('isCustomQuery') and panel.get('customQuery'):
+            query = panel['customQuery']
+        self.query = query
+        self.compiled = CompiledQuery(query)
+        self.min_interval = panel.get('minInterval')
+        self.max_data_points = panel.get('maxDataPoints')
+
+    @property
+    def instant(self) -> bool:
+        return self.type in INSTANT_PANEL_TYPES
+
+
+class CompiledDashboard:
+    def __init__(self, dashboard: Dict[str, Any]):
+        self.id = dashboard.get('id')
+        self.version = dashboard.get('version')
+        self.variables = [variable for variable in dashboard.get('variables') or []
+                          if isinstance(variable, dict) and variable.get('name')]
+        self.panels = [CompiledPanel(index, panel) for index, panel in enumerate(dashboard.get('panels') or [])
+                       if isinstance(panel, dict)]
+
+
+def compile_dashboard(dashboard: Dict[str, Any]) -> CompiledDashboard:
+    """编译仪表板的面板查询，按 (ID, 版本, 更新时间) 缓存"""
+    key = (dashboard.get('id'), dashboard.get('version'), dashboard.get('updatedAt'))
+    compiled = _compiled_cache.get(key)
+    if compiled is None:
+        compiled = CompiledDashboard(dashboard)
+        _compiled_cache.set(key, compiled)
+    return compiled
+
+
+def _as_list(value: Any) -> List[str]:
+    if value is None or value == '':
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(item) for item in value if item is not None and item != '']
+    return [str(value)]
+
+
+def resolve_variables(definitions: List[Dict[str, Any]], overrides: Dict[str, List[str]],
+                      builtins: Optional[Dict[str, str]] = None) -> Dict[str, VariableValue]:
+    """计算本次请求的变量取值：请求参数 var-<name> 优先，其次为仪表板保存的当前值
+
+    多选或包含全选的变量按正则展开；选择“全部”时使用自定义全选值，
+    未配置时展开为所有可选值的正则（无可选值时为 .*）。
+    """
+    variables: Dict[str, VariableValue] = {}
+    for name, value in (builtins or {}).items():
+        variables[name] = VariableValue([value])
+
+    for definition in definitions:
+        name = definition['name']
+        include_all = bool(definition.get('includeAll', definition.get('include_all')))
+        regex = bool(definition.get('multi')) or include_all
+        values = overrides.get(name)
+        if values is None:
+            values = _as_list(definition.get('value'))
+
+        if any(value in ALL_VALUES for value in values):
+            all_value = definition.get('allValue', definition.get('all_value'))
+            if all_value:
+                variables[name] = VariableValue([], True, all_value)
+            else:
+                options = [option.get('value') if isinstance(option, dict) else option
+                           for option in definition.get('options') or []]
+                variables[name] = VariableValue([str(option) for option in options
+                                                 if option not in (None, '') and option not in ALL_VALUES], True)
+            continue
+
+        if not regex:
+            values = values[:1]
+        variables[name] = VariableValue(values, regex)
+    return variables
+
+
+def panel_queries(compiled: CompiledDashboard, variables: Dict[str, VariableValue]) -> List[Tuple[CompiledPanel, str]]:
+    """展开所有面板的查询，返回 [(面板, 查询语句)]（跳过空查询）"""
+    return [(panel, panel.compiled.render(variables)) for panel in compiled.panels if panel.query.strip()]
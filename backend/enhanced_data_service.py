@@ -1,6 +1,7 @@
 """增强的数据服务层 - 提供更好的事务管理和错误处理"""
 
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Union, Tuple
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from contextlib import contextmanager
@@ -10,7 +11,7 @@ from datetime import datetime
 
 from models import (
     SessionLocal, Dashboard, Variable, SavedQuery, 
-    DashboardTemplate, VariableValue
+    DashboardTemplate, VariableValue, CustomIndex
 )
 
 class EnhancedDataService:
@@ -293,6 +294,22 @@ class EnhancedDataService:
             
             return self._variable_to_dict(variable)
     
+    def save_variable_options(self, variable_id: str, options: List[str]) -> bool:
+        """保存变量最近一次解析得到的可选值（不改变变量版本），返回是否有变化"""
+        with self.get_session() as session:
+            variable = session.query(Variable).filter(
+                Variable.id == variable_id
+            ).first()
+            
+            if not variable:
+                raise ValueError(f"变量 {variable_id} 不存在")
+            
+            if (variable.options or []) == options:
+                return False
+            
+            variable.options = options
+            return True
+    
     def delete_variable(self, variable_id: str) -> bool:
         """删除变量"""
         with self.get_session() as session:
@@ -506,6 +523,154 @@ class EnhancedDataService:
             'updated_at': template.updated_at.isoformat() if template.updated_at else None
         }
     
+    # ==================== 自定义索引管理 ====================
+    
+    def get_custom_indices(self, search: Optional[str] = None, page: Optional[int] = None,
+                           page_size: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """获取自定义索引列表（支持搜索和分页），返回 (索引列表, 总数)"""
+        with self.get_session() as session:
+            query = session.query(CustomIndex)
+            
+            if search:
+                pattern = f"%{search}%"
+                query = query.filter(or_(
+                    CustomIndex.name.ilike(pattern),
+                    CustomIndex.description.ilike(pattern)
+                ))
+            
+            total = query.count()
+            query = query.order_by(CustomIndex.name)
+            
+            if page_size:
+                query = query.offset((max(page or 1, 1) - 1) * page_size).limit(page_size)
+            
+            return [self._custom_index_to_dict(i) for i in query.all()], total
+    
+    def get_custom_index_names(self) -> List[str]:
+        """获取所有自定义索引名称"""
+        with self.get_session() as session:
+            return [name for (name,) in session.query(CustomIndex.name).order_by(CustomIndex.name)]
+    
+    def create_custom_index(self, index_data: Dict[str, Any]) -> Dict[str, Any]:
+        """创建自定义索引"""
+        with self.get_session() as session:
+            name = index_data.get('name')
+            
+            # 检查是否已存在（依赖name唯一索引）
+            existing = session.query(CustomIndex.id).filter(
+                CustomIndex.name == name
+            ).first()
+            
+            if existing:
+                raise ValueError("索引名称已存在")
+            
+            custom_index = CustomIndex(
+                name=name,
+                description=index_data.get('description', '')
+            )
+            
+            session.add(custom_index)
+            try:
+                session.flush()
+            except IntegrityError:
+                raise ValueError("索引名称已存在")
+            
+            return self._custom_index_to_dict(custom_index)
+    
+    def bulk_create_custom_indices(self, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """批量创建自定义索引，已存在的名称将被跳过"""
+        with self.get_session() as session:
+            # 请求内去重，保留首次出现的条目
+            unique_items = {}
+            for item in items:
+                name = item.get('name')
+                if name and name not in unique_items:
+                    unique_items[name] = item
+            
+            existing = set()
+            if unique_items:
+                existing = {name for (name,) in session.query(CustomIndex.name).filter(
+                    CustomIndex.name.in_(list(unique_items))
+                )}
+            
+            created = []
+            for name, item in unique_items.items():
+                if name in existing:
+                    continue
+                custom_index = CustomIndex(
+                    name=name,
+                    description=item.get('description', '')
+                )
+                for field in ('created_at', 'updated_at'):
+                    value = item.get(field)
+                    if isinstance(value, str):
+                        try:
+                            setattr(custom_index, field, datetime.fromisoformat(value))
+                        except ValueError:
+                            pass
+                if custom_index.created_at and not custom_index.updated_at:
+                    custom_index.updated_at = custom_index.created_at
+                session.add(custom_index)
+                created.append(custom_index)
+            
+            session.flush()
+            
+            return {
+                'created': [self._custom_index_to_dict(i) for i in created],
+                'skipped': sorted(existing)
+            }
+    
+    def update_custom_index(self, name: str, updates: Dict[str, Any]) -> Dict[str, Any]:
+        """更新自定义索引"""
+        with self.get_session() as session:
+            custom_index = session.query(CustomIndex).filter(
+                CustomIndex.name == name
+            ).first()
+            
+            if not custom_index:
+                raise ValueError("索引不存在")
+            
+            if 'description' in updates:
+                custom_index.description = updates['description']
+            custom_index.updated_at = datetime.utcnow()
+            
+            return self._custom_index_to_dict(custom_index)
+    
+    def delete_custom_index(self, name: str) -> bool:
+        """删除自定义索引"""
+        with self.get_session() as session:
+            deleted = session.query(CustomIndex).filter(
+                CustomIndex.name == name
+            ).delete(synchronize_session=False)
+            
+            if not deleted:
+                raise ValueError("索引不存在")
+            
+            return True
+    
+    def bulk_delete_custom_indices(self, names: List[str]) -> int:
+        """批量删除自定义索引，返回删除数量"""
+        if not names:
+            return 0
+        
+        with self.get_session() as session:
+            return session.query(CustomIndex).filter(
+                CustomIndex.name.in_(list(set(names)))
+            ).delete(synchronize_session=False)
+    
+    def _custom_index_to_dict(self, custom_index: CustomIndex) -> Dict[str, Any]:
+        """将自定义索引模型转换为字典"""
+        if not custom_index:
+            return {}
+        
+        return {
+            'id': custom_index.id,
+            'name': custom_index.name,
+            'description': custom_index.description or '',
+            'created_at': custom_index.created_at.isoformat() if custom_index.created_at else None,
+            'updated_at': custom_index.updated_at.isoformat() if custom_index.updated_at else None
+        }
+    
     # ==================== 数据清理 ====================
     
     def cleanup_duplicate_dashboards(self) -> Dict[str, Any]:
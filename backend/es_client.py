@@ -0,0 +1,217 @@
+"""Elasticsearch HTTP 客户端 - 共享连接池、keep-alive 与重试策略"""
+
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config_store import get_config_store
+
+# 默认参数（可在 monitoring.elk 配置节中覆盖）
+DEFAULT_TIMEOUT = 10          # 单次请求读取超时（秒）
+DEFAULT_CONNECT_TIMEOUT = 3   # 建立连接超时（秒）
+DEFAULT_POOL_MAXSIZE = 20     # 每个主机的最大连接数
+DEFAULT_MAX_RETRIES = 3       # 429/503 及连接失败的最大重试次数
+DEFAULT_BACKOFF_FACTOR = 0.3  # 指数退避因子
+
+
+def _dumps(body: Any) -> bytes:
+    """确定性序列化查询体（键排序、无多余空白）"""
+    return json.dumps(body, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+class ESClient:
+    """Elasticsearch 客户端
+
+    基于 requests.Session 复用 TCP/TLS 连接，对 429/503 响应和连接失败
+    进行有限次数的指数退避重试，每次调用都带有超时。
+    """
+
+    def __init__(self, base_url: str, username: str = '', password: str = '',
+                 timeout: float = DEFAULT_TIMEOUT, pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 max_retries: int = DEFAULT_MAX_RETRIES, verify_ssl: bool = True):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,  # 读取超时不重试，避免慢查询放大延迟
+            status=max_retries,
+            status_forcelist=(429, 503),
+            allowed_methods=frozenset(['GET', 'HEAD', 'POST', 'PUT', 'DELETE']),
+            backoff_factor=DEFAULT_BACKOFF_FACTOR,
+            respect_retry_after_header=True,
+            raise_on_status=False,  # 重试耗尽后返回最后一次响应，由调用方处理状态码
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize,
+                              max_retries=retry, pool_block=False)
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # _bulk 不在传输层重试：写入器自行处理整批重试与单条文档的 429 退避，
+        # 传输层重试会与之叠加，放大对已限流集群的压力
+        self.session.mount(f"{self.base_url}/_bulk",
+                           HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0))
+        self.session.headers.update({'Connection': 'keep-alive'})
+        self.session.verify = verify_ssl
+        if username:
+            self.session.auth = (username, password)
+
+    def request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                json: Any = None, data: Any = None, headers: Optional[Dict[str, str]] = None,
+                timeout: Optional[float] = None, stream: bool = False) -> requests.Response:
+        """发送请求，path 为以 / 开头的相对路径"""
+        read_timeout = timeout if timeout is not None else self.timeout
+        return self.session.request(
+            method, f"{self.base_url}{path}",
+            params=params, json=json, data=data, headers=headers,
+            timeout=(DEFAULT_CONNECT_TIMEOUT, read_timeout), stream=stream
+        )
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request('POST', path, **kwargs)
+
+    def delete(self, path: str, **kwargs) -> requests.Response:
+        return self.request('DELETE', path, **kwargs)
+
+    def search(self, index: Optional[str], body: Dict[str, Any], params: Optional[Dict[str, Any]] = None,
+               timeout: Optional[float] = None) -> requests.Response:
+        """执行 _search 查询（使用 point-in-time 时 index 传 None）
+
+        查询体按键排序序列化，相同的查询得到相同的字节，纯聚合查询（size=0）
+        显式启用分片请求缓存。
+        """
+        path = f"/{index}/_search" if index else "/_search"
+        if body.get('size') == 0 and 'pit' not in body:
+            params = dict(params or {})
+            params.setdefault('request_cache', 'true')
+        return self.post(path, data=_dumps(body), params=params, timeout=timeout,
+                         headers={'Content-Type': 'application/json'})
+
+    def msearch(self, searches: List[Tuple[Optional[str], Dict[str, Any]]],
+                timeout: Optional[float] = None) -> requests.Response:
+        """执行 _msearch，searches 为 (index, body) 列表，一次往返完成多个查询"""
+        lines = []
+        for index, body in searches:
+            header: Dict[str, Any] = {"index": index} if index else {}
+            if body.get('size') == 0:
+                header["request_cache"] = True
+            lines.append(_dumps(header))
+            lines.append(_dumps(body))
+        payload = b'\n'.join(lines) + b'\n'
+        return self.post('/_msearch', data=payload, timeout=timeout,
+                         headers={'Content-Type': 'application/x-ndjson'})
+
+    def bulk(self, payload: bytes, timeout: Optional[float] = None) -> requests.Response:
+        """执行 _bulk，payload 为已编码的 NDJSON（以换行结尾），不在传输层重试"""
+        return self.post('/_bulk', data=payload, timeout=timeout,
+                         headers={'Content-Type': 'application/x-ndjson'})
+
+    def open_point_in_time(self, index: str, keep_alive: str = '1m') -> str:
+        """打开 point-in-time，返回 PIT id"""
+        response = self.post(f"/{index}/_pit", params={"keep_alive": keep_alive})
+        if response.status_code != 200:
+            raise requests.exceptions.HTTPError(
+                f"打开point-in-time失败: {response.status_code}", response=response
+            )
+        return response.json()['id']
+
+    def close_point_in_time(self, pit_id: str):
+        """关闭 point-in-time（失败时忽略，PIT 会在 keep_alive 到期后自动释放）"""
+        try:
+            self.delete('/_pit', json={"id": pit_id})
+        except requests.exceptions.RequestException:
+            pass
+
+    def submit_async_search(self, index: str, body: Dict[str, Any], wait_timeout: str = '1s',
+                            keep_alive: str = '5m') -> requests.Response:
+        """提交 _async_search，在 wait_timeout 内完成时直接返回结果
+
+        keep_on_completion 保证总是返回可轮询的 id，结果由调用方负责删除。
+        """
+        params = {
+            "wait_for_completion_timeout": wait_timeout,
+            "keep_alive": keep_alive,
+            "keep_on_completion": "true"
+        }
+        return self.post(f"/{index}/_async_search", data=_dumps(body), params=params,
+                         headers={'Content-Type': 'application/json'})
+
+    def get_async_search(self, search_id: str, wait_timeout: str = '1s',
+                         keep_alive: Optional[str] = None) -> requests.Response:
+        """轮询 _async_search 的当前结果（可能是部分结果）"""
+        params = {"wait_for_completion_timeout": wait_timeout}
+        if keep_alive:
+            params["keep_alive"] = keep_alive
+        return self.get(f"/_async_search/{quote(search_id, safe='')}", params=params)
+
+    def delete_async_search(self, search_id: str) -> bool:
+        """删除 _async_search（仍在运行时取消 ES 任务），返回是否成功"""
+        try:
+            response = self.delete(f"/_async_search/{quote(search_id, safe='')}")
+        except requests.exceptions.RequestException:
+            return False
+        return response.status_code in (200, 404)
+
+    def close(self):
+        """关闭连接池"""
+        self.session.close()
+
+
+# 单例实例及其对应的配置 (client, settings)，整体替换保证一致性
+_es_state = None
+_es_client_lock = threading.Lock()
+
+
+def _client_settings(elk_config) -> Tuple:
+    """提取影响客户端构建的配置项"""
+    return (
+        (elk_config.get('elasticsearch_url') or '').rstrip('/'),
+        elk_config.get('username', ''),
+        elk_config.get('password', ''),
+        elk_config.get('timeout', DEFAULT_TIMEOUT),
+        elk_config.get('pool_maxsize', DEFAULT_POOL_MAXSIZE),
+        elk_config.get('max_retries', DEFAULT_MAX_RETRIES),
+        elk_config.get('verify_ssl', True),
+    )
+
+
+def get_es_client() -> Optional[ESClient]:
+    """获取 ES 客户端实例，monitoring.elk 配置变化时自动重建
+
+    ELK 未启用或未配置地址时返回 None。
+    """
+    global _es_state
+
+    elk_config = get_config_store().elk_config()
+    if not elk_config.get('enabled', False):
+        return None
+
+    settings = _client_settings(elk_config)
+    if not settings[0]:
+        return None
+
+    state = _es_state
+    if state is not None and state[1] == settings:
+        return state[0]
+
+    with _es_client_lock:
+        if _es_state is None or _es_state[1] != settings:
+            url, username, password, timeout, pool_maxsize, max_retries, verify_ssl = settings
+            client = ESClient(
+                url, username=username, password=password,
+                timeout=float(timeout), pool_maxsize=int(pool_maxsize),
+                max_retries=int(max_retries), verify_ssl=bool(verify_ssl)
+            )
+            # 旧连接池可能仍被进行中的请求使用，不主动关闭，交由垃圾回收释放
+            _es_state = (client, settings)
+        return _es_state[0]
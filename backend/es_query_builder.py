@@ -0,0 +1,185 @@
+"""ES 查询构建 - 基于字段映射选择精确匹配字段，生成确定性的 filter 上下文查询
+
+同样的输入总是生成同样的查询体（时间边界按分钟取整），配合 ES 的节点查询缓存
+与分片请求缓存使用。
+"""
+
+import threading
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from ttl_cache import TTLCache
+
+MAPPING_TTL = 300            # 字段映射缓存时间（秒）
+TIME_ROUNDING_MS = 60 * 1000  # 时间边界取整粒度（1 分钟）
+
+# 全文检索使用的字段
+TEXT_SEARCH_FIELDS = ["message", "service", "source"]
+
+_UNKNOWN = object()
+
+
+def round_down(ts_ms: int, unit_ms: int = TIME_ROUNDING_MS) -> int:
+    """向下取整到时间边界"""
+    return ts_ms - ts_ms % unit_ms
+
+
+def round_up(ts_ms: int, unit_ms: int = TIME_ROUNDING_MS) -> int:
+    """向上取整到时间边界"""
+    return round_down(ts_ms + unit_ms - 1, unit_ms)
+
+
+def time_range_filter(start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+                      time_range: Optional[str] = None, field: str = '@timestamp') -> Dict[str, Any]:
+    """构建 @timestamp 范围过滤
+
+    绝对时间按分钟取整（起点向下、终点向上），相对时间使用 now-X/m 取整，
+    保证同一分钟内的重复查询生成相同的查询体。
+    """
+    if start_ms is None and end_ms is None:
+        return {"range": {field: {"gte": f"now-{time_range}/m"}}}
+
+    bounds: Dict[str, Any] = {"format": "epoch_millis"}
+    if start_ms is not None:
+        bounds["gte"] = round_down(start_ms)
+    if end_ms is not None:
+        bounds["lte"] = round_up(end_ms)
+    return {"range": {field: bounds}}
+
+
+def _case_variants(value: str) -> List[str]:
+    """精确匹配区分大小写，同时匹配原值与大小写变体（如 error/ERROR/Error）"""
+    return sorted({value, value.lower(), value.upper(), value.capitalize()})
+
+
+def _collect_types(mapping_response: Dict[str, Any]) -> Dict[str, set]:
+    """解析 _mapping/field 结果为 {字段名: {类型集合}}（兼容 ES 6 的 type 层级）"""
+    types: Dict[str, set] = {}
+
+    def visit(fields: Dict[str, Any]):
+        for name, info in fields.items():
+            if not isinstance(info, dict):
+                continue
+            if 'full_name' in info:
+                for leaf in info.get('mapping', {}).values():
+                    if isinstance(leaf, dict) and leaf.get('type'):
+                        types.setdefault(info['full_name'], set()).add(leaf['type'])
+            else:
+                visit(info)
+
+    for index_data in mapping_response.values():
+        if isinstance(index_data, dict):
+            visit(index_data.get('mappings', {}))
+    return types
+
+
+class FieldMappingCache:
+    """字段映射缓存
+
+    按 (索引模式, 字段) 查询并缓存 _mapping/field，判断精确匹配应使用的字段：
+    字段本身为 keyword 时直接使用，否则使用 keyword 子字段；都没有时返回 None，
+    由调用方退回到 match 查询。
+    """
+
+    def __init__(self, ttl: float = MAPPING_TTL):
+        self._cache = TTLCache(maxsize=512, ttl=ttl)
+
+    def exact_field(self, es, index_pattern: str, field: str) -> Optional[str]:
+        cache_key = (index_pattern, field)
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            return None if cached is _UNKNOWN else cached
+
+        keyword_field = f"{field}.keyword"
+        try:
+            response = es.get(f"/{index_pattern}/_mapping/field/{field},{keyword_field}")
+            if response.status_code != 200:
+                return None  # 暂不缓存失败结果
+            types = _collect_types(response.json())
+        except (requests.exceptions.RequestException, ValueError):
+            return None
+
+        if types.get(field) == {'keyword'}:
+            result = field
+        elif types.get(keyword_field) == {'keyword'}:
+            result = keyword_field
+        else:
+            result = None
+        self._cache.set(cache_key, result if result is not None else _UNKNOWN)
+        return result
+
+    def clear(self):
+        self._cache.clear()
+
+
+class QueryBuilder:
+    """单个索引模式的查询构建器，所有条件都放在 filter 上下文中
+
+    field_map 将逻辑字段（timestamp/level/service/message/source）映射为该索引
+    实际使用的字段名，未映射的字段按原名使用（timestamp 默认为 @timestamp）。
+    """
+
+    def __init__(self, es, index_pattern: str, mappings: Optional[FieldMappingCache] = None,
+                 field_map: Optional[Dict[str, str]] = None):
+        self.es = es
+        self.index_pattern = index_pattern
+        self.mappings = mappings or get_field_mapping_cache()
+        self.field_map = field_map or {}
+
+    def field(self, name: str) -> str:
+        """逻辑字段对应的实际字段名"""
+        return self.field_map.get(name) or ('@timestamp' if name == 'timestamp' else name)
+
+    def exact_field(self, field: str) -> Optional[str]:
+        return self.mappings.exact_field(self.es, self.index_pattern, self.field(field))
+
+    def level_field(self, default: str = 'level.keyword') -> str:
+        """级别聚合使用的字段"""
+        return self.exact_field('level') or default
+
+    def service_field(self, default: str = 'service.keyword') -> str:
+        """服务聚合（活跃服务数）使用的字段"""
+        return self.exact_field('service') or default
+
+    def term_filter(self, field: str, value: str) -> Dict[str, Any]:
+        """精确匹配过滤：有 keyword 字段时使用 terms，否则退回 match"""
+        exact = self.exact_field(field)
+        if exact:
+            return {"terms": {exact: _case_variants(value)}}
+        return {"match": {self.field(field): value}}
+
+    def text_filter(self, query: str, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """全文检索过滤（filter 上下文不计算评分，结果按时间排序）"""
+        return {
+            "multi_match": {
+                "query": query,
+                "fields": [self.field(f) for f in (fields or TEXT_SEARCH_FIELDS)]
+            }
+        }
+
+    def log_filters(self, level: str = 'all', service: str = 'all', match_pattern: str = '') -> List[Dict[str, Any]]:
+        """日志级别、服务与全文检索过滤条件（顺序固定）"""
+        filters = []
+        if level and level != 'all':
+            filters.append(self.term_filter('level', level))
+        if service and service != 'all':
+            filters.append(self.term_filter('service', service))
+        if match_pattern:
+            filters.append(self.text_filter(match_pattern))
+        return filters
+
+
+# 单例实例
+_field_mapping_cache = None
+_field_mapping_cache_lock = threading.Lock()
+
+
+def get_field_mapping_cache() -> FieldMappingCache:
+    """获取字段映射缓存实例"""
+    global _field_mapping_cache
+    if _field_mapping_cache is None:
+        with _field_mapping_cache_lock:
+            if _field_mapping_cache is None:
+                _field_mapping_cache = FieldMappingCache()
+    return _field_mapping_cache
@@ -0,0 +1,263 @@
+"""ES 索引目录 - 后台定时刷新 _cat/indices，内存中提供过滤、排序、分页与增量变更"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from config_store import get_config_store
+from es_client import get_es_client
+
+DEFAULT_REFRESH_INTERVAL = 60   # 后台刷新间隔（秒），可由 monitoring.elk.catalog_refresh_interval 覆盖
+MIN_REFRESH_INTERVAL = 10
+MAX_CHANGE_LOG = 200            # 保留的变更记录数，更早的版本需要全量同步
+
+CAT_COLUMNS = ("index,health,status,uuid,pri,rep,docs.count,docs.deleted,"
+               "store.size,pri.store.size,creation.date,creation.date.string")
+SORT_FIELDS = ('index', 'docs_count', 'size_bytes', 'creation_date')
+
+_SIZE_UNITS = ['b', 'kb', 'mb', 'gb', 'tb', 'pb']
+
+
+def _to_int(value: Any) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def format_bytes(size: int) -> str:
+    """格式化字节数（与 _cat 接口的人类可读格式一致，如 1.2gb）"""
+    value = float(size)
+    for unit in _SIZE_UNITS:
+        if value < 1024 or unit == _SIZE_UNITS[-1]:
+            text = f"{value:.1f}".rstrip('0').rstrip('.') if unit != 'b' else str(int(value))
+            return f"{text}{unit}"
+        value /= 1024
+    return f"{size}b"
+
+
+def is_log_index(name: str, data_stream: Optional[str] = None) -> bool:
+    """是否为日志相关索引（数据流的后备索引按数据流名称判断）"""
+    if data_stream:
+        name = data_stream
+    elif name.startswith('.'):
+        return False
+    lower = name.lower()
+    return 'log' in lower or 'filebeat' in lower or 'metricbeat' in lower
+
+
+class IndexCatalog:
+    """ES 索引目录
+
+    后台线程定时拉取 _cat/indices（bytes=b 直接取整数大小）、别名与数据流，
+    与上一次结果比较，有变化时递增版本号并记录变更，客户端可以只获取
+    某个版本之后的变更。查询全部在内存中完成，不再每次访问 ES。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._revision = 0
+        self._changes: deque = deque(maxlen=MAX_CHANGE_LOG)  # (版本号, 新增/更新的条目, 删除的索引名)
+        self._last_refresh: Optional[float] = None
+        self._last_error: Optional[str] = None
+        self._source_url: Optional[str] = None
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ==================== 刷新 ====================
+
+    def _refresh_interval(self) -> float:
+        interval = get_config_store().elk_config().get('catalog_refresh_interval', DEFAULT_REFRESH_INTERVAL)
+        try:
+            return max(float(interval), MIN_REFRESH_INTERVAL)
+        except (TypeError, ValueError):
+            return DEFAULT_REFRESH_INTERVAL
+
+    def ensure_started(self):
+        """启动后台刷新线程（首次访问时调用）"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='index-catalog', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self._refresh_interval())
+            self._wake.clear()
+            if get_es_client() is None:
+                continue
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"刷新索引目录失败: {e}")
+
+    def _fetch(self, es) -> Dict[str, Dict[str, Any]]:
+        """从 ES 拉取索引、别名与数据流信息"""
+        response = es.get('/_cat/indices', params={"format": "json", "bytes": "b", "h": CAT_COLUMNS})
+        if response.status_code != 200:
+            raise RuntimeError(f"Elasticsearch查询失败: {response.status_code}")
+        indices = response.json()
+
+        aliases: Dict[str, List[str]] = {}
+        response = es.get('/_cat/aliases', params={"format": "json", "h": "alias,index"})
+        if response.status_code == 200:
+            for item in response.json():
+                aliases.setdefault(item.get('index', ''), []).append(item.get('alias', ''))
+
+        # 数据流接口在 7.9 之前的版本不存在，失败时忽略
+        data_streams: Dict[str, str] = {}
+        response = es.get('/_data_stream')
+        if response.status_code == 200:
+            for stream in response.json().get('data_streams', []):
+                for backing in stream.get('indices', []):
+                    data_streams[backing.get('index_name', '')] = stream.get('name')
+
+        entries = {}
+        for index in indices:
+            name = index.get('index', '')
+            data_stream = data_streams.get(name)
+            if name.startswith('.') and not data_stream:
+                continue  # 系统索引
+            size_bytes = _to_int(index.get('store.size'))
+            pri_store_size_bytes = _to_int(index.get('pri.store.size'))
+            entries[name] = {
+                "index": name,
+                "health": index.get('health') or 'unknown',
+                "status": index.get('status') or 'unknown',
+                "uuid": index.get('uuid', ''),
+                "pri": index.get('pri', '0'),
+                "rep": index.get('rep', '0'),
+                "docs_count": _to_int(index.get('docs.count')),
+                "docs_deleted": _to_int(index.get('docs.deleted')),
+                "size": format_bytes(size_bytes),
+                "size_bytes": size_bytes,
+                "pri_store_size": format_bytes(pri_store_size_bytes),
+                "pri_store_size_bytes": pri_store_size_bytes,
+                "creation_date": index.get('creation.date', ''),
+                "creation_date_string": index.get('creation.date.string', ''),
+                "aliases": sorted(aliases.get(name, [])),
+                "data_stream": data_stream,
+                "is_log": is_log_index(name, data_stream)
+            }
+        return entries
+
+    def refresh(self) -> int:
+        """立即刷新目录，返回刷新后的版本号；失败时保留上一次的结果并抛出异常"""
+        es = get_es_client()
+        if es is None:
+            raise RuntimeError("ELK Stack未启用或Elasticsearch URL未配置")
+
+        with self._refresh_lock:
+            try:
+                entries = self._fetch(es)
+            except (requests.exceptions.RequestException, RuntimeError, ValueError) as e:
+                with self._lock:
+                    self._last_error = str(e)
+                raise
+
+            with self._lock:
+                if self._source_url != es.base_url:
+                    # 切换了集群，旧版本的变更记录不再适用
+                    self._changes.clear()
+                    self._source_url = es.base_url
+                upserted = [entry for name, entry in entries.items() if self._entries.get(name) != entry]
+                removed = [name for name in self._entries if name not in entries]
+                if upserted or removed:
+                    self._revision += 1
+                    self._changes.append((self._revision, upserted, removed))
+                    self._entries = entries
+                self._last_refresh = time.time()
+                self._last_error = None
+                return self._revision
+
+    # ==================== 查询 ====================
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "revision": self._revision,
+                "last_refresh": self._last_refresh,
+                "last_error": self._last_error,
+                "count": len(self._entries)
+            }
+
+    def ready(self) -> bool:
+        return self._last_refresh is not None
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """当前全部索引条目（只读使用）"""
+        with self._lock:
+            return list(self._entries.values())
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return list(self._entries)
+
+    def query(self, search: str = '', scope: str = 'log', health: str = '', sort: str = 'index',
+              order: str = 'desc') -> List[Dict[str, Any]]:
+        """按条件过滤并排序索引条目"""
+        entries = self.entries()
+        search = search.lower()
+        result = [
+            entry for entry in entries
+            if (scope != 'log' or entry['is_log'])
+            and (not search or search in entry['index'].lower()
+                 or any(search in alias.lower() for alias in entry['aliases'])
+                 or (entry['data_stream'] and search in entry['data_stream'].lower()))
+            and (not health or entry['health'] == health)
+        ]
+        sort = sort if sort in SORT_FIELDS else 'index'
+        if sort == 'creation_date':
+            key = lambda entry: _to_int(entry['creation_date'])
+        else:
+            key = lambda entry: entry[sort]
+        result.sort(key=key, reverse=(order != 'asc'))
+        return result
+
+    def changes_since(self, revision: int) -> Optional[Tuple[int, List[Dict[str, Any]], List[str]]]:
+        """获取某版本之后的变更 (当前版本, 新增/更新的条目, 删除的索引名)
+
+        变更记录已被淘汰（或版本号无效）时返回 None，客户端需要全量同步。
+        """
+        with self._lock:
+            if revision > self._revision:
+                return None
+            if revision == self._revision:
+                return self._revision, [], []
+            if not self._changes or self._changes[0][0] > revision + 1:
+                return None
+
+            upserted: Dict[str, Dict[str, Any]] = {}
+            removed = set()
+            for change_revision, changed, deleted in self._changes:
+                if change_revision <= revision:
+                    continue
+                for entry in changed:
+                    upserted[entry['index']] = entry
+                    removed.discard(entry['index'])
+                for name in deleted:
+                    upserted.pop(name, None)
+                    removed.add(name)
+            return self._revision, list(upserted.values()), sorted(removed)
+
+
+# 单例实例
+_index_catalog = None
+_index_catalog_lock = threading.Lock()
+
+
+def get_index_catalog() -> IndexCatalog:
+    """获取索引目录实例"""
+    global _index_catalog
+    if _index_catalog is None:
+        with _index_catalog_lock:
+            if _index_catalog is None:
+                _index_catalog = IndexCatalog()
+    return _index_catalog
@@ -0,0 +1,113 @@
+"""索引解析 - 按时间范围把 logstash-* 这类按日期命名的索引模式收窄为窗口内的索引"""
+
+import fnmatch
+import re
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from enhanced_data_service import get_enhanced_data_service
+from index_catalog import get_index_catalog
+from ttl_cache import TTLCache
+
+# 内置的按日期滚动的索引模式，自定义索引中以 * 结尾的名称同样参与裁剪
+BUILTIN_PATTERNS = ('logstash-*', 'filebeat-*')
+
+TIMEZONE_SLACK_MS = 14 * 60 * 60 * 1000  # 索引日期可能按本地时区生成，窗口两端各放宽 14 小时
+MAX_TARGETS = 62                         # 超过该数量的日期表达式时不再裁剪
+
+# 索引名末尾的日期后缀：YYYY.MM.DD / YYYY-MM-DD / YYYY.MM / YYYY-MM
+_DATE_SUFFIX = re.compile(r'(\d{4})([.\-])(\d{2})(?:\2(\d{2}))?$')
+
+_custom_patterns_cache = TTLCache(maxsize=1, ttl=60)
+
+
+def _custom_patterns() -> List[str]:
+    """自定义索引中的通配模式（短暂缓存，避免每次查询都访问数据库）"""
+    patterns = _custom_patterns_cache.get('patterns')
+    if patterns is None:
+        try:
+            names = get_enhanced_data_service().get_custom_index_names()
+        except Exception as e:
+            print(f"加载自定义索引失败: {e}")
+            names = []
+        patterns = [name for name in names if name.endswith('*')]
+        _custom_patterns_cache.set('patterns', patterns)
+    return patterns
+
+
+def _is_prunable(pattern: str) -> bool:
+    """只裁剪已知的 前缀* 形式模式"""
+    if pattern.count('*') != 1 or not pattern.endswith('*') or '?' in pattern:
+        return False
+    return pattern in BUILTIN_PATTERNS or pattern in _custom_patterns()
+
+
+def _date_suffix(name: str) -> Optional[Tuple[str, bool]]:
+    """解析索引名的日期后缀，返回 (分隔符, 是否按日)；无日期后缀时返回 None"""
+    match = _DATE_SUFFIX.search(name)
+    if not match:
+        return None
+    return match.group(2), match.group(4) is not None
+
+
+def _date_expressions(pattern: str, separator: str, daily: bool, start_ms: int, end_ms: int) -> List[str]:
+    """生成覆盖窗口的按日期通配表达式（如 logstash-*2026.10.17）"""
+    prefix = pattern[:-1]
+    start = datetime.fromtimestamp((start_ms - TIMEZONE_SLACK_MS) / 1000, tz=timezone.utc)
+    end = datetime.fromtimestamp((end_ms + TIMEZONE_SLACK_MS) / 1000, tz=timezone.utc)
+
+    expressions = []
+    if daily:
+        day = start.date()
+        while day <= end.date() and len(expressions) <= MAX_TARGETS:
+            expressions.append(f"{prefix}*{day.strftime(f'%Y{separator}%m{separator}%d')}")
+            day += timedelta(days=1)
+    else:
+        year, month = start.year, start.month
+        while (year, month) <= (end.year, end.month) and len(expressions) <= MAX_TARGETS:
+            expressions.append(f"{prefix}*{year:04d}{separator}{month:02d}")
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return expressions
+
+
+def _resolve_one(pattern: str, start_ms: int, end_ms: int) -> str:
+    if not _is_prunable(pattern):
+        return pattern
+
+    catalog = get_index_catalog()
+    catalog.ensure_started()
+    if not catalog.ready():
+        return pattern
+
+    candidates = [name for name in catalog.names() if fnmatch.fnmatchcase(name, pattern)]
+    if not candidates:
+        return pattern
+
+    # 所有匹配的索引都必须使用同一种日期后缀，否则无法判断时间范围
+    suffixes = {_date_suffix(name) for name in candidates}
+    if len(suffixes) != 1 or None in suffixes:
+        return pattern
+    separator, daily = suffixes.pop()
+
+    expressions = _date_expressions(pattern, separator, daily, start_ms, end_ms)
+    if len(expressions) > MAX_TARGETS:
+        return pattern
+    # 使用通配表达式而不是具体索引名：目录刷新之后新建的当天索引同样能匹配，
+    # 期间被删除的索引也不会导致 index_not_found
+    return ','.join(expressions)
+
+
+def resolve_index(index_pattern: str, start_ms: Optional[int], end_ms: Optional[int] = None) -> str:
+    """将索引模式收窄为与 [start_ms, end_ms] 重叠的日期索引
+
+    仅处理 logstash-*、filebeat-* 及自定义索引中以 * 结尾的模式，并且要求目录中
+    所有匹配的索引都带有 YYYY.MM.DD（或 YYYY.MM）日期后缀；无法判断时原样返回。
+    """
+    if not index_pattern or start_ms is None:
+        return index_pattern
+    if end_ms is None:
+        end_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+
+    parts = [part.strip() for part in index_pattern.split(',') if part.strip()]
+    resolved = [_resolve_one(part, start_ms, end_ms) for part in parts]
+    return ','.join(resolved)
@@ -0,0 +1,121 @@
+"""异步日志检索 - 基于 ES _async_search 的提交/轮询/取消，及无人轮询检索的自动回收"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+ASYNC_KEEP_ALIVE = '5m'        # ES 端保留结果的时间（每次轮询时续期）
+SUBMIT_WAIT_TIMEOUT = '1s'     # 提交时等待完成的时间，快速查询可直接返回结果
+MAX_POLL_WAIT = 5              # 单次轮询最多等待的秒数，避免长时间占用工作线程
+ABANDON_TIMEOUT = 60           # 超过该时间（秒）无人轮询的检索视为已放弃并取消
+REAP_INTERVAL = 10             # 回收线程的检查间隔（秒）
+MAX_ACTIVE_SEARCHES = 100      # 同时登记的异步检索上限
+
+
+class AsyncSearchEntry:
+    """一个已提交的异步检索"""
+
+    def __init__(self, es, search_id: str, index: str, projection, params: Dict[str, Any]):
+        self.es = es
+        self.id = search_id
+        self.index = index
+        self.projection = projection
+        self.params = params
+        self.created = time.time()
+        self.last_poll = self.created
+        self.completed = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "index": self.index,
+            "params": self.params,
+            "created": self.created,
+            "last_poll": self.last_poll,
+            "completed": self.completed
+        }
+
+
+class AsyncSearchRegistry:
+    """异步检索登记表
+
+    客户端每次轮询都会刷新 last_poll；后台线程定期删除超过 ABANDON_TIMEOUT
+    无人轮询的检索，客户端断开后 ES 上的任务与结果会被自动取消和释放。
+    """
+
+    def __init__(self, abandon_timeout: float = ABANDON_TIMEOUT, max_active: int = MAX_ACTIVE_SEARCHES):
+        self.abandon_timeout = abandon_timeout
+        self.max_active = max_active
+        self._entries: Dict[str, AsyncSearchEntry] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def ensure_started(self):
+        """启动后台回收线程（首次提交时调用）"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='async-search-reaper', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(REAP_INTERVAL)
+            try:
+                self.reap()
+            except Exception as e:
+                print(f"回收异步检索失败: {e}")
+
+    def full(self) -> bool:
+        with self._lock:
+            return len(self._entries) >= self.max_active
+
+    def register(self, es, search_id: str, index: str, projection, params: Dict[str, Any]) -> AsyncSearchEntry:
+        entry = AsyncSearchEntry(es, search_id, index, projection, params)
+        with self._lock:
+            self._entries[search_id] = entry
+        self.ensure_started()
+        return entry
+
+    def touch(self, search_id: str) -> Optional[AsyncSearchEntry]:
+        """记录一次轮询，检索不存在（已取消或已回收）时返回 None"""
+        with self._lock:
+            entry = self._entries.get(search_id)
+            if entry is not None:
+                entry.last_poll = time.time()
+            return entry
+
+    def remove(self, search_id: str) -> Optional[AsyncSearchEntry]:
+        with self._lock:
+            return self._entries.pop(search_id, None)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [entry.to_dict() for entry in self._entries.values()]
+
+    def reap(self) -> int:
+        """取消无人轮询的检索，返回回收的数量"""
+        deadline = time.time() - self.abandon_timeout
+        with self._lock:
+            abandoned = [entry for entry in self._entries.values() if entry.last_poll < deadline]
+            for entry in abandoned:
+                del self._entries[entry.id]
+        for entry in abandoned:
+            entry.es.delete_async_search(entry.id)
+        return len(abandoned)
+
+
+# 单例实例
+_async_search_registry = None
+_async_search_registry_lock = threading.Lock()
+
+
+def get_async_search_registry() -> AsyncSearchRegistry:
+    """获取异步检索登记表实例"""
+    global _async_search_registry
+    if _async_search_registry is None:
+        with _async_search_registry_lock:
+            if _async_search_registry is None:
+                _async_search_registry = AsyncSearchRegistry()
+    return _async_search_registry
@@ -0,0 +1,135 @@
+"""日志上下文 - 查询某条日志前后来自同一主机/服务/容器的若干条日志"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from log_hits import lookup_field
+from log_multi_search import search_executor
+
+# 用于限定上下文来源的字段（存在于锚点日志中的字段才参与过滤）
+CONTEXT_FIELDS = ('host.name', 'service', 'container_name')
+DEFAULT_CONTEXT_LINES = 50
+MAX_CONTEXT_LINES = 500
+CONTEXT_WINDOW_MS = 60 * 60 * 1000   # 只在锚点前后该时间范围内查找，保证查询有界
+CONTEXT_PIT_KEEP_ALIVE = '30s'
+CONTEXT_TIMEOUT = 10
+
+
+class ContextError(Exception):
+    """上下文查询失败（携带 HTTP 状态码）"""
+
+    def __init__(self, message: str, status: int = 500):
+        super().__init__(message)
+        self.status = status
+
+
+def context_source(source: Dict[str, Any]) -> Dict[str, Any]:
+    """锚点日志中可用于过滤的来源字段 {字段: 值}"""
+    matched = {}
+    for field in CONTEXT_FIELDS:
+        value = lookup_field(source, field)
+        if isinstance(value, (str, int, float)) and not isinstance(value, bool) and value != '':
+            matched[field] = value
+    return matched
+
+
+def _source_clauses(builder, matched: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """来源字段的精确过滤：有 keyword 字段时用 term，否则退回 match_phrase"""
+    clauses = []
+    for field, value in matched.items():
+        exact = builder.exact_field(field)
+        if exact:
+            clauses.append({"term": {exact: value}})
+        else:
+            clauses.append({"match_phrase": {builder.field(field): value}})
+    return clauses
+
+
+class LogContextQuery:
+    """单次上下文查询
+
+    在同一个 point-in-time 内先按 id 取得锚点日志的排序值，再以该排序值为起点
+    并发执行两个方向相反的 search_after 查询。PIT 保证两个方向看到同一份快照，
+    _shard_doc 作为决胜字段保证同一毫秒内的日志不重复、不遗漏。
+    """
+
+    def __init__(self, es, builder, index: str, doc_id: str, window_ms: int = CONTEXT_WINDOW_MS):
+        self.es = es
+        self.builder = builder
+        self.index = index
+        self.doc_id = doc_id
+        self.window_ms = window_ms
+        self.pit_id: Optional[str] = None
+
+    def _search(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        body["pit"] = {"id": self.pit_id, "keep_alive": CONTEXT_PIT_KEEP_ALIVE}
+        response = self.es.search(None, body, timeout=CONTEXT_TIMEOUT)
+        if response.status_code != 200:
+            raise ContextError(f"Elasticsearch查询失败: {response.status_code}")
+        data = response.json()
+        self.pit_id = data.get('pit_id', self.pit_id)
+        return data
+
+    def _sort(self, order: str) -> List[Dict[str, Any]]:
+        return [
+            {self.builder.field('timestamp'): {"order": order}},
+            {"_shard_doc": order}
+        ]
+
+    def _anchor(self) -> Dict[str, Any]:
+        data = self._search({
+            "size": 1,
+            "query": {"ids": {"values": [self.doc_id]}},
+            "sort": self._sort('asc')
+        })
+        hits = data.get('hits', {}).get('hits', [])
+        if not hits or not hits[0].get('sort'):
+            raise ContextError("日志不存在", 404)
+        return hits[0]
+
+    def _neighbors(self, anchor: Dict[str, Any], clauses: List[Dict[str, Any]], order: str,
+                   size: int) -> List[Dict[str, Any]]:
+        if size <= 0:
+            return []
+        anchor_ts = anchor['sort'][0]
+        bounds = {"format": "epoch_millis"}
+        if order == 'asc':
+            bounds.update({"gte": anchor_ts, "lte": anchor_ts + self.window_ms})
+        else:
+            bounds.update({"gte": anchor_ts - self.window_ms, "lte": anchor_ts})
+        data = self._search({
+            "size": size,
+            "track_total_hits": False,
+            "query": {
+                "bool": {
+                    "filter": clauses + [{"range": {self.builder.field('timestamp'): bounds}}]
+                }
+            },
+            "sort": self._sort(order),
+            "search_after": anchor['sort']
+        })
+        return data.get('hits', {}).get('hits', [])
+
+    def run(self, before: int, after: int) -> Tuple[Dict[str, Any], List[Dict[str, Any]],
+                                                    List[Dict[str, Any]], Dict[str, Any]]:
+        """返回 (锚点, 之前的日志(时间升序), 之后的日志(时间升序), 来源过滤字段)"""
+        try:
+            self.pit_id = self.es.open_point_in_time(self.index, CONTEXT_PIT_KEEP_ALIVE)
+        except requests.exceptions.HTTPError as e:
+            status = e.response.status_code if e.response is not None else 500
+            raise ContextError("索引不存在" if status == 404 else str(e), 404 if status == 404 else 500)
+
+        try:
+            anchor = self._anchor()
+            matched = context_source(anchor.get('_source', {}))
+            clauses = _source_clauses(self.builder, matched)
+
+            # 两个方向并发查询：之后的日志交给共享线程池，之前的日志在当前线程执行
+            after_future = search_executor.submit(self._neighbors, anchor, clauses, 'asc', after)
+            before_hits = self._neighbors(anchor, clauses, 'desc', before)
+            after_hits = after_future.result(timeout=CONTEXT_TIMEOUT + 5)
+            before_hits.reverse()
+            return anchor, before_hits, after_hits, matched
+        finally:
+            self.es.close_point_in_time(self.pit_id)
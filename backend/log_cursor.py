@@ -0,0 +1,53 @@
+"""日志分页游标 - 基于 search_after 与 point-in-time 的深度分页"""
+
+import base64
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+CURSOR_VERSION = 2  # 2: 不带 PIT 的游标以 _id（而非 _doc）决胜
+PIT_KEEP_ALIVE = '2m'
+
+
+def query_fingerprint(params: Dict[str, Any]) -> str:
+    """计算查询条件指纹，用于校验游标与查询条件是否一致"""
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def encode_cursor(sort_values: List[Any], fingerprint: str, range_start: Optional[int],
+                  pit_id: Optional[str] = None, total: Optional[int] = None,
+                  total_relation: str = 'eq') -> str:
+    """将最后一条命中的排序值等信息编码为不透明游标
+
+    range_start 为首页解析出的绝对时间下界（毫秒），翻页过程中保持不变；
+    首页总数只是下限（total_relation 为 gte）时一并记录。
+    """
+    payload = {
+        'v': CURSOR_VERSION,
+        's': sort_values,
+        'f': fingerprint,
+        'r': range_start,
+    }
+    if pit_id:
+        payload['p'] = pit_id
+    if total is not None:
+        payload['t'] = total
+        if total_relation != 'eq':
+            payload['tr'] = total_relation
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """解码游标，格式非法时抛出 ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError("无效的分页游标")
+
+    if (not isinstance(payload, dict) or payload.get('v') != CURSOR_VERSION
+            or not isinstance(payload.get('s'), list) or 'r' not in payload):
+        raise ValueError("无效的分页游标")
+    return payload
@@ -0,0 +1,148 @@
+"""日志导出 - 基于 point-in-time + search_after 分批拉取并流式输出 NDJSON/CSV"""
+
+import copy
+import csv
+import io
+import json
+import threading
+import zlib
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+
+from log_cursor import PIT_KEEP_ALIVE
+from log_hits import FieldProjection
+
+EXPORT_BATCH_SIZE = 5000     # 单次向 ES 拉取的条数
+EXPORT_MAX_ROWS = 1000000    # 单次导出的行数硬上限
+DEFAULT_MAX_ROWS = 100000    # 未指定 max_rows 时的默认上限
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+# format_log_hit 直接提供的列，其余列从 _source 按路径读取
+CORE_COLUMNS = ('id', 'timestamp', 'level', 'service', 'message', 'source', 'index', 'host')
+DEFAULT_COLUMNS = ['timestamp', 'level', 'service', 'host', 'message']
+
+
+def export_projection(columns: List[str]) -> FieldProjection:
+    """根据导出列构建字段投影（非核心列追加到 _source includes）"""
+    extra = [c for c in columns if c not in CORE_COLUMNS]
+    return FieldProjection.parse(','.join(extra)) if extra else FieldProjection()
+
+
+def _cell(value: Any) -> Any:
+    """CSV 单元格取值：对象序列化为 JSON，主机对象优先取主机名"""
+    if isinstance(value, dict):
+        if 'name' in value or 'hostname' in value:
+            return value.get('name') or value.get('hostname')
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, list):
+        return json.dumps(value, ensure_ascii=False)
+    return '' if value is None else value
+
+
+class LogExporter:
+    """日志导出迭代器
+
+    使用调用方打开的 PIT 逐批执行 search_after 查询，每批格式化后立即输出，
+    内存占用只与批大小有关，与导出总量无关。可选 gzip 压缩输出。
+    PIT 由 close() 释放（作为响应的 call_on_close 回调，客户端中途断开时也会执行）。
+    """
+
+    def __init__(self, es, pit_id: str, base_body: Dict[str, Any], columns: Optional[List[str]],
+                 fmt: str = 'ndjson', max_rows: int = DEFAULT_MAX_ROWS, compress: bool = False):
+        self.es = es
+        self.pit_id = pit_id
+        self.base_body = base_body
+        self.columns = columns
+        self.fmt = fmt
+        self.max_rows = max_rows
+        self.compress = compress
+        self.projection = export_projection(columns or DEFAULT_COLUMNS)
+        self.rows = 0
+        self._closed = False
+        self._close_lock = threading.Lock()
+
+    def _row(self, hit: Dict[str, Any]) -> Dict[str, Any]:
+        log = self.projection.format(hit)
+        if not self.columns and self.fmt == 'ndjson':
+            return log
+        extra = log.get('fields', {})
+        return {c: log.get(c) if c in CORE_COLUMNS else extra.get(c) for c in (self.columns or DEFAULT_COLUMNS)}
+
+    def _encode(self, rows: List[Dict[str, Any]], header: bool = False) -> str:
+        if self.fmt == 'ndjson':
+            return ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        columns = self.columns or DEFAULT_COLUMNS
+        if header:
+            writer.writerow(columns)
+        for row in rows:
+            writer.writerow([_cell(row.get(c)) for c in columns])
+        return buffer.getvalue()
+
+    def _error_chunk(self, message: str) -> str:
+        """导出中途失败时追加的错误标记（响应头已发送，无法再返回错误状态码）"""
+        if self.fmt == 'ndjson':
+            return json.dumps({"error": message}, ensure_ascii=False) + '\n'
+        return f"# 导出中断: {message}\n"
+
+    def _pages(self) -> Iterator[str]:
+        search_after = None
+        header = self.fmt == 'csv'
+        if header:
+            yield self._encode([], header=True)
+
+        while self.rows < self.max_rows:
+            size = min(EXPORT_BATCH_SIZE, self.max_rows - self.rows)
+            body = copy.deepcopy(self.base_body)
+            body.update({
+                "size": size,
+                "track_total_hits": False,
+                "sort": [{"@timestamp": {"order": "asc"}}, {"_shard_doc": "asc"}],
+                "pit": {"id": self.pit_id, "keep_alive": PIT_KEEP_ALIVE}
+            })
+            self.projection.apply(body)
+            if search_after is not None:
+                body["search_after"] = search_after
+
+            response = self.es.search(None, body)
+            if response.status_code != 200:
+                raise RuntimeError(f"Elasticsearch查询失败: {response.status_code}")
+            es_data = response.json()
+            self.pit_id = es_data.get('pit_id', self.pit_id)
+            hits = es_data.get('hits', {}).get('hits', [])
+            if not hits:
+                break
+
+            self.rows += len(hits)
+            yield self._encode([self._row(hit) for hit in hits])
+            if len(hits) < size or not hits[-1].get('sort'):
+                break
+            search_after = hits[-1]['sort']
+
+    def __iter__(self) -> Iterator[bytes]:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if self.compress else None
+        try:
+            for chunk in self._pages():
+                data = chunk.encode('utf-8')
+                if compressor:
+                    data = compressor.compress(data)
+                if data:
+                    yield data
+        except (requests.exceptions.RequestException, RuntimeError, ValueError) as e:
+            data = self._error_chunk(str(e)).encode('utf-8')
+            yield compressor.compress(data) if compressor else data
+        finally:
+            self.close()
+        if compressor:
+            yield compressor.flush()
+
+    def close(self):
+        """释放 PIT（可重复调用）"""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+        self.es.close_point_in_time(self.pit_id)
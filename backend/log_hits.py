@@ -0,0 +1,124 @@
+"""日志命中格式化 - 将 ES 命中转换为前端使用的日志结构"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+# 列表展示所需的 _source 字段（紧凑投影）
+COMPACT_SOURCE_FIELDS = [
+    '@timestamp', 'timestamp', 'level', 'service', 'container_name',
+    'message', 'log', 'source', 'source_type',
+    'host.name', 'host.hostname', 'host.ip'
+]
+
+_FIELD_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_@.\-*]+$')
+
+
+def format_log_hit(hit: Dict[str, Any], include_source: bool = True) -> Dict[str, Any]:
+    """将单条 ES 命中转换为日志记录，include_source 为 False 时不附带完整 _source"""
+    source = hit.get('_source', {})
+    log = {
+        "id": hit.get('_id'),
+        "timestamp": source.get('@timestamp', source.get('timestamp')),
+        "level": source.get('level', 'INFO'),
+        "service": source.get('service', source.get('container_name', 'unknown')),
+        "message": source.get('message', source.get('log', '')),
+        "source": source.get('source', source.get('source_type', 'unknown')),
+        "index": hit.get('_index'),
+        "host": source.get('host', {})
+    }
+    if include_source:
+        log["fields"] = source
+    return log
+
+
+def lookup_field(source: Dict[str, Any], path: str) -> Any:
+    """按点号路径读取 _source 中的字段（兼容扁平的点号键名）"""
+    if path in source:
+        return source[path]
+    node: Any = source
+    for part in path.split('.'):
+        if not isinstance(node, dict) or part not in node:
+            return None
+        node = node[part]
+    return node
+
+
+class FieldProjection:
+    """日志字段投影
+
+    由 fields 查询参数解析，转换为 ES 的 _source includes/excludes 与
+    docvalue_fields，避免每条命中都返回完整的 _source：
+      - 空或 compact：只取列表展示所需的字段（默认）
+      - full 或 *：返回完整 _source（与旧行为一致）
+      - 逗号分隔的字段列表：在紧凑投影基础上追加字段；以 - 开头表示排除，
+        以 .keyword 结尾的字段通过 docvalue_fields 读取
+    """
+
+    def __init__(self, full: bool = False, extra: Optional[List[str]] = None,
+                 excludes: Optional[List[str]] = None, docvalues: Optional[List[str]] = None):
+        self.full = full
+        self.extra = extra or []
+        self.excludes = excludes or []
+        self.docvalues = docvalues or []
+
+    @classmethod
+    def parse(cls, value: Optional[str]) -> 'FieldProjection':
+        """解析 fields 参数，字段名非法时抛出 ValueError"""
+        value = (value or '').strip()
+        if value in ('', 'compact'):
+            return cls()
+        if value in ('full', '*'):
+            return cls(full=True)
+
+        extra, excludes, docvalues = [], [], []
+        for item in value.split(','):
+            item = item.strip()
+            if not item:
+                continue
+            name = item[1:] if item.startswith('-') else item
+            if not _FIELD_NAME_PATTERN.match(name):
+                raise ValueError(f"无效的字段名: {name}")
+            if item.startswith('-'):
+                excludes.append(name)
+            elif name.endswith('.keyword'):
+                docvalues.append(name)
+            else:
+                extra.append(name)
+        return cls(extra=extra, excludes=excludes, docvalues=docvalues)
+
+    def cache_key(self) -> List[Any]:
+        """用于区分共享通道等缓存的投影标识"""
+        return [self.full, self.extra, self.excludes, self.docvalues]
+
+    def apply(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """将投影写入查询体（就地修改并返回）"""
+        if self.full:
+            if self.excludes:
+                body["_source"] = {"excludes": self.excludes}
+            return body
+
+        source = {"includes": COMPACT_SOURCE_FIELDS + [f for f in self.extra if f not in COMPACT_SOURCE_FIELDS]}
+        if self.excludes:
+            source["excludes"] = self.excludes
+        body["_source"] = source
+        if self.docvalues:
+            body["docvalue_fields"] = list(self.docvalues)
+        return body
+
+    def format(self, hit: Dict[str, Any]) -> Dict[str, Any]:
+        """按投影格式化命中，只在 fields 中返回额外请求的字段"""
+        log = format_log_hit(hit, include_source=self.full)
+        if not self.full and (self.extra or self.docvalues):
+            source = hit.get('_source', {})
+            fields = {}
+            for name in self.extra:
+                # 通配字段只支持 a.b.* 形式，返回整个对象
+                path = name[:-2] if name.endswith('.*') else name
+                if '*' not in path:
+                    fields[name] = lookup_field(source, path)
+            docvalue_fields = hit.get('fields', {})
+            for name in self.docvalues:
+                values = docvalue_fields.get(name)
+                fields[name] = values[0] if isinstance(values, list) and len(values) == 1 else values
+            log["fields"] = fields
+        return log
@@ -0,0 +1,271 @@
+"""日志写入 - 有界内存队列缓冲，后台按条数/字节/时间批量写入 ES _bulk"""
+
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import requests
+
+from config_store import get_config_store
+from es_client import get_es_client
+
+DEFAULT_INGEST_INDEX = 'oneops-logs-%Y.%m.%d'  # 可由 monitoring.elk.ingest_index 覆盖，支持 strftime 日期格式
+
+MAX_QUEUE_DOCS = 200000          # 队列最多缓冲的文档数
+MAX_QUEUE_BYTES = 128 * 1024 * 1024
+FLUSH_DOCS = 5000                # 达到该条数立即写入
+FLUSH_BYTES = 5 * 1024 * 1024    # 达到该字节数立即写入
+FLUSH_INTERVAL = 1.0             # 最早的文档等待超过该时间（秒）时写入
+MAX_FLUSH_RETRIES = 3            # 整批写入失败（连接失败/5xx）时的重试次数
+RETRY_BACKOFF = 0.5
+MAX_REJECT_BACKOFF = 30.0        # 文档被 429 拒绝后暂停写入的最长时间（秒）
+BULK_TIMEOUT = 30
+LATENCY_WINDOW = 200             # 统计写入延迟使用的最近批次数
+
+
+def _encode_source(record: Dict[str, Any]) -> bytes:
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def normalize_record(record: Any, timestamp: str) -> Dict[str, Any]:
+    """规范化单条日志：字符串作为 message，缺少 @timestamp 时使用接收时间"""
+    if isinstance(record, str):
+        record = {"message": record}
+    elif not isinstance(record, dict):
+        raise ValueError("日志记录必须是JSON对象或字符串")
+    if '@timestamp' not in record:
+        record['@timestamp'] = record.get('timestamp') or timestamp
+    return record
+
+
+def resolve_ingest_index(index: Optional[str] = None) -> str:
+    """写入的目标索引（按当前 UTC 日期展开 strftime 格式）"""
+    template = index or get_config_store().elk_config().get('ingest_index') or DEFAULT_INGEST_INDEX
+    return datetime.now(timezone.utc).strftime(template)
+
+
+class LogIngestor:
+    """日志批量写入器
+
+    请求线程只负责编码并放入有界队列（队列满时整批拒绝，由调用方返回 429），
+    后台线程在条数、字节数或等待时间任一达到阈值时组装 _bulk 请求写入 ES。
+    单条文档被 ES 以 429 拒绝时放回队列头部，并按连续被拒绝的次数指数退避，
+    退避期间暂停写入；其余失败计入 failed。
+    """
+
+    def __init__(self, max_queue_docs: int = MAX_QUEUE_DOCS, max_queue_bytes: int = MAX_QUEUE_BYTES,
+                 flush_docs: int = FLUSH_DOCS, flush_bytes: int = FLUSH_BYTES,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.max_queue_docs = max_queue_docs
+        self.max_queue_bytes = max_queue_bytes
+        self.flush_docs = flush_docs
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+
+        # (入队时间, 动作行+文档行)
+        self._queue: Deque[Tuple[float, bytes]] = deque()
+        self._queue_bytes = 0
+        self._not_before = 0.0     # 退避结束的时间（monotonic），此前不发起写入
+        self._reject_streak = 0    # 连续出现 429 拒绝的批次数
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._counters = {
+            "accepted": 0,
+            "rejected_requests": 0,
+            "rejected_docs": 0,
+            "indexed": 0,
+            "failed": 0,
+            "retried": 0,
+            "flushes": 0,
+            "flush_errors": 0
+        }
+        self._last_flush: Optional[float] = None
+        self._last_error: Optional[str] = None
+
+    def ensure_started(self):
+        """启动后台写入线程（首次写入时调用）"""
+        if self._thread is not None:
+            return
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='log-ingest', daemon=True)
+                self._thread.start()
+
+    # ==================== 入队 ====================
+
+    def offer(self, index: str, records: List[Any]) -> bool:
+        """编码并入队一批日志，队列容量不足时整批拒绝并返回 False
+
+        records 中的元素会被就地规范化（补充 @timestamp），格式非法时抛出 ValueError。
+        """
+        timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+        action = _encode_source({"create": {"_index": index}}) + b'\n'
+        lines = [action + _encode_source(normalize_record(record, timestamp)) + b'\n' for record in records]
+        size = sum(len(line) for line in lines)
+
+        with self._cond:
+            if (len(self._queue) + len(lines) > self.max_queue_docs
+                    or self._queue_bytes + size > self.max_queue_bytes):
+                self._counters["rejected_requests"] += 1
+                self._counters["rejected_docs"] += len(lines)
+                return False
+            now = time.monotonic()
+            self._queue.extend((now, line) for line in lines)
+            self._queue_bytes += size
+            self._counters["accepted"] += len(lines)
+            if len(self._queue) >= self.flush_docs or self._queue_bytes >= self.flush_bytes:
+                self._cond.notify()
+        self.ensure_started()
+        return True
+
+    # ==================== 后台写入 ====================
+
+    def _next_batch(self) -> List[Tuple[float, bytes]]:
+        """等待达到任一写入阈值后取出一批（调用方持有锁）"""
+        while True:
+            if self._queue:
+                now = time.monotonic()
+                if now < self._not_before:
+                    self._cond.wait(self._not_before - now)
+                    continue
+                age = now - self._queue[0][0]
+                if (len(self._queue) >= self.flush_docs or self._queue_bytes >= self.flush_bytes
+                        or age >= self.flush_interval):
+                    break
+                self._cond.wait(self.flush_interval - age)
+            else:
+                self._cond.wait()
+
+        batch = []
+        batch_bytes = 0
+        while self._queue and len(batch) < self.flush_docs and batch_bytes < self.flush_bytes:
+            item = self._queue.popleft()
+            batch.append(item)
+            batch_bytes += len(item[1])
+        self._queue_bytes -= batch_bytes
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                batch = self._next_batch()
+            try:
+                self._flush(batch)
+            except Exception as e:
+                print(f"写入日志失败: {e}")
+                self._record_failure(len(batch), str(e))
+
+    def _record_failure(self, count: int, error: str):
+        with self._cond:
+            self._counters["failed"] += count
+            self._counters["flush_errors"] += 1
+            self._last_error = error
+
+    def _send(self, payload: bytes) -> Dict[str, Any]:
+        """发送 _bulk 请求，连接失败或 5xx 时退避重试"""
+        error = None
+        for attempt in range(MAX_FLUSH_RETRIES + 1):
+            if attempt:
+                time.sleep(RETRY_BACKOFF * (2 ** (attempt - 1)))
+            es = get_es_client()
+            if es is None:
+                error = "ELK Stack未启用或Elasticsearch URL未配置"
+                continue
+            try:
+                response = es.bulk(payload, timeout=BULK_TIMEOUT)
+            except requests.exceptions.RequestException as e:
+                error = f"连接Elasticsearch失败: {e}"
+                continue
+            if response.status_code == 200:
+                return response.json()
+            error = f"Elasticsearch写入失败: {response.status_code}"
+            if response.status_code < 500 and response.status_code != 429:
+                break  # 请求本身有误，重试无意义
+        raise RuntimeError(error)
+
+    def _flush(self, batch: List[Tuple[float, bytes]]):
+        start = time.monotonic()
+        result = self._send(b''.join(line for _, line in batch))
+        latency_ms = (time.monotonic() - start) * 1000
+
+        indexed = failed = 0
+        retry: List[Tuple[float, bytes]] = []
+        error = None
+        if result.get('errors'):
+            for item, entry in zip(result.get('items', []), batch):
+                status = next(iter(item.values()), {}).get('status', 500)
+                if status < 300:
+                    indexed += 1
+                elif status == 429:
+                    retry.append(entry)
+                else:
+                    failed += 1
+                    error = str(next(iter(item.values()), {}).get('error'))
+        else:
+            indexed = len(batch)
+
+        with self._cond:
+            # 被 ES 限流拒绝的文档放回队列头部，保持原有顺序，并在退避结束前暂停写入
+            for entry in reversed(retry):
+                self._queue.appendleft(entry)
+                self._queue_bytes += len(entry[1])
+            if retry:
+                self._reject_streak += 1
+                backoff = min(RETRY_BACKOFF * (2 ** (self._reject_streak - 1)), MAX_REJECT_BACKOFF)
+                self._not_before = time.monotonic() + backoff
+            else:
+                self._reject_streak = 0
+            self._counters["indexed"] += indexed
+            self._counters["failed"] += failed
+            self._counters["retried"] += len(retry)
+            self._counters["flushes"] += 1
+            self._latencies.append(latency_ms)
+            self._last_flush = time.time()
+            if error:
+                self._last_error = error
+
+    # ==================== 统计 ====================
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            last_latency = self._latencies[-1] if self._latencies else None
+            latencies = sorted(self._latencies)
+            stats = dict(self._counters)
+            stats.update({
+                "queue_docs": len(self._queue),
+                "queue_bytes": self._queue_bytes,
+                "max_queue_docs": self.max_queue_docs,
+                "max_queue_bytes": self.max_queue_bytes,
+                "last_flush": self._last_flush,
+                "backoff_remaining": round(max(self._not_before - time.monotonic(), 0.0), 3),
+                "last_error": self._last_error
+            })
+        if latencies:
+            stats["flush_latency_ms"] = {
+                "last": round(last_latency, 1),
+                "avg": round(sum(latencies) / len(latencies), 1),
+                "p95": round(latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)], 1),
+                "max": round(latencies[-1], 1)
+            }
+        else:
+            stats["flush_latency_ms"] = None
+        return stats
+
+
+# 单例实例
+_log_ingestor = None
+_log_ingestor_lock = threading.Lock()
+
+
+def get_log_ingestor() -> LogIngestor:
+    """获取日志写入器实例"""
+    global _log_ingestor
+    if _log_ingestor is None:
+        with _log_ingestor_lock:
+            if _log_ingestor is None:
+                _log_ingestor = LogIngestor()
+    return _log_ingestor
@@ -0,0 +1,220 @@
+"""多索引日志检索 - 并发查询多个索引目标，按时间戳 k 路归并为一页结果"""
+
+import heapq
+import itertools
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from log_cursor import PIT_KEEP_ALIVE
+from log_hits import lookup_field
+
+MAX_TARGETS = 10               # 单次检索最多的索引目标数
+SEARCH_POOL_SIZE = 8           # 并发查询线程数（所有请求共享）
+DEFAULT_TARGET_TIMEOUT = 10.0  # 单个目标的默认超时（秒）
+MAX_TARGET_TIMEOUT = 60.0
+
+# 可按目标映射的逻辑字段
+MAPPABLE_FIELDS = ('timestamp', 'level', 'service', 'message', 'source', 'host')
+
+_INDEX_PATTERN = re.compile(r'^[^\s"\\/?#<>|]+$')
+
+search_executor = ThreadPoolExecutor(max_workers=SEARCH_POOL_SIZE, thread_name_prefix='log-search')
+
+
+class SearchTarget:
+    """单个索引目标及其字段映射"""
+
+    def __init__(self, index: str, fields: Optional[Dict[str, str]] = None, timeout: Optional[float] = None):
+        self.index = index
+        self.fields = fields or {}
+        self.timeout = timeout
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"index": self.index, "fields": self.fields, "timeout": self.timeout}
+
+    def remap(self, log: Dict[str, Any], hit: Dict[str, Any]) -> Dict[str, Any]:
+        """按字段映射从 _source 重新读取逻辑字段"""
+        if self.fields:
+            source = hit.get('_source', {})
+            for name, path in self.fields.items():
+                value = lookup_field(source, path)
+                if value is not None:
+                    log[name] = value
+        return log
+
+    def source_fields(self) -> List[str]:
+        """字段映射需要额外读取的 _source 字段"""
+        return sorted(set(self.fields.values()))
+
+
+def parse_targets(indices: List[str], targets_json: str = '') -> List[SearchTarget]:
+    """解析检索目标：重复的 index 参数，或 targets JSON 数组
+
+    targets 形如 [{"index": "nginx-*", "fields": {"level": "log.level"}, "timeout": 5}]，
+    字段名或索引非法时抛出 ValueError。
+    """
+    targets = []
+    if targets_json:
+        try:
+            items = json.loads(targets_json)
+        except ValueError:
+            raise ValueError("targets 参数不是有效的JSON")
+        if not isinstance(items, list):
+            raise ValueError("targets 参数必须是数组")
+        for item in items:
+            if isinstance(item, str):
+                item = {"index": item}
+            if not isinstance(item, dict) or not isinstance(item.get('index'), str):
+                raise ValueError("检索目标必须包含 index")
+            fields = item.get('fields') or {}
+            if not isinstance(fields, dict) or any(
+                    name not in MAPPABLE_FIELDS or not isinstance(path, str) or not path
+                    for name, path in fields.items()):
+                raise ValueError(f"字段映射只支持: {', '.join(MAPPABLE_FIELDS)}")
+            timeout = item.get('timeout')
+            if timeout is not None:
+                try:
+                    timeout = min(max(float(timeout), 1.0), MAX_TARGET_TIMEOUT)
+                except (TypeError, ValueError):
+                    raise ValueError("timeout 必须是数字")
+            targets.append(SearchTarget(item['index'], fields, timeout))
+    else:
+        targets = [SearchTarget(index) for index in indices if index]
+
+    if len(targets) > MAX_TARGETS:
+        raise ValueError(f"最多同时检索 {MAX_TARGETS} 个索引目标")
+    for target in targets:
+        if not _INDEX_PATTERN.match(target.index):
+            raise ValueError(f"无效的索引: {target.index}")
+    return targets
+
+
+def _run_target(es, index: str, body: Dict[str, Any], timeout: float, pit_id: Optional[str],
+                open_pit: bool = False) -> Dict[str, Any]:
+    """执行目标的一页查询：有 PIT（或 open_pit 时新开）则在 PIT 内查询，失败时释放 PIT"""
+    start = time.time()
+    try:
+        if pit_id is None and open_pit:
+            pit_id = es.open_point_in_time(index, PIT_KEEP_ALIVE)
+        if pit_id is not None:
+            body["pit"] = {"id": pit_id, "keep_alive": PIT_KEEP_ALIVE}
+            response = es.search(None, body, timeout=timeout)
+        else:
+            response = es.search(index, body, timeout=timeout)
+        if response.status_code == 404 and pit_id is not None:
+            raise RuntimeError("分页游标已过期，请重新查询")
+        if response.status_code != 200:
+            raise RuntimeError(f"Elasticsearch查询失败: {response.status_code}")
+        data = response.json()
+    except Exception:
+        if pit_id is not None:
+            es.close_point_in_time(pit_id)
+        raise
+    data['pit_id'] = data.get('pit_id', pit_id)
+    data['_elapsed_ms'] = int((time.time() - start) * 1000)
+    return data
+
+
+def _release_pit(es, future):
+    """释放已超时但仍执行完成的查询所打开的 PIT"""
+    if not future.cancelled() and future.exception() is None and future.result()['pit_id']:
+        es.close_point_in_time(future.result()['pit_id'])
+
+
+def multi_search(es, targets: List[SearchTarget], states: List[Dict[str, Any]],
+                 build: Callable[[int, SearchTarget, Optional[List[Any]]], Tuple[str, Dict[str, Any]]],
+                 size: int, timeout: float = DEFAULT_TARGET_TIMEOUT, use_pit: bool = False):
+    """并发查询所有未取完的目标并按时间戳归并
+
+    states[i] 为目标 i 的翻页状态 {"after": 排序值|None, "done": bool, "pit": PIT id|None, "stale": bool}，
+    build(i, target, after) 返回该目标的 (实际索引, 查询体)，查询体按 (时间戳, 决胜字段) 排序；
+    use_pit 时各目标在自己的 PIT 内翻页，首页时打开，目标取完时关闭。各目标结果按第一个排序值（时间戳）降序排列，
+    使用堆归并取前 size 条；每个目标的游标只推进到被取用的最后一条。
+    超时或失败的目标无法与其他目标同步推进游标，标记为 stale 并在之后的翻页中排除，
+    以保证归并结果始终有序。
+
+    返回 (归并后的 [(目标序号, 命中)], 新的翻页状态, 各目标状态报告)。
+    """
+    futures = {}
+    reports: List[Dict[str, Any]] = []
+    for i, target in enumerate(targets):
+        if states[i].get('stale'):
+            reports.append({"index": target.index, "status": "stale", "stale": True,
+                            "message": "该目标在之前的分页中查询失败，已排除"})
+            continue
+        reports.append({"index": target.index, "status": "done" if states[i]['done'] else "pending"})
+        if states[i]['done']:
+            continue
+        target_timeout = target.timeout or timeout
+        index, body = build(i, target, states[i]['after'])
+        futures[search_executor.submit(_run_target, es, index, body, target_timeout, states[i].get('pit'),
+                                       use_pit and states[i]['after'] is None)] = (i, target_timeout)
+
+    # 等待时间取最长的目标超时（外加连接时间），超时的目标记为部分结果
+    max_timeout = max([t for _, t in futures.values()] or [timeout])
+    done, not_done = wait(futures, timeout=max_timeout + 5)
+
+    results: Dict[int, List[Dict[str, Any]]] = {}
+    pits: Dict[int, str] = {}
+    for future in not_done:
+        i, _ = futures[future]
+        if future.cancel():
+            # 查询未开始执行，由这里释放该目标之前页留下的 PIT
+            if states[i].get('pit'):
+                es.close_point_in_time(states[i]['pit'])
+        else:
+            # 仍在执行的查询结束后释放其 PIT
+            future.add_done_callback(lambda f: _release_pit(es, f))
+        reports[i].update({"status": "timeout", "message": "查询超时"})
+    for future in done:
+        i, _ = futures[future]
+        try:
+            data = future.result()
+        except requests.exceptions.Timeout:
+            reports[i].update({"status": "timeout", "message": "查询超时"})
+            continue
+        except (requests.exceptions.RequestException, RuntimeError, ValueError) as e:
+            reports[i].update({"status": "error", "message": str(e)})
+            continue
+        hits = [hit for hit in data.get('hits', {}).get('hits', []) if hit.get('sort')]
+        results[i] = hits
+        pits[i] = data['pit_id']
+        total_hits = data.get('hits', {}).get('total', {})
+        reports[i].update({
+            "status": "ok",
+            "took": data.get('_elapsed_ms'),
+            "total": total_hits.get('value', 0) if isinstance(total_hits, dict) else total_hits,
+            "total_relation": total_hits.get('relation', 'eq') if isinstance(total_hits, dict) else 'eq',
+            "timed_out": data.get('timed_out', False)
+        })
+
+    # k 路归并：各目标结果已按时间戳降序
+    streams = [[(i, hit) for hit in hits] for i, hits in sorted(results.items())]
+    merged = list(itertools.islice(
+        heapq.merge(*streams, key=lambda item: item[1]['sort'][0], reverse=True), size
+    ))
+
+    new_states = [dict(state) for state in states]
+    for i, report in enumerate(reports):
+        if report['status'] in ('timeout', 'error'):
+            # 失败的目标已释放 PIT（见 _run_target、_release_pit 与上方的取消分支）
+            new_states[i].update({"done": True, "stale": True, "pit": None})
+            report['stale'] = True
+    consumed: Dict[int, int] = {}
+    for i, hit in merged:
+        consumed[i] = consumed.get(i, 0) + 1
+        new_states[i]['after'] = hit['sort']
+    for i, hits in results.items():
+        new_states[i]['pit'] = pits[i]
+        # 本次返回的命中全部被取用且不足一页，说明该目标已取完
+        if consumed.get(i, 0) == len(hits) and len(hits) < size:
+            new_states[i]['done'] = True
+            if pits[i]:
+                es.close_point_in_time(pits[i])
+            new_states[i]['pit'] = None
+    return merged, new_states, reports
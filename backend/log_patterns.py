@@ -0,0 +1,245 @@
+"""日志模板挖掘 - 基于 Drain 算法的增量日志模式聚类
+
+把消息中的数字、UUID、IP 等参数替换为占位符后，按固定深度的解析树
+（消息长度 -> 前若干个词 -> 叶子）找到候选模板，相似度足够时合并到已有模板，
+否则新建模板。解析树按索引模式在请求之间保留，逐渐预热。
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+WILDCARD = '<*>'
+DEFAULT_DEPTH = 4              # 解析树深度（包含长度层与叶子层）
+DEFAULT_SIMILARITY = 0.4       # 合并到已有模板的最低相似度
+DEFAULT_MAX_CHILDREN = 100     # 每个内部节点的最大子节点数，超出后归入通配节点
+DEFAULT_MAX_CLUSTERS = 5000    # 每棵树保留的模板数，超出时淘汰最久未匹配的模板
+MAX_MINERS = 32                # 保留解析树的索引模式数
+MAX_MESSAGE_TOKENS = 200       # 超长消息只取前若干个词参与聚类
+
+# 参数掩码（按顺序应用，先匹配更具体的格式）
+_MASKS = [
+    (re.compile(r'\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b'), '<UUID>'),
+    (re.compile(r'(?<![\w.])(?:\d{1,3}\.){3}\d{1,3}(?::\d{1,5})?(?![\w.])'), '<IP>'),
+    (re.compile(r'\b0[xX][0-9a-fA-F]+\b'), '<HEX>'),
+    (re.compile(r'\b[0-9a-fA-F]{16,}\b'), '<HEX>'),
+    (re.compile(r'(?<![\w.])[-+]?\d+(?:\.\d+)?(?:ms|s|m|h|b|kb|mb|gb|%)?(?![\w.])', re.IGNORECASE), '<NUM>'),
+]
+_SPLIT = re.compile(r'\s+')
+
+
+def mask_message(message: str) -> str:
+    """把消息中的参数替换为占位符"""
+    for pattern, placeholder in _MASKS:
+        message = pattern.sub(placeholder, message)
+    return message
+
+
+def tokenize(message: str) -> List[str]:
+    tokens = [token for token in _SPLIT.split(mask_message(message).strip()) if token]
+    return tokens[:MAX_MESSAGE_TOKENS]
+
+
+def _has_digit(token: str) -> bool:
+    return any(ch.isdigit() for ch in token)
+
+
+class LogCluster:
+    """一个日志模板"""
+
+    def __init__(self, cluster_id: int, tokens: List[str]):
+        self.id = cluster_id
+        self.tokens = tokens
+        self.size = 0
+
+    @property
+    def template(self) -> str:
+        return ' '.join(self.tokens)
+
+    def similarity(self, tokens: List[str]) -> Tuple[float, int]:
+        """返回 (相同位置相同词的比例, 通配符个数)"""
+        same = 0
+        wildcards = 0
+        for template_token, token in zip(self.tokens, tokens):
+            if template_token == WILDCARD:
+                wildcards += 1
+            elif template_token == token:
+                same += 1
+        return same / len(self.tokens), wildcards
+
+    def merge(self, tokens: List[str]):
+        """不同位置的词替换为通配符"""
+        self.tokens = [t if t == token else WILDCARD for t, token in zip(self.tokens, tokens)]
+
+
+class _Node:
+    __slots__ = ('children', 'cluster_ids')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        self.cluster_ids: List[int] = []
+
+
+class PatternMiner:
+    """单个索引模式的 Drain 解析树（线程安全）"""
+
+    def __init__(self, depth: int = DEFAULT_DEPTH, similarity: float = DEFAULT_SIMILARITY,
+                 max_children: int = DEFAULT_MAX_CHILDREN, max_clusters: int = DEFAULT_MAX_CLUSTERS):
+        self.max_prefix = max(depth - 2, 1)
+        self.similarity = similarity
+        self.max_children = max_children
+        self.max_clusters = max_clusters
+        self._root = _Node()
+        # 按最近匹配时间排序，淘汰时从头部移除；树叶中失效的编号在查找时跳过
+        self._clusters: 'OrderedDict[int, LogCluster]' = OrderedDict()
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def _leaf(self, tokens: List[str], create: bool) -> Optional[_Node]:
+        node = self._root.children.get(str(len(tokens)))
+        if node is None:
+            if not create:
+                return None
+            node = self._root.children.setdefault(str(len(tokens)), _Node())
+
+        for token in tokens[:self.max_prefix]:
+            key = WILDCARD if _has_digit(token) else token
+            child = node.children.get(key)
+            if child is None and not create:
+                child = node.children.get(WILDCARD)
+                if child is None:
+                    return None
+            elif child is None:
+                # 新词在子节点未满时建立自己的分支，已满时才归入通配节点
+                if len(node.children) >= self.max_children:
+                    key = WILDCARD
+                child = node.children.setdefault(key, _Node())
+            node = child
+        return node
+
+    def _best_match(self, leaf: _Node, tokens: List[str]) -> Optional[LogCluster]:
+        best, best_key = None, (-1.0, -1)
+        live_ids = []
+        for cluster_id in leaf.cluster_ids:
+            cluster = self._clusters.get(cluster_id)
+            if cluster is None:
+                continue
+            live_ids.append(cluster_id)
+            key = cluster.similarity(tokens)
+            if key > best_key:
+                best, best_key = cluster, key
+        leaf.cluster_ids = live_ids
+        if best is not None and best_key[0] >= self.similarity:
+            return best
+        return None
+
+    def add(self, message: str) -> LogCluster:
+        """将一条消息归入模板，返回匹配（或新建）的模板"""
+        tokens = tokenize(message) or ['']
+        with self._lock:
+            leaf = self._leaf(tokens, create=True)
+            cluster = self._best_match(leaf, tokens)
+            if cluster is None:
+                cluster = LogCluster(self._next_id, tokens)
+                self._next_id += 1
+                self._clusters[cluster.id] = cluster
+                leaf.cluster_ids.append(cluster.id)
+                while len(self._clusters) > self.max_clusters:
+                    self._clusters.popitem(last=False)
+            else:
+                cluster.merge(tokens)
+                self._clusters.move_to_end(cluster.id)
+            cluster.size += 1
+            return cluster
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"clusters": len(self._clusters)}
+
+
+def summarize_patterns(miner: PatternMiner, items: List[Dict[str, Any]], sample_size: int = 3) -> List[Dict[str, Any]]:
+    """挖掘一批日志的模板
+
+    items 为 {"id", "timestamp", "message", "level"} 结构，返回按出现次数降序的模板列表，
+    包含本批次的计数、首次/最近出现时间与样例 id。
+    """
+    groups: Dict[int, Dict[str, Any]] = {}
+    for item in items:
+        message = item.get('message')
+        if not isinstance(message, str):
+            message = '' if message is None else str(message)
+        cluster = miner.add(message)
+        group = groups.get(cluster.id)
+        if group is None:
+            group = groups[cluster.id] = {
+                "cluster": cluster,
+                "count": 0,
+                "first_seen": None,
+                "last_seen": None,
+                "sample_ids": [],
+                "levels": {}
+            }
+        group["count"] += 1
+        timestamp = item.get('timestamp')
+        if timestamp is not None:
+            if group["first_seen"] is None or str(timestamp) < str(group["first_seen"]):
+                group["first_seen"] = timestamp
+            if group["last_seen"] is None or str(timestamp) > str(group["last_seen"]):
+                group["last_seen"] = timestamp
+        if len(group["sample_ids"]) < sample_size and item.get('id') is not None:
+            group["sample_ids"].append(item['id'])
+        level = item.get('level')
+        if level:
+            group["levels"][level] = group["levels"].get(level, 0) + 1
+
+    patterns = []
+    for cluster_id, group in groups.items():
+        cluster = group.pop("cluster")
+        patterns.append({
+            "id": cluster_id,
+            "template": cluster.template,
+            "total_seen": cluster.size,
+            **group
+        })
+    patterns.sort(key=lambda pattern: (-pattern["count"], pattern["id"]))
+    return patterns
+
+
+class PatternMinerRegistry:
+    """按索引模式保留解析树，超过数量时淘汰最久未使用的"""
+
+    def __init__(self, max_miners: int = MAX_MINERS):
+        self.max_miners = max_miners
+        self._miners: 'OrderedDict[str, PatternMiner]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, index_pattern: str) -> PatternMiner:
+        with self._lock:
+            miner = self._miners.get(index_pattern)
+            if miner is None:
+                miner = self._miners[index_pattern] = PatternMiner()
+                while len(self._miners) > self.max_miners:
+                    self._miners.popitem(last=False)
+            else:
+                self._miners.move_to_end(index_pattern)
+            return miner
+
+    def clear(self):
+        with self._lock:
+            self._miners.clear()
+
+
+# 单例实例
+_pattern_miner_registry = None
+_pattern_miner_registry_lock = threading.Lock()
+
+
+def get_pattern_miner_registry() -> PatternMinerRegistry:
+    """获取日志模板挖掘器注册表实例"""
+    global _pattern_miner_registry
+    if _pattern_miner_registry is None:
+        with _pattern_miner_registry_lock:
+            if _pattern_miner_registry is None:
+                _pattern_miner_registry = PatternMinerRegistry()
+    return _pattern_miner_registry
@@ -0,0 +1,250 @@
+"""实时日志推送 - 同一 (索引, 过滤条件, 推送参数) 的所有订阅者共享一个上游轮询循环"""
+
+import json
+import queue
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from es_client import get_es_client
+from log_hits import FieldProjection
+from index_resolver import resolve_index
+from time_utils import relative_start_ms
+
+POLL_BATCH_SIZE = 500        # 单次轮询最多拉取的条数
+MAX_DRAIN_ROUNDS = 10        # 单个轮询周期内连续翻页的最大次数（未取完时下个周期继续）
+OVERLAP_MS = 2000            # 回看窗口，容忍写入延迟导致的乱序到达
+BACKLOG_SIZE = 500           # 为新订阅者保留的最近日志条数
+SUBSCRIBER_QUEUE_SIZE = 100  # 每个订阅者最多积压的事件数
+
+
+class TailChannel:
+    """单个 (索引, 过滤条件, 字段投影, 回看范围, 初始条数, 轮询间隔) 的上游轮询循环
+
+    维护 @timestamp 高水位及其回看窗口内已推送的文档 id。每轮扫描从高水位（减去回看窗口）
+    开始按 (@timestamp, _id) 用 search_after 翻页，直到追上最新数据（单个周期内未追上时，
+    下个周期沿用游标继续），去重后把增量广播给所有订阅者。不使用 PIT，稳态下每个周期只有一次查询。
+    """
+
+    def __init__(self, hub: 'LogTailHub', key: str, index: str, filters: List[Dict[str, Any]],
+                 lookback: str, initial_size: int, poll_interval: float, projection: FieldProjection):
+        self.hub = hub
+        self.key = key
+        self.index = index
+        self.filters = filters
+        self.projection = projection
+        self.lookback = lookback
+        self.initial_size = initial_size
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._subscribers: List[queue.Queue] = []
+        self._backlog: deque = deque(maxlen=BACKLOG_SIZE)
+        self._stop = threading.Event()
+        self._high_water: Optional[int] = None
+        self._seen: Dict[str, int] = {}  # 回看窗口内已推送的 id -> 时间戳
+        self._floor: Optional[int] = None  # 初始页被截断时最旧一条的时间戳，不晚于它的命中不再推送
+        self._after: Optional[List[Any]] = None  # 本轮扫描的翻页游标 (@timestamp, _id)
+        self._since_ms: Optional[int] = None  # 本轮扫描的查询下界
+        self._thread = threading.Thread(target=self._run, name=f"log-tail-{key[:32]}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def subscribe(self) -> Optional[queue.Queue]:
+        """注册订阅者，先推送已缓存的最近日志；通道已停止时返回 None"""
+        q: queue.Queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            if self._stop.is_set():
+                return None
+            if self._backlog:
+                q.put_nowait({"type": "logs", "data": list(self._backlog)})
+            self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q: queue.Queue) -> bool:
+        """注销订阅者，返回是否已无订阅者"""
+        with self._lock:
+            if q in self._subscribers:
+                self._subscribers.remove(q)
+            idle = not self._subscribers
+            if idle:
+                self._stop.set()
+            return idle
+
+    def _broadcast(self, event: Dict[str, Any]):
+        with self._lock:
+            if event["type"] == "logs":
+                self._backlog.extend(event["data"])
+            for q in self._subscribers:
+                try:
+                    q.put_nowait(event)
+                except queue.Full:
+                    # 慢客户端：丢弃最旧的事件，保证上游循环不被阻塞
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        pass
+                    q.put_nowait(event)
+
+    def _search(self, body: Dict[str, Any], since_ms: Optional[int]) -> List[Dict[str, Any]]:
+        es = get_es_client()
+        if es is None:
+            raise RuntimeError("ELK Stack未启用或Elasticsearch URL未配置")
+        response = es.search(resolve_index(self.index, since_ms), self.projection.apply(body))
+        if response.status_code != 200:
+            raise RuntimeError(f"Elasticsearch查询失败: {response.status_code}")
+        return response.json().get('hits', {}).get('hits', [])
+
+    def _initial_poll(self) -> List[Dict[str, Any]]:
+        """首次轮询：取回看窗口内最新的若干条作为初始数据"""
+        hits = self._search({
+            "size": self.initial_size,
+            "sort": [{"@timestamp": {"order": "desc"}}],
+            "query": {"bool": {"filter": self.filters + [
+                {"range": {"@timestamp": {"gte": self.lookback}}}
+            ]}}
+        }, relative_start_ms(self.lookback))
+        hits.reverse()
+        return hits
+
+    def _incremental_poll(self) -> List[Dict[str, Any]]:
+        """增量轮询：取本轮扫描的下一页，新一轮扫描从高水位（减去回看窗口）开始"""
+        if self._after is None:
+            if self._high_water is not None:
+                self._since_ms = self._high_water - OVERLAP_MS
+            else:
+                self._since_ms = relative_start_ms(self.lookback)
+
+        body = {
+            "size": POLL_BATCH_SIZE,
+            "sort": [{"@timestamp": {"order": "asc"}}, {"_id": "asc"}],
+            "track_total_hits": False,
+            "query": {"bool": {"filter": self.filters + [
+                {"range": {"@timestamp": {"gte": self._since_ms, "format": "epoch_millis"}}}
+            ]}}
+        }
+        if self._after is not None:
+            body["search_after"] = self._after
+        hits = self._search(body, self._since_ms)
+        if hits and hits[-1].get('sort'):
+            self._after = hits[-1]['sort']
+        return hits
+
+    def _accept(self, hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """过滤已推送的命中并推进高水位"""
+        fresh = []
+        for hit in hits:
+            hit_id = hit.get('_id')
+            sort_values = hit.get('sort') or []
+            ts = sort_values[0] if sort_values and isinstance(sort_values[0], (int, float)) else None
+            if hit_id in self._seen:
+                continue
+            if self._floor is not None and ts is not None and ts <= self._floor:
+                continue
+            if ts is not None:
+                self._seen[hit_id] = ts
+                if self._high_water is None or ts > self._high_water:
+                    self._high_water = int(ts)
+            fresh.append(hit)
+
+        if self._high_water is not None:
+            cutoff = self._high_water - OVERLAP_MS
+            self._seen = {k: v for k, v in self._seen.items() if v >= cutoff}
+            if self._floor is not None and self._floor < cutoff:
+                self._floor = None
+        return fresh
+
+    def _run(self):
+        first = True
+        while not self._stop.is_set():
+            try:
+                if first:
+                    hits = self._initial_poll()
+                    first = False
+                    fresh = self._accept(hits)
+                    if len(hits) >= self.initial_size and hits[0].get('sort'):
+                        # 初始页被截断：更早的命中不属于初始数据，之后落入回看窗口时也不应作为新日志推送
+                        self._floor = hits[0]['sort'][0]
+                    self._broadcast({"type": "logs", "data": [self.projection.format(h) for h in fresh]})
+                else:
+                    for _ in range(MAX_DRAIN_ROUNDS):
+                        hits = self._incremental_poll()
+                        fresh = self._accept(hits)
+                        if fresh:
+                            self._broadcast({"type": "logs", "data": [self.projection.format(h) for h in fresh]})
+                        # 未取满一页说明已追上，下个周期从高水位开始新一轮扫描；
+                        # 取满时即使整页都已推送过（回看窗口内的重复命中）也继续翻页
+                        if len(hits) < POLL_BATCH_SIZE:
+                            self._after = None
+                            break
+            except (requests.exceptions.RequestException, RuntimeError, ValueError) as e:
+                self._after = None
+                self._broadcast({"type": "error", "data": {"message": f"获取实时日志失败: {str(e)}"}})
+            self._stop.wait(self.poll_interval)
+        self.hub._remove(self)
+
+
+class LogTailHub:
+    """实时日志通道注册表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels: Dict[str, TailChannel] = {}
+
+    @staticmethod
+    def channel_key(index: str, filters: List[Dict[str, Any]], projection: FieldProjection, lookback: str,
+                    initial_size: int, poll_interval: float) -> str:
+        """通道键：回看范围、初始条数与轮询间隔不同的订阅者使用各自的通道"""
+        return json.dumps([index, filters, projection.cache_key(), lookback, initial_size, poll_interval],
+                          sort_keys=True, ensure_ascii=False)
+
+    def subscribe(self, index: str, filters: List[Dict[str, Any]], lookback: str = 'now-5m',
+                  initial_size: int = 100, poll_interval: float = 2.0,
+                  projection: Optional[FieldProjection] = None):
+        """订阅通道，不存在时创建并启动轮询，返回 (通道, 事件队列)"""
+        projection = projection or FieldProjection()
+        key = self.channel_key(index, filters, projection, lookback, initial_size, poll_interval)
+        with self._lock:
+            channel = self._channels.get(key)
+            q = channel.subscribe() if channel is not None else None
+            if q is None:
+                # 通道不存在或正在停止，新建通道
+                channel = TailChannel(self, key, index, filters, lookback, initial_size, poll_interval,
+                                      projection)
+                self._channels[key] = channel
+                q = channel.subscribe()
+                channel.start()
+            return channel, q
+
+    def unsubscribe(self, channel: TailChannel, q: queue.Queue):
+        channel.unsubscribe(q)
+
+    def _remove(self, channel: TailChannel):
+        with self._lock:
+            if self._channels.get(channel.key) is channel:
+                del self._channels[channel.key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "channels": len(self._channels),
+                "subscribers": sum(len(c._subscribers) for c in self._channels.values())
+            }
+
+
+# 单例实例
+_log_tail_hub = None
+_log_tail_hub_lock = threading.Lock()
+
+
+def get_log_tail_hub() -> LogTailHub:
+    """获取实时日志通道注册表实例"""
+    global _log_tail_hub
+    if _log_tail_hub is None:
+        with _log_tail_hub_lock:
+            if _log_tail_hub is None:
+                _log_tail_hub = LogTailHub()
+    return _log_tail_hub
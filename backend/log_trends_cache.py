@@ -0,0 +1,199 @@
+"""日志趋势缓存 - 按桶对齐缓存 date_histogram 结果，只增量刷新未关闭的桶"""
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from time_utils import parse_duration_ms
+
+SETTLE_MS = 60 * 1000                    # 桶结束后等待写入延迟的时间，之后视为已关闭
+RETENTION_MS = 31 * 24 * 60 * 60 * 1000  # 已关闭桶的最长保留时间（上限）
+RETENTION_MARGIN_BUCKETS = 2             # 在序列请求过的最大窗口之外额外保留的桶数
+MAX_SERIES = 256                         # 最多缓存的序列数（LRU 淘汰）
+MAX_STATS_BUCKETS = 1440                 # 统计接口选择间隔时的最大桶数
+
+# 统计接口可选的桶间隔（从细到粗）
+STATS_INTERVALS = ['1m', '5m', '10m', '30m', '1h', '3h', '12h', '1d']
+
+
+def fixed_interval_ms(interval: str) -> Optional[int]:
+    """解析 fixed_interval（仅支持 ms/s/m/h/d），不支持时返回 None"""
+    if not interval or interval.strip()[-1:] not in ('s', 'm', 'h', 'd'):
+        return None
+    return parse_duration_ms(interval)
+
+
+def stats_interval(duration_ms: int) -> str:
+    """为统计窗口选择不超过 MAX_STATS_BUCKETS 个桶的最细间隔"""
+    for interval in STATS_INTERVALS:
+        if duration_ms / parse_duration_ms(interval) <= MAX_STATS_BUCKETS:
+            return interval
+    return STATS_INTERVALS[-1]
+
+
+def parse_histogram_buckets(es_data: Dict[str, Any]) -> Dict[int, Dict[str, Any]]:
+    """解析 time_series 聚合结果为 {桶起始毫秒: {total, levels}}"""
+    result = {}
+    buckets = es_data.get('aggregations', {}).get('time_series', {}).get('buckets', [])
+    for bucket in buckets:
+        levels = {}
+        for level_bucket in bucket.get('log_levels', {}).get('buckets', []):
+            level = str(level_bucket.get('key', '')).upper()
+            levels[level] = levels.get(level, 0) + level_bucket.get('doc_count', 0)
+        result[int(bucket.get('key'))] = {
+            "total": bucket.get('doc_count', 0),
+            "levels": levels
+        }
+    return result
+
+
+class _TrendSeries:
+    """单个序列的缓存桶，[covered_from, closed_until) 范围内的桶已关闭且连续"""
+
+    __slots__ = ('buckets', 'covered_from', 'closed_until', 'max_window')
+
+    def __init__(self):
+        self.buckets: Dict[int, Dict[str, Any]] = {}
+        self.covered_from: Optional[int] = None
+        self.closed_until: Optional[int] = None
+        self.max_window = 0  # 该序列请求过的最大窗口（毫秒），决定保留范围
+
+
+class TrendCache:
+    """日志趋势桶缓存
+
+    按 (索引模式, 间隔, 级别字段, 过滤条件) 缓存 date_histogram 桶。已关闭的桶
+    保留到该序列请求过的最大窗口之外（外加少量余量，且不超过 RETENTION_MS），
+    每次只向 ES 查询仍在变化的最新桶及之后的新桶。
+    桶按 fixed_interval 对齐到 UTC 纪元，与 ES 的分桶方式一致。
+    """
+
+    def __init__(self, max_series: int = MAX_SERIES):
+        self.max_series = max_series
+        self._lock = threading.Lock()
+        self._series: 'OrderedDict[str, _TrendSeries]' = OrderedDict()
+
+    @staticmethod
+    def series_key(index: str, interval: str, level_field: str, filters: List[Dict[str, Any]]) -> str:
+        return json.dumps([index, interval, level_field, filters], sort_keys=True, ensure_ascii=False)
+
+    @staticmethod
+    def align(ts_ms: int, interval_ms: int) -> int:
+        return ts_ms - ts_ms % interval_ms
+
+    def plan(self, key: str, interval_ms: int, start_ms: int) -> int:
+        """计算需要向 ES 查询的起始时间（毫秒）"""
+        aligned_start = self.align(start_ms, interval_ms)
+        with self._lock:
+            series = self._series.get(key)
+            if (series is None or series.covered_from is None
+                    or aligned_start < series.covered_from or series.closed_until < aligned_start):
+                return aligned_start
+            return series.closed_until
+
+    @staticmethod
+    def build_body(refresh_from: int, end_ms: int, interval: str, level_field: str,
+                   filters: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """构建增量刷新的聚合查询"""
+        return {
+            "size": 0,
+            "track_total_hits": False,
+            "query": {
+                "bool": {
+                    "filter": list(filters) + [{
+                        "range": {
+                            "@timestamp": {
+                                "gte": refresh_from,
+                                "lte": end_ms,
+                                "format": "epoch_millis"
+                            }
+                        }
+                    }]
+                }
+            },
+            "aggs": {
+                "time_series": {
+                    "date_histogram": {
+                        "field": "@timestamp",
+                        "fixed_interval": interval,
+                        "min_doc_count": 0,
+                        # 终点可能已取整到下一个边界，不为其补出空桶
+                        "extended_bounds": {"min": refresh_from, "max": end_ms - 1}
+                    },
+                    "aggs": {
+                        "log_levels": {
+                            "terms": {
+                                "field": level_field,
+                                "size": 10
+                            }
+                        }
+                    }
+                }
+            }
+        }
+
+    def apply(self, key: str, interval_ms: int, refresh_from: int, now: int, es_data: Dict[str, Any],
+              start_ms: Optional[int] = None):
+        """合并 ES 返回的桶，推进已关闭范围，并按请求过的最大窗口（start_ms 起）清理旧桶"""
+        fresh = parse_histogram_buckets(es_data)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = _TrendSeries()
+                self._series[key] = series
+            self._series.move_to_end(key)
+
+            if (series.covered_from is None or refresh_from < series.covered_from
+                    or refresh_from > series.closed_until):
+                # 与已缓存范围不连续，整体替换
+                series.buckets = {}
+                series.covered_from = refresh_from
+            else:
+                for bucket_key in [k for k in series.buckets if k >= refresh_from]:
+                    del series.buckets[bucket_key]
+            series.buckets.update(fresh)
+            series.closed_until = max(refresh_from, self.align(now - SETTLE_MS, interval_ms))
+
+            # 清理超出保留范围的桶：只保留请求过的最大窗口及余量
+            window = now - (refresh_from if start_ms is None else start_ms)
+            series.max_window = max(series.max_window, window)
+            retention = min(series.max_window + RETENTION_MARGIN_BUCKETS * interval_ms, RETENTION_MS)
+            cutoff = self.align(now - retention, interval_ms)
+            if series.covered_from < cutoff:
+                series.buckets = {k: v for k, v in series.buckets.items() if k >= cutoff}
+                series.covered_from = cutoff
+
+            while len(self._series) > self.max_series:
+                self._series.popitem(last=False)
+
+    def covers(self, key: str, interval_ms: int, start_ms: int) -> bool:
+        """缓存是否已覆盖对齐后起始时间之后的窗口（最新的桶可能尚未刷新）"""
+        aligned_start = self.align(start_ms, interval_ms)
+        with self._lock:
+            series = self._series.get(key)
+            return series is not None and series.covered_from is not None and series.covered_from <= aligned_start
+
+    def buckets(self, key: str, interval_ms: int, start_ms: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """获取对齐后起始时间之后的缓存桶（按时间升序）"""
+        aligned_start = self.align(start_ms, interval_ms)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                return []
+            return sorted((k, v) for k, v in series.buckets.items() if k >= aligned_start)
+
+
+# 单例实例
+_trend_cache = None
+_trend_cache_lock = threading.Lock()
+
+
+def get_trend_cache() -> TrendCache:
+    """获取日志趋势缓存实例"""
+    global _trend_cache
+    if _trend_cache is None:
+        with _trend_cache_lock:
+            if _trend_cache is None:
+                _trend_cache = TrendCache()
+    return _trend_cache
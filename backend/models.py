@@ -143,6 +143,22 @@ class VariableValue(Base):
         Index('idx_variable_value_created_at', 'created_at'),
     )
     
+class CustomIndex(Base):
+    """自定义日志索引模型"""
+    __tablename__ = "custom_indices"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(255), nullable=False)  # 索引名称或模式，如 logstash-*
+    description = Column(Text, default='')
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # 添加唯一索引
+    __table_args__ = (
+        Index('idx_custom_index_name', 'name', unique=True),
+        Index('idx_custom_index_created_at', 'created_at'),
+    )
+    
 # 创建所有表
 def create_tables():
     """创建数据库表"""
@@ -0,0 +1,140 @@
+"""Prometheus 批量查询 - 一次请求提交多条即时/范围查询，去重后在有界线程池中并发执行"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from prom_client import PromQueryError, parse_prom_response
+from prom_range_cache import get_prom_range_cache, normalize_expr
+from series_downsample import coarser_step, downsample_matrix, parse_max_points
+
+MAX_BATCH_QUERIES = 100       # 单次批量请求最多包含的查询数
+BATCH_WORKERS = 16            # 并发执行查询的线程数（不超过 PromClient 的连接池大小）
+BATCH_WAIT_MARGIN = 5         # 等待结果时在客户端超时基础上额外预留的秒数
+QUERY_TYPES = ('instant', 'range')
+
+# 所有批量请求共享的查询线程池，限制对 Prometheus 的总并发
+prom_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='prom-batch')
+
+
+class BatchQuery:
+    """批量请求中的一条查询（时间参数已解析为 Unix 秒）"""
+
+    def __init__(self, query_id: str, query_type: str, expr: str, time: Optional[float] = None,
+                 start: Optional[float] = None, end: Optional[float] = None, step: Optional[float] = None,
+                 max_points: Optional[int] = None):
+        self.id = query_id
+        self.type = query_type
+        self.expr = normalize_expr(expr)
+        self.time = time
+        self.start = start
+        self.end = end
+        self.step = step
+        self.max_points = max_points  # 范围查询结果每条序列最多保留的点数（LTTB 降采样）
+
+    def key(self) -> Tuple:
+        """去重键：表达式与时间参数都相同的查询只执行一次"""
+        if self.type == 'instant':
+            return ('instant', self.expr, self.time)
+        return ('range', self.expr, self.start, self.end, self.step, self.max_points)
+
+
+def parse_batch_queries(items: Any, now: float, parse_time, parse_step
+                        ) -> Tuple[List[BatchQuery], Dict[str, Dict[str, Any]]]:
+    """解析批量请求中的查询列表
+
+    未指定时间的即时查询统一使用 now 求值，使同一批次的面板对齐到同一时刻。
+    返回 (有效查询, {id: 错误结果})，整体格式错误时抛出 ValueError。
+    """
+    if not isinstance(items, list) or not items:
+        raise ValueError("queries 必须是非空数组")
+    if len(items) > MAX_BATCH_QUERIES:
+        raise ValueError(f"单次最多提交 {MAX_BATCH_QUERIES} 条查询")
+
+    queries: List[BatchQuery] = []
+    errors: Dict[str, Dict[str, Any]] = {}
+    seen = set()
+    for position, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise ValueError(f"第 {position + 1} 条查询格式错误")
+        query_id = str(item.get('id', position))
+        if query_id in seen:
+            raise ValueError(f"查询 id 重复: {query_id}")
+        seen.add(query_id)
+
+        try:
+            expr = str(item.get('query') or '').strip()
+            if not expr:
+                raise ValueError("缺少 query")
+            query_type = item.get('type', 'instant')
+            if query_type not in QUERY_TYPES:
+                raise ValueError(f"不支持的查询类型: {query_type}")
+            if query_type == 'instant':
+                queries.append(BatchQuery(query_id, query_type, expr, time=parse_time(item.get('time'), now)))
+            else:
+                end = parse_time(item.get('end'), now)
+                start = parse_time(item.get('start'), end - 3600)
+                step = parse_step(item.get('step', '60'))
+                max_points = parse_max_points(item.get('max_points'))
+                if max_points and item.get('adjust_step'):
+                    step = coarser_step(start, end, step, max_points)
+                queries.append(BatchQuery(query_id, query_type, expr, start=start, end=end, step=step,
+                                          max_points=max_points))
+        except ValueError as e:
+            errors[query_id] = _error_result(str(e), 'bad_data', 400)
+    return queries, errors
+
+
+def _error_result(message: str, error_type: str, status: int) -> Dict[str, Any]:
+    return {"status": "error", "errorType": error_type, "error": message, "code": status}
+
+
+def _execute(client, query: BatchQuery, now: float) -> Dict[str, Any]:
+    """执行单条查询，返回与 Prometheus API 一致的结果"""
+    started = time.monotonic()
+    try:
+        if query.type == 'instant':
+            data = parse_prom_response(client.query(query.expr, query.time))
+            result = {"status": "success", "data": data}
+        else:
+            matrix, shards = get_prom_range_cache().query_range(
+                client, query.expr, query.start, query.end, query.step, now=now)
+            if query.max_points:
+                matrix = downsample_matrix(matrix, query.max_points)
+            result = {"status": "success", "data": {"resultType": "matrix", "result": matrix},
+                      "cache": shards, "step": query.step}
+    except PromQueryError as e:
+        result = _error_result(str(e), e.error_type, e.status)
+    except requests.exceptions.RequestException as e:
+        result = _error_result(f"连接Prometheus失败: {e}", 'unavailable', 502)
+    result["took_ms"] = round((time.monotonic() - started) * 1000, 1)
+    return result
+
+
+def run_batch(client, queries: List[BatchQuery], now: Optional[float] = None) -> Tuple[Dict[str, Dict[str, Any]], int]:
+    """并发执行一批查询，返回 ({id: 结果}, 实际执行的查询数)
+
+    相同的查询只提交一次，结果按调用方的 id 分发；单条查询失败不影响其他查询。
+    """
+    now = time.time() if now is None else now
+    groups: Dict[Tuple, List[BatchQuery]] = {}
+    for query in queries:
+        groups.setdefault(query.key(), []).append(query)
+
+    futures = {key: prom_executor.submit(_execute, client, group[0], now) for key, group in groups.items()}
+    deadline = time.monotonic() + client.timeout + BATCH_WAIT_MARGIN
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for key, future in futures.items():
+        try:
+            result = future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeoutError:
+            future.cancel()
+            result = _error_result("查询超时", 'timeout', 504)
+        except Exception as e:
+            result = _error_result(f"查询失败: {e}", 'internal', 500)
+        for query in groups[key]:
+            results[query.id] = result
+    return results, len(futures)
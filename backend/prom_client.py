@@ -0,0 +1,177 @@
+"""Prometheus HTTP 客户端 - 共享连接池、keep-alive 与重试策略"""
+
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config_store import get_config_store
+
+DEFAULT_CONNECT_TIMEOUT = 3   # 建立连接超时（秒）
+DEFAULT_POOL_MAXSIZE = 20     # 每个主机的最大连接数
+DEFAULT_MAX_RETRIES = 2       # 429/503 及连接失败的最大重试次数
+DEFAULT_BACKOFF_FACTOR = 0.3  # 指数退避因子
+
+
+class PromQueryError(Exception):
+    """Prometheus 返回错误（携带 HTTP 状态码与 Prometheus 错误类型）"""
+
+    def __init__(self, message: str, status: int = 502, error_type: str = 'unavailable'):
+        super().__init__(message)
+        self.status = status
+        self.error_type = error_type
+
+
+def parse_prom_response(response: requests.Response) -> Dict[str, Any]:
+    """解析 Prometheus 查询响应，返回 data 部分；查询失败时抛出 PromQueryError
+
+    400/422（表达式错误、无法执行）保留原状态码，其余错误统一视为上游不可用（502）。
+    """
+    try:
+        payload = response.json()
+    except ValueError:
+        raise PromQueryError(f"Prometheus查询失败: {response.status_code}")
+    if response.status_code != 200 or payload.get('status') != 'success':
+        status = response.status_code if response.status_code in (400, 422) else 502
+        raise PromQueryError(payload.get('error') or f"Prometheus查询失败: {response.status_code}",
+                             status, payload.get('errorType', 'unavailable'))
+    return payload.get('data', {})
+
+
+class PromClient:
+    """Prometheus 客户端
+
+    基于 requests.Session 复用连接，对 429/503 响应和连接失败进行有限次数的
+    指数退避重试。查询使用 POST 表单提交，避免长表达式超出 URL 长度限制。
+    """
+
+    def __init__(self, base_url: str, timeout: float = 30.0, username: str = '', password: str = '',
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE, max_retries: int = DEFAULT_MAX_RETRIES):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            status=max_retries,
+            status_forcelist=(429, 503),
+            allowed_methods=frozenset(['GET', 'POST']),
+            backoff_factor=DEFAULT_BACKOFF_FACTOR,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize,
+                              max_retries=retry, pool_block=False)
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Connection': 'keep-alive'})
+        if username:
+            self.session.auth = (username, password)
+
+    def request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                data: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> requests.Response:
+        """发送请求，path 为以 / 开头的相对路径"""
+        read_timeout = timeout if timeout is not None else self.timeout
+        return self.session.request(
+            method, f"{self.base_url}{path}", params=params, data=data,
+            timeout=(DEFAULT_CONNECT_TIMEOUT, read_timeout)
+        )
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request('GET', path, **kwargs)
+
+    def query(self, expr: str, time: Optional[float] = None, timeout: Optional[float] = None) -> requests.Response:
+        """即时查询 /api/v1/query"""
+        data: Dict[str, Any] = {"query": expr}
+        if time is not None:
+            data["time"] = time
+        return self.request('POST', '/api/v1/query', data=data, timeout=timeout)
+
+    def query_range(self, expr: str, start: float, end: float, step: float,
+                    timeout: Optional[float] = None) -> requests.Response:
+        """范围查询 /api/v1/query_range"""
+        return self.request('POST', '/api/v1/query_range', data={
+            "query": expr,
+            "start": start,
+            "end": end,
+            "step": step
+        }, timeout=timeout)
+
+    def label_values(self, label: str, match: Optional[List[str]] = None, start: Optional[float] = None,
+                     end: Optional[float] = None, timeout: Optional[float] = None) -> requests.Response:
+        """标签值查询 /api/v1/label/<label>/values，match 限定参与统计的序列"""
+        params: Dict[str, Any] = {}
+        if match:
+            params["match[]"] = match
+        if start is not None:
+            params["start"] = start
+        if end is not None:
+            params["end"] = end
+        return self.get(f"/api/v1/label/{quote(label, safe='')}/values", params=params, timeout=timeout)
+
+    def label_names(self, match: Optional[List[str]] = None, start: Optional[float] = None,
+                    end: Optional[float] = None, timeout: Optional[float] = None) -> requests.Response:
+        """标签名查询 /api/v1/labels"""
+        params: Dict[str, Any] = {}
+        if match:
+            params["match[]"] = match
+        if start is not None:
+            params["start"] = start
+        if end is not None:
+            params["end"] = end
+        return self.get('/api/v1/labels', params=params, timeout=timeout)
+
+    def close(self):
+        """关闭连接池"""
+        self.session.close()
+
+
+# 单例实例及其对应的配置 (client, settings)，整体替换保证一致性
+_prom_state = None
+_prom_client_lock = threading.Lock()
+
+
+def _client_settings(prom_config) -> Tuple:
+    """提取影响客户端构建的配置项"""
+    return (
+        (prom_config.get('url') or '').rstrip('/'),
+        prom_config.get('timeout', 30),
+        prom_config.get('username', ''),
+        prom_config.get('password', ''),
+    )
+
+
+def get_prom_client() -> Optional[PromClient]:
+    """获取 Prometheus 客户端实例，monitoring.prometheus 配置变化时自动重建
+
+    Prometheus 未启用或未配置地址时返回 None。
+    """
+    global _prom_state
+
+    prom_config = get_config_store().prometheus_config()
+    if not prom_config.get('enabled', False):
+        return None
+
+    settings = _client_settings(prom_config)
+    if not settings[0]:
+        return None
+
+    state = _prom_state
+    if state is not None and state[1] == settings:
+        return state[0]
+
+    with _prom_client_lock:
+        if _prom_state is None or _prom_state[1] != settings:
+            url, timeout, username, password = settings
+            try:
+                timeout = float(timeout)
+            except (TypeError, ValueError):
+                timeout = 30.0
+            _prom_state = (PromClient(url, timeout=timeout, username=username, password=password), settings)
+        return _prom_state[0]
@@ -0,0 +1,190 @@
+"""Prometheus 范围查询缓存 - 按步长对齐、按固定时间分片缓存 query_range 结果
+
+时间轴按 step * SHARD_POINTS 切分为与纪元对齐的分片，同一 (表达式, 步长) 的
+请求总是落在相同的分片上。已经结束（最后一个点早于 now - SETTLE_SECONDS）的
+分片结果不再变化，缓存后直接复用；仍在变化的最新分片每次都重新查询。
+"""
+
+import json
+import math
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from prom_client import PromQueryError, parse_prom_response
+from ttl_cache import TTLCache
+
+SHARD_POINTS = 240             # 每个分片包含的点数
+MAX_QUERY_POINTS = 11000       # Prometheus 单次查询的点数上限
+SETTLE_SECONDS = 120           # 最后一个点早于该时间之前的分片视为已结束（等待采集延迟）
+SHARD_CACHE_SIZE = 5000
+SHARD_CACHE_TTL = 6 * 60 * 60
+MIN_STEP = 1.0
+MAX_POINTS_PER_REQUEST = 11000  # 单次代理请求最多返回的点数（与 Prometheus 一致）
+
+_QUOTED = re.compile(r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|`[^`]*`')
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_expr(expr: str) -> str:
+    """规范化表达式：去除引号外多余的空白，使写法不同但等价的表达式共享缓存"""
+    parts = []
+    last = 0
+    for match in _QUOTED.finditer(expr):
+        parts.append(_SPACES.sub(' ', expr[last:match.start()]))
+        parts.append(match.group(0))
+        last = match.end()
+    parts.append(_SPACES.sub(' ', expr[last:]))
+    return ''.join(parts).strip()
+
+
+def align_range(start: float, end: float, step: float) -> Tuple[float, float]:
+    """起止时间向下对齐到步长（与 Grafana 的对齐方式一致）"""
+    return math.floor(start / step) * step, math.floor(end / step) * step
+
+
+def _series_key(metric: Dict[str, Any]) -> str:
+    return json.dumps(metric, sort_keys=True)
+
+
+def _split_matrix(result: List[Dict[str, Any]], shard_starts: List[float], span: float) -> Dict[float, List[Dict[str, Any]]]:
+    """将一次查询的 matrix 结果按分片拆分"""
+    shards: Dict[float, List[Dict[str, Any]]] = {shard: [] for shard in shard_starts}
+    first = shard_starts[0]
+    for series in result:
+        per_shard: Dict[float, List[Any]] = {}
+        for point in series.get('values', []):
+            shard = first + math.floor((float(point[0]) - first) / span) * span
+            if shard in shards:
+                per_shard.setdefault(shard, []).append(point)
+        for shard, values in per_shard.items():
+            shards[shard].append({"metric": series.get('metric', {}), "values": values})
+    return shards
+
+
+class PromRangeCache:
+    """Prometheus query_range 分片缓存"""
+
+    def __init__(self, shard_points: int = SHARD_POINTS, settle_seconds: float = SETTLE_SECONDS):
+        self.shard_points = shard_points
+        self.settle_seconds = settle_seconds
+        self._cache = TTLCache(maxsize=SHARD_CACHE_SIZE, ttl=SHARD_CACHE_TTL)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "open_fetches": 0, "queries": 0}
+
+    def _fetch(self, client, expr: str, start: float, end: float, step: float) -> List[Dict[str, Any]]:
+        response = client.query_range(expr, start, end, step)
+        with self._lock:
+            self._stats["queries"] += 1
+        data = parse_prom_response(response)
+        if data.get('resultType') != 'matrix':
+            raise PromQueryError("范围查询只支持返回 matrix 结果", 400, 'bad_data')
+        return data.get('result', [])
+
+    def query_range(self, client, expr: str, start: float, end: float, step: float,
+                    now: Optional[float] = None) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """执行带分片缓存的范围查询
+
+        返回 (matrix 结果, 本次的分片统计)，结果与直接查询对齐后的区间一致。
+        """
+        step = max(float(step), MIN_STEP)
+        start, end = align_range(start, end, step)
+        if end < start:
+            return [], {"cached": 0, "fetched": 0, "open": 0}
+        if (end - start) / step + 1 > MAX_POINTS_PER_REQUEST:
+            raise PromQueryError("查询点数过多，请增大步长或缩短时间范围", 400, 'bad_data')
+
+        now = time.time() if now is None else now
+        expr = normalize_expr(expr)
+        span = step * self.shard_points
+        closed_before = now - self.settle_seconds
+
+        first_shard = math.floor(start / span) * span
+        shard_starts = []
+        shard = first_shard
+        while shard <= end:
+            shard_starts.append(shard)
+            shard += span
+
+        shard_results: Dict[float, List[Dict[str, Any]]] = {}
+        missing_closed: List[float] = []
+        open_shards: List[float] = []
+        for shard in shard_starts:
+            last_point = shard + span - step
+            if last_point > closed_before:
+                open_shards.append(shard)
+                continue
+            cached = self._cache.get((client.base_url, expr, step, shard))
+            if cached is not None:
+                shard_results[shard] = cached
+            else:
+                missing_closed.append(shard)
+
+        # 连续缺失的已结束分片合并为一次查询（不超过 Prometheus 的点数上限）
+        max_run = max(int(MAX_QUERY_POINTS // self.shard_points), 1)
+        runs: List[List[float]] = []
+        for shard in missing_closed:
+            if runs and shard - runs[-1][-1] == span and len(runs[-1]) < max_run:
+                runs[-1].append(shard)
+            else:
+                runs.append([shard])
+        for run in runs:
+            result = self._fetch(client, expr, run[0], run[-1] + span - step, step)
+            for shard, series in _split_matrix(result, run, span).items():
+                self._cache.set((client.base_url, expr, step, shard), series)
+                shard_results[shard] = series
+
+        # 未结束的分片只查询请求区间内的部分，不缓存
+        if open_shards:
+            open_start = max(open_shards[0], start)
+            result = self._fetch(client, expr, open_start, end, step)
+            shard_results.update(_split_matrix(result, open_shards, span))
+
+        with self._lock:
+            self._stats["hits"] += len(shard_starts) - len(missing_closed) - len(open_shards)
+            self._stats["misses"] += len(missing_closed)
+            self._stats["open_fetches"] += 1 if open_shards else 0
+
+        return self._merge(shard_results, start, end), {
+            "cached": len(shard_starts) - len(missing_closed) - len(open_shards),
+            "fetched": len(missing_closed),
+            "open": len(open_shards)
+        }
+
+    @staticmethod
+    def _merge(shard_results: Dict[float, List[Dict[str, Any]]], start: float, end: float) -> List[Dict[str, Any]]:
+        """按时间顺序拼接各分片的序列，并裁剪到请求区间"""
+        merged: Dict[str, Dict[str, Any]] = {}
+        for shard in sorted(shard_results):
+            for series in shard_results[shard]:
+                key = _series_key(series.get('metric', {}))
+                target = merged.get(key)
+                if target is None:
+                    target = merged[key] = {"metric": series.get('metric', {}), "values": []}
+                target["values"].extend(point for point in series['values'] if start <= float(point[0]) <= end)
+        return [series for series in merged.values() if series["values"]]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["cached_shards"] = len(self._cache)
+        return stats
+
+    def clear(self):
+        self._cache.clear()
+
+
+# 单例实例
+_prom_range_cache = None
+_prom_range_cache_lock = threading.Lock()
+
+
+def get_prom_range_cache() -> PromRangeCache:
+    """获取 Prometheus 范围查询缓存实例"""
+    global _prom_range_cache
+    if _prom_range_cache is None:
+        with _prom_range_cache_lock:
+            if _prom_range_cache is None:
+                _prom_range_cache = PromRangeCache()
+    return _prom_range_cache
@@ -0,0 +1,108 @@
+"""时间序列降采样 - Largest-Triangle-Three-Buckets (LTTB)
+
+在保留曲线形状（峰值、谷值）的前提下将每条序列压缩到指定点数，
+用于减小范围查询结果的传输体积和前端渲染开销。
+"""
+
+import math
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+MIN_MAX_POINTS = 3          # LTTB 至少保留首尾两点和一个中间点
+MAX_MAX_POINTS = 11000
+STEP_OVERSAMPLE = 4         # 自动调整步长时，每个输出点至少对应的原始点数
+NICE_STEPS = (1, 5, 10, 15, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 10800, 21600, 43200, 86400)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """返回 LTTB 选中点的下标（升序，包含首尾两点）
+
+    首尾点固定保留，中间点均分为 threshold - 2 个桶；每个桶选择与上一个选中点、
+    下一个桶平均点构成三角形面积最大的点。桶内面积计算使用 NumPy 向量化完成。
+    y 中的 NaN 视为面积 0（仅在整个桶都是 NaN 时被选中）。
+    """
+    n = len(x)
+    if threshold >= n or threshold < MIN_MAX_POINTS:
+        return np.arange(n)
+
+    # 中间 n-2 个点的桶边界（下标）
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(np.int64)
+    edges[-1] = n - 1
+    y_filled = np.where(np.isnan(y), 0.0, y)
+
+    # 各桶的平均点（作为下一个桶选择时的第三个顶点），最后一个桶之后使用末点
+    csum_x = np.concatenate(([0.0], np.cumsum(x)))
+    csum_y = np.concatenate(([0.0], np.cumsum(y_filled)))
+    counts = np.maximum(edges[1:] - edges[:-1], 1)
+    avg_x = np.append((csum_x[edges[1:]] - csum_x[edges[:-1]]) / counts, x[-1])
+    avg_y = np.append((csum_y[edges[1:]] - csum_y[edges[:-1]]) / counts, y_filled[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        if hi <= lo:
+            hi = lo + 1
+        next_x, next_y = avg_x[bucket + 1], avg_y[bucket + 1]
+        bx = x[lo:hi]
+        by = y_filled[lo:hi]
+        area = np.abs((x[previous] - next_x) * (by - y_filled[previous])
+                      - (x[previous] - bx) * (next_y - y_filled[previous]))
+        previous = lo + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def downsample_series(values: List[List[Any]], max_points: int) -> List[List[Any]]:
+    """对 Prometheus 的 [[时间戳, "值"], ...] 序列执行 LTTB，原样保留选中点的字符串值"""
+    if len(values) <= max_points:
+        return values
+    x = np.fromiter((float(point[0]) for point in values), dtype=np.float64, count=len(values))
+    y = np.array([point[1] for point in values], dtype=np.float64)
+    # ±Inf 会使面积无法比较，按有限值中的最大/最小值参与计算
+    finite = np.isfinite(y)
+    if not finite.all():
+        if finite.any():
+            y = np.where(np.isposinf(y), y[finite].max(), np.where(np.isneginf(y), y[finite].min(), y))
+        else:
+            y = np.zeros_like(y)
+    return [values[index] for index in lttb_indices(x, y, max_points)]
+
+
+def downsample_matrix(result: List[Dict[str, Any]], max_points: int) -> List[Dict[str, Any]]:
+    """对 matrix 结果中的每条序列降采样到不超过 max_points 个点"""
+    return [
+        {**series, "values": downsample_series(series.get('values', []), max_points)}
+        for series in result
+    ]
+
+
+def parse_max_points(value: Any) -> Optional[int]:
+    """解析 max_points / width 参数，未提供时返回 None，非法时抛出 ValueError"""
+    if value is None or value == '':
+        return None
+    try:
+        max_points = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"无效的点数: {value}")
+    if max_points < MIN_MAX_POINTS:
+        raise ValueError(f"点数不能小于 {MIN_MAX_POINTS}")
+    return min(max_points, MAX_MAX_POINTS)
+
+
+def coarser_step(start: float, end: float, step: float, max_points: int) -> float:
+    """选择不小于原步长的“整齐”步长，使原始点数约为 max_points 的 STEP_OVERSAMPLE 倍
+
+    整齐的步长让不同宽度的面板落到相同的步长上，从而共享分片缓存；
+    保留一定的过采样使 LTTB 仍有足够的点来挑选峰值。
+    """
+    target = (end - start) / (max_points * STEP_OVERSAMPLE)
+    if target <= step:
+        return step
+    for nice in NICE_STEPS:
+        if nice >= target:
+            return max(float(nice), step)
+    return max(math.ceil(target / 86400) * 86400.0, step)
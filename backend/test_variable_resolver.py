@@ -0,0 +1,37 @@
+"""变量选项解析 - 正则过滤与排序"""
+
+import pytest
+
+from variable_resolver import VariableQueryError, apply_regex, apply_sort
+
+
+def test_apply_regex_javascript_named_group():
+    assert apply_regex(['a:9100'], '/(?<value>.*):.*/') == ['a']
+
+
+def test_apply_regex_python_named_group():
+    assert apply_regex(['a:9100', 'b:9200'], '/(?P<value>[a-z]+):9100/') == ['a']
+
+
+def test_apply_regex_text_group_and_first_group():
+    assert apply_regex(['web-1'], '/(?<text>\\w+)-\\d/') == ['web']
+    assert apply_regex(['web-1', 'db'], '(\\w+)-(\\d)') == ['web']
+
+
+def test_apply_regex_keeps_lookbehind():
+    assert apply_regex(['x1', 'y1'], '/(?<=x)1/') == ['x1']
+    assert apply_regex(['x1', 'y1'], '/(?<!x)1/') == ['y1']
+
+
+def test_apply_regex_flags_and_no_pattern():
+    assert apply_regex(['Node', 'db'], '/node/i') == ['Node']
+    assert apply_regex(['a', 'b'], '') == ['a', 'b']
+
+
+def test_apply_regex_invalid():
+    with pytest.raises(VariableQueryError):
+        apply_regex(['a'], '/(?<value>/')
+
+
+def test_apply_sort_numerical_dedup():
+    assert apply_sort(['10', '9', '10', 'x'], 'numerical_asc') == ['9', '10', 'x']
@@ -0,0 +1,44 @@
+"""时间工具 - 解析 ES 风格的时长表达式（如 15m、24h、7d）"""
+
+import re
+import time
+from typing import Optional
+
+# ES 日期数学单位对应的毫秒数（M/y 按 30/365 天近似）
+_UNIT_MS = {
+    'ms': 1,
+    's': 1000,
+    'm': 60 * 1000,
+    'h': 60 * 60 * 1000,
+    'd': 24 * 60 * 60 * 1000,
+    'w': 7 * 24 * 60 * 60 * 1000,
+    'M': 30 * 24 * 60 * 60 * 1000,
+    'y': 365 * 24 * 60 * 60 * 1000,
+}
+
+_DURATION_RE = re.compile(r'^\s*(\d+)\s*(ms|s|m|h|d|w|M|y)\s*$')
+
+
+def parse_duration_ms(value: Optional[str]) -> Optional[int]:
+    """解析时长表达式为毫秒，无法解析时返回 None"""
+    if not value:
+        return None
+    match = _DURATION_RE.match(str(value))
+    if not match:
+        return None
+    return int(match.group(1)) * _UNIT_MS[match.group(2)]
+
+
+def now_ms() -> int:
+    """当前时间（毫秒时间戳）"""
+    return int(time.time() * 1000)
+
+
+def relative_start_ms(expr: Optional[str], now: Optional[int] = None) -> Optional[int]:
+    """解析 now-15m 形式的相对时间为毫秒时间戳（忽略 /m 等取整），无法解析时返回 None"""
+    if not expr or not str(expr).startswith('now-'):
+        return None
+    duration = parse_duration_ms(str(expr)[4:].split('/', 1)[0])
+    if duration is None:
+        return None
+    return (now if now is not None else now_ms()) - duration
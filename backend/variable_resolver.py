@@ -0,0 +1,262 @@
+"""变量选项解析 - 在服务端解析查询型变量的可选值，按 (查询, 时间桶) 缓存并持久化
+
+支持的查询语法（与 Grafana Prometheus 数据源一致）：
+    label_values(label)                 标签的所有取值
+    label_values(metric{...}, label)    限定序列后的标签取值（使用 match[]，无需拉取全部序列）
+    label_names() / label_names(match)  标签名
+    metrics(regex)                      指标名
+    query_result(expr) / 其他表达式      即时查询结果（取第一个标签的值，无标签时取数值）
+"""
+
+import math
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from enhanced_data_service import get_enhanced_data_service
+from prom_batch import prom_executor
+from prom_client import parse_prom_response
+from ttl_cache import TTLCache
+
+VARIABLE_TIME_BUCKET = 60      # 时间桶（秒）：同一桶内的相同查询共享解析结果
+VARIABLE_CACHE_SIZE = 1024
+MAX_VARIABLE_OPTIONS = 10000   # 单个变量最多保留的可选值数量
+REFRESH_POLICIES = ('never', 'on_dashboard_load', 'on_time_range_change')
+
+_FUNCTION = re.compile(r'^\s*(label_values|label_names|metrics|query_result)\s*\((.*)\)\s*$', re.S)
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?')
+# JavaScript 风格的命名分组 (?<name>...)，不含后行断言 (?<= / (?<!
+_JS_NAMED_GROUP = re.compile(r'(?<!\\)\(\?<(?=[A-Za-z_])')
+
+
+class VariableQueryError(Exception):
+    """变量查询无法解析或执行（携带 HTTP 状态码）"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def _split_top_level(args: str) -> List[str]:
+    """按顶层逗号拆分参数（忽略花括号、圆括号和引号内的逗号）"""
+    parts, depth, quote, current = [], 0, None, []
+    for index, char in enumerate(args):
+        if quote:
+            if char == quote and args[index - 1] != '\\':
+                quote = None
+        elif char in '"\'`':
+            quote = char
+        elif char in '({[':
+            depth += 1
+        elif char in ')}]':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            parts.append(''.join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    parts.append(''.join(current).strip())
+    return [part for part in parts if part]
+
+
+def parse_variable_query(query: str) -> Tuple[str, List[str]]:
+    """解析变量查询，返回 (函数名, 参数列表)；非函数形式的查询视为 query_result"""
+    query = (query or '').strip()
+    if not query:
+        raise VariableQueryError("变量查询为空")
+    match = _FUNCTION.match(query)
+    if not match:
+        return 'query_result', [query]
+    function, args = match.group(1), _split_top_level(match.group(2))
+    if function == 'label_values' and len(args) not in (1, 2):
+        raise VariableQueryError("label_values 需要 1 或 2 个参数")
+    if function in ('query_result', 'metrics') and len(args) != 1:
+        raise VariableQueryError(f"{function} 需要 1 个参数")
+    return function, args
+
+
+def _fetch_options(client, query: str, start: Optional[float], end: Optional[float]) -> List[str]:
+    """向 Prometheus 查询变量的原始可选值（未过滤、未排序）"""
+    function, args = parse_variable_query(query)
+    if function == 'label_values':
+        label = args[-1]
+        match = [args[0]] if len(args) == 2 else None
+        return [str(value) for value in parse_prom_response(client.label_values(label, match, start, end)) or []]
+    if function == 'label_names':
+        return [str(value) for value in parse_prom_response(client.label_names(args or None, start, end)) or []]
+    if function == 'metrics':
+        pattern = _compile_regex(args[0])
+        names = parse_prom_response(client.label_values('__name__', None, start, end)) or []
+        return [str(name) for name in names if pattern.search(str(name))]
+
+    data = parse_prom_response(client.query(args[0], end))
+    values = []
+    for item in data.get('result', []) if isinstance(data, dict) else []:
+        metric = item.get('metric') or {}
+        if metric:
+            values.append(str(next(iter(metric.values()))))
+        elif item.get('value'):
+            values.append(str(item['value'][1]))
+    return values
+
+
+def _compile_regex(pattern: str):
+    """编译 Grafana 风格的正则（支持 /pattern/flags 形式与 JavaScript 的 (?<name>...) 命名分组）"""
+    flags = 0
+    match = re.match(r'^/(.*)/([gimsuy]*)$', pattern, re.S)
+    if match:
+        pattern = match.group(1)
+        flags = re.I if 'i' in match.group(2) else 0
+    pattern = _JS_NAMED_GROUP.sub('(?P<', pattern)
+    try:
+        return re.compile(pattern, flags)
+    except re.error as e:
+        raise VariableQueryError(f"无效的正则表达式: {e}")
+
+
+def apply_regex(values: List[str], pattern: str) -> List[str]:
+    """按正则过滤可选值；正则含捕获组时取命名组 value（或第一个分组）作为选项"""
+    if not pattern:
+        return values
+    regex = _compile_regex(pattern)
+    filtered = []
+    for value in values:
+        match = regex.search(value)
+        if not match:
+            continue
+        if regex.groups:
+            groups = match.groupdict()
+            value = groups.get('value') or groups.get('text') or match.group(1)
+            if value is None:
+                continue
+        filtered.append(value)
+    return filtered
+
+
+def _numeric_key(value: str) -> Tuple[int, float, str]:
+    match = _NUMBER.search(value)
+    return (0, float(match.group(0)), value) if match else (1, 0.0, value)
+
+
+def apply_sort(values: List[str], sort: Optional[str]) -> List[str]:
+    """去重并按 sort 策略排序（disabled 时保持原有顺序）"""
+    values = list(dict.fromkeys(values))
+    if sort == 'alphabetical_asc':
+        return sorted(values)
+    if sort == 'alphabetical_desc':
+        return sorted(values, reverse=True)
+    if sort == 'numerical_asc':
+        return sorted(values, key=_numeric_key)
+    if sort == 'numerical_desc':
+        return sorted(values, key=_numeric_key, reverse=True)
+    return values
+
+
+class VariableResolver:
+    """变量选项解析器
+
+    原始结果按 (Prometheus 地址, 查询, 时间桶) 缓存，正则与排序在缓存之后执行，
+    不同的过滤条件可共享同一次查询。on_time_range_change 的时间桶由请求的时间范围决定，
+    其余策略按当前时间分桶。on_time_range_change 始终按请求的时间范围同步解析；
+    on_dashboard_load 且已持久化可选值的变量立即返回上次的结果，
+    同时在后台刷新（同一变量同时只有一个刷新任务）。
+    """
+
+    def __init__(self, bucket_seconds: int = VARIABLE_TIME_BUCKET):
+        self.bucket_seconds = bucket_seconds
+        self._cache = TTLCache(maxsize=VARIABLE_CACHE_SIZE, ttl=bucket_seconds * 2)
+        self._lock = threading.Lock()
+        self._refreshing = set()
+
+    def _bucket(self, value: float) -> int:
+        return int(math.floor(value / self.bucket_seconds))
+
+    def resolve_query(self, client, query: str, regex: str = '', sort: Optional[str] = 'disabled',
+                      refresh: str = 'on_dashboard_load', start: Optional[float] = None,
+                      end: Optional[float] = None, now: Optional[float] = None) -> Tuple[List[str], bool]:
+        """解析一个变量查询，返回 (可选值, 是否命中缓存)"""
+        now = time.time() if now is None else now
+        if refresh == 'on_time_range_change' and start is not None:
+            end = now if end is None else end
+            key = (client.base_url, query, self._bucket(start), self._bucket(end))
+        else:
+            start = end = None
+            key = (client.base_url, query, None, self._bucket(now))
+
+        raw = self._cache.get(key)
+        cached = raw is not None
+        if raw is None:
+            if start is not None:
+                # 时间范围对齐到桶边界，保证同一桶内的请求得到相同结果
+                start = self._bucket(start) * self.bucket_seconds
+                end = (self._bucket(end) + 1) * self.bucket_seconds
+            raw = _fetch_options(client, query, start, end)
+            self._cache.set(key, raw)
+        options = apply_sort(apply_regex(raw, regex), sort)
+        return options[:MAX_VARIABLE_OPTIONS], cached
+
+    def resolve_variable(self, client, variable: Dict[str, Any], start: Optional[float] = None,
+                         end: Optional[float] = None, force: bool = False) -> Dict[str, Any]:
+        """解析已保存的变量并持久化结果
+
+        refresh 为 never 且已有可选值时直接返回；on_time_range_change 按请求的 start/end 同步解析
+        （已保存的结果属于其他时间范围）；on_dashboard_load 且已有可选值时立即返回已保存的结果
+        并在后台刷新；没有可选值或 force 时同步解析。
+        """
+        stored = variable.get('options') or []
+        refresh = variable.get('refresh') or 'on_dashboard_load'
+        if variable.get('type', 'query') != 'query' or not variable.get('query'):
+            return {"options": stored, "source": "stored", "refreshing": False}
+        if stored and not force and refresh != 'on_time_range_change':
+            if refresh == 'never':
+                return {"options": stored, "source": "stored", "refreshing": False}
+            refreshing = self._refresh_in_background(client, variable, start, end)
+            return {"options": stored, "source": "stored", "refreshing": refreshing}
+        options, cached = self._resolve_and_save(client, variable, start, end)
+        return {"options": options, "source": "cache" if cached else "prometheus", "refreshing": False}
+
+    def _resolve_and_save(self, client, variable: Dict[str, Any], start: Optional[float],
+                          end: Optional[float]) -> Tuple[List[str], bool]:
+        options, cached = self.resolve_query(
+            client, variable['query'], variable.get('regex') or '', variable.get('sort'),
+            variable.get('refresh') or 'on_dashboard_load', start, end)
+        get_enhanced_data_service().save_variable_options(variable['id'], options)
+        return options, cached
+
+    def _refresh_in_background(self, client, variable: Dict[str, Any], start: Optional[float],
+                               end: Optional[float]) -> bool:
+        with self._lock:
+            if variable['id'] in self._refreshing:
+                return True
+            self._refreshing.add(variable['id'])
+
+        def refresh():
+            try:
+                self._resolve_and_save(client, variable, start, end)
+            except Exception as e:
+                print(f"刷新变量 {variable.get('name')} 的可选值失败: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(variable['id'])
+
+        prom_executor.submit(refresh)
+        return True
+
+    def clear(self):
+        self._cache.clear()
+
+
+# 单例实例
+_variable_resolver = None
+_variable_resolver_lock = threading.Lock()
+
+
+def get_variable_resolver() -> VariableResolver:
+    """获取变量选项解析器实例"""
+    global _variable_resolver
+    if _variable_resolver is None:
+        with _variable_resolver_lock:
+            if _variable_resolver is None:
+                _variable_resolver = VariableResolver()
+    return _variable_resolver
@@ -23,6 +23,25 @@ const kibanaAPI = {
     }
   },
 
+  // 获取日志概览（日志、统计、趋势、索引合并为一次请求）
+  getOverview: async (params: any = {}) => {
+    try {
+      const queryParams = new URLSearchParams();
+      Object.keys(params).forEach(key => {
+        if (params[key] !== undefined && params[key] !== null && params[key] !== '') {
+          queryParams.append(key, params[key]);
+        }
+      });
+      
+      const response = await fetch(`${getApiBaseUrl()}/logs/overview?${queryParams.toString()}`);
+      const data = await response.json();
+      return data;
+    } catch (error) {
+      console.error('获取日志概览失败:', error);
+      return { data: {}, errors: {}, success: false };
+    }
+  },
+
   // 获取实时日志流
   getLogStream: async (params: any = {}) => {
     try {
@@ -42,6 +61,37 @@ const kibanaAPI = {
     }
   },
 
+  // 获取字段分布（前几个值与不同值数量）
+  getFacets: async (params: any = {}) => {
+    try {
+      const queryParams = new URLSearchParams();
+      Object.keys(params).forEach(key => {
+        if (params[key] !== undefined && params[key] !== null && params[key] !== '') {
+          queryParams.append(key, params[key]);
+        }
+      });
+      
+      const response = await fetch(`${getApiBaseUrl()}/logs/facets?${queryParams.toString()}`);
+      const data = await response.json();
+      return data;
+    } catch (error) {
+      console.error('获取字段分布失败:', error);
+      return { data: [], success: false };
+    }
+  },
+
+  // 获取单条日志详情（列表接口只返回紧凑字段）
+  getLogDetail: async (index: string, id: string) => {
+    try {
+      const response = await fetch(`${getApiBaseUrl()}/logs/${encodeURIComponent(index)}/${encodeURIComponent(id)}`);
+      const data = await response.json();
+      return data;
+    } catch (error) {
+      console.error('获取日志详情失败:', error);
+      return { data: null, success: false };
+    }
+  },
+
   // 获取索引列表
   getLogIndices: async () => {
     try {
@@ -95,16 +145,21 @@ const KibanaLogAnalysis: React.FC = () => {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [totalHits, setTotalHits] = useState(0);
+  // 总数类型：精确值、下限（超过计数上限）或由趋势缓存估算
+  const [totalRelation, setTotalRelation] = useState<'eq' | 'gte' | 'estimate'>('eq');
   const [lastUpdate, setLastUpdate] = useState<Date | null>(null);
   
   // UI状态
   const [expandedLogs, setExpandedLogs] = useState<Set<string>>(new Set());
+  const [logDetails, setLogDetails] = useState<Record<string, any>>({});
+  const [facets, setFacets] = useState<any[]>([]);
   const [selectedFields, setSelectedFields] = useState(['timestamp', 'level', 'service', 'message']);
   const [showFieldSelector, setShowFieldSelector] = useState(false);
   
   // 引用
   const logContainerRef = useRef<HTMLDivElement>(null);
   const intervalRef = useRef<NodeJS.Timeout | null>(null);
+  const initializedRef = useRef(false);
   
   // 时间范围选项
   const timeRangeOptions = [
@@ -132,6 +187,17 @@ const KibanaLogAnalysis: React.FC = () => {
     'timestamp', 'level', 'service', 'message', 'source', 'index', 'host'
   ];
   
+  // 更新命中总数（服务端只计数到上限，超出时优先显示估算值）
+  const applyTotal = (result: any, fallback: number) => {
+    if (result.estimated_total != null) {
+      setTotalHits(result.estimated_total);
+      setTotalRelation('estimate');
+    } else {
+      setTotalHits(result.total || fallback);
+      setTotalRelation(result.total_relation === 'gte' ? 'gte' : 'eq');
+    }
+  };
+  
   // 加载数据
   const loadData = async (append = false) => {
     try {
@@ -169,7 +235,7 @@ const KibanaLogAnalysis: React.FC = () => {
         } else {
           setLogs(sortedLogs);
         }
-        setTotalHits(response.total || newLogs.length);
+        applyTotal(response, newLogs.length);
       } else {
         setError(response.message || '获取日志数据失败');
       }
@@ -185,6 +251,62 @@ const KibanaLogAnalysis: React.FC = () => {
     }
   };
   
+  // 首次加载：日志和索引列表通过概览接口一次获取
+  const loadOverview = async () => {
+    try {
+      setLoading(true);
+      setError(null);
+      
+      const response = await kibanaAPI.getOverview({
+        sections: 'logs,indices',
+        index: selectedIndex,
+        query: searchQuery,
+        time_range: timeRange,
+        size: 500
+      });
+      
+      if (response.success) {
+        const overview = response.data || {};
+        if (overview.indices) {
+          setIndices(overview.indices);
+        }
+        if (overview.logs) {
+          const sortedLogs = (overview.logs.data || []).sort((a, b) => {
+            const timeA = new Date(a.timestamp || 0).getTime();
+            const timeB = new Date(b.timestamp || 0).getTime();
+            return timeA - timeB;
+          });
+          setLogs(sortedLogs);
+          applyTotal(overview.logs, sortedLogs.length);
+        } else {
+          setError(response.errors?.logs || '获取日志数据失败');
+        }
+        setLastUpdate(new Date());
+      } else {
+        setError(response.message || '获取日志数据失败');
+      }
+    } catch (err) {
+      console.error('加载日志概览失败:', err);
+      setError('网络错误，请检查连接');
+    } finally {
+      setLoading(false);
+    }
+  };
+  
+  // 加载字段分布（服务端按查询条件缓存）
+  const loadFacets = async () => {
+    const response = await kibanaAPI.getFacets({
+      index: selectedIndex,
+      match_pattern: searchQuery,
+      time_range: timeRange,
+      fields: 'level,service,host.name',
+      size: 5
+    });
+    if (response.success) {
+      setFacets((response.data || []).filter((facet: any) => facet.values?.length > 0));
+    }
+  };
+  
   // 加载索引列表
   const loadIndices = async () => {
     try {
@@ -215,30 +337,77 @@ const KibanaLogAnalysis: React.FC = () => {
       // 首先加载配置管理器设置
       await configManager.loadConfig();
       // 然后加载日志分析数据
-      loadIndices();
       loadCustomIndices();
-      loadData();
+      await loadOverview();
+      initializedRef.current = true;
     };
     
     initialize();
   }, []);
   
-  // 搜索参数变化时重新加载
+  // 搜索参数变化时重新加载（首次加载由概览接口完成）
   useEffect(() => {
-    if (!isRealTime) {
+    if (initializedRef.current && !isRealTime) {
       loadData();
     }
   }, [searchQuery, selectedIndex, timeRange]);
   
-  // 实时模式和自动刷新
+  // 字段分布跟随查询条件更新
+  useEffect(() => {
+    if (!isRealTime) {
+      loadFacets();
+    }
+  }, [searchQuery, selectedIndex, timeRange, isRealTime]);
+  
+  // 实时模式：订阅服务端推送（SSE）的增量日志，不再定时重复拉取
+  useEffect(() => {
+    if (!isRealTime) {
+      return;
+    }
+    
+    const queryParams = new URLSearchParams({ mode: 'sse', index: selectedIndex, size: '500' });
+    if (searchQuery) {
+      queryParams.append('query', searchQuery);
+    }
+    
+    setLogs([]);
+    const source = new EventSource(`${getApiBaseUrl()}/logs/stream?${queryParams.toString()}`);
+    
+    source.addEventListener('logs', (event) => {
+      const newLogs = JSON.parse((event as MessageEvent).data || '[]');
+      setLogs(prevLogs => {
+        // 保持最新的1000条日志
+        const combined = [...prevLogs, ...newLogs].slice(-1000);
+        setTotalHits(combined.length);
+        setTotalRelation('eq');
+        return combined;
+      });
+      setError(null);
+      setLastUpdate(new Date());
+    });
+    
+    source.addEventListener('error', (event) => {
+      // 服务端推送的错误事件带有 data；连接中断时 EventSource 会自动重连
+      const data = (event as MessageEvent).data;
+      if (data) {
+        setError(JSON.parse(data).message || '获取实时日志失败');
+      }
+    });
+    
+    return () => {
+      source.close();
+    };
+  }, [isRealTime, searchQuery, selectedIndex]);
+  
+  // 自动刷新
   useEffect(() => {
     if (intervalRef.current) {
       clearInterval(intervalRef.current);
     }
     
-    if ((isRealTime || autoRefresh) && refreshInterval > 0) {
+    if (autoRefresh && !isRealTime && refreshInterval > 0) {
       intervalRef.current = setInterval(() => {
-        loadData(isRealTime);
+        loadData();
       }, refreshInterval * 1000);
     }
     
@@ -261,8 +430,8 @@ const KibanaLogAnalysis: React.FC = () => {
     }
   }, [logs, isRealTime]);
   
-  // 切换日志展开状态
-  const toggleLogExpansion = (logId: string) => {
+  // 切换日志展开状态，首次展开时按需加载完整内容
+  const toggleLogExpansion = async (logId: string, log: any) => {
     const newExpanded = new Set(expandedLogs);
     if (newExpanded.has(logId)) {
       newExpanded.delete(logId);
@@ -270,6 +439,27 @@ const KibanaLogAnalysis: React.FC = () => {
       newExpanded.add(logId);
     }
     setExpandedLogs(newExpanded);
+    
+    if (newExpanded.has(logId) && !logDetails[logId] && log.id && log.index) {
+      const response = await kibanaAPI.getLogDetail(log.index, log.id);
+      if (response.success && response.data) {
+        setLogDetails(prev => ({ ...prev, [logId]: response.data }));
+      }
+    }
+  };
+  
+  // 导出当前查询条件下的日志（服务端流式生成 CSV 并压缩）
+  const exportLogs = () => {
+    const queryParams = new URLSearchParams({
+      index: selectedIndex,
+      time_range: timeRange,
+      format: 'csv',
+      compress: 'gzip'
+    });
+    if (searchQuery) {
+      queryParams.append('match_pattern', searchQuery);
+    }
+    window.open(`${getApiBaseUrl()}/logs/export?${queryParams.toString()}`, '_blank');
   };
   
   // 获取日志级别样式
@@ -338,7 +528,7 @@ const KibanaLogAnalysis: React.FC = () => {
           <div className="flex items-center space-x-4">
             <h1 className="text-xl font-semibold text-gray-900">Discover</h1>
             <div className="text-sm text-gray-500">
-              {totalHits.toLocaleString()} hits
+              {totalRelation === 'estimate' ? '约 ' : ''}{totalHits.toLocaleString()}{totalRelation === 'gte' ? '+' : ''} hits
             </div>
           </div>
           
@@ -407,6 +597,7 @@ const KibanaLogAnalysis: React.FC = () => {
             
             {/* 导出按钮 */}
             <button
+              onClick={exportLogs}
               className="p-2 bg-gray-600 text-white rounded hover:bg-gray-700"
               title="导出日志"
             >
@@ -500,7 +691,7 @@ const KibanaLogAnalysis: React.FC = () => {
               )}
             </div>
             <div>
-              索引: {selectedIndex} | 显示 {logs.length} / {totalHits.toLocaleString()} 条日志
+              索引: {selectedIndex} | 显示 {logs.length} / {totalRelation === 'estimate' ? '约 ' : ''}{totalHits.toLocaleString()}{totalRelation === 'gte' ? '+' : ''} 条日志
             </div>
           </div>
         )}
@@ -551,6 +742,24 @@ const KibanaLogAnalysis: React.FC = () => {
               </label>
             ))}
           </div>
+          
+          {/* 字段分布：当前查询条件下各字段的前几个值 */}
+          {facets.length > 0 && (
+            <div className="mt-2 flex flex-wrap gap-x-6 gap-y-1">
+              {facets.map(facet => (
+                <div key={facet.field} className="flex items-center space-x-2 text-xs">
+                  <span className="text-gray-500">
+                    {facet.field}{facet.cardinality != null ? ` (${facet.cardinality})` : ''}:
+                  </span>
+                  {facet.values.map((item: any) => (
+                    <span key={String(item.value)} className="px-1 rounded bg-gray-100 text-gray-700">
+                      {String(item.value)} <span className="text-gray-400">{item.count.toLocaleString()}</span>
+                    </span>
+                  ))}
+                </div>
+              ))}
+            </div>
+          )}
         </div>
         
         {/* 下方日志显示区域 - 终端风格 */}
@@ -587,7 +796,7 @@ const KibanaLogAnalysis: React.FC = () => {
                       {/* 主日志行 */}
                       <div 
                         className="flex flex-col sm:flex-row sm:items-start space-y-1 sm:space-y-0 sm:space-x-2 hover:bg-gray-800 px-1 py-0.5 rounded cursor-pointer"
-                        onClick={() => toggleLogExpansion(logId)}
+                        onClick={() => toggleLogExpansion(logId, log)}
                       >
                         {/* 小屏幕：垂直布局 */}
                         <div className="sm:hidden w-full space-y-1">
@@ -689,7 +898,7 @@ const KibanaLogAnalysis: React.FC = () => {
                       {isExpanded && (
                         <div className="ml-2 sm:ml-8 mt-2 p-3 bg-gray-800 rounded border-l-2 border-blue-500">
                           <div className="grid grid-cols-1 sm:grid-cols-2 gap-2 sm:gap-4 text-sm">
-                            {Object.entries(log).map(([key, value]) => (
+                            {Object.entries(logDetails[logId] || log).map(([key, value]) => (
                               <div key={key} className="flex flex-col sm:flex-row">
                                 <span className="text-gray-400 sm:w-20 flex-shrink-0 font-medium">{key}:</span>
                                 <span className="text-green-400 break-all whitespace-pre-wrap mt-1 sm:mt-0">
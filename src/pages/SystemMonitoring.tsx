@@ -116,13 +116,17 @@ interface DashboardTemplate {
   tags: string[];
 }
 
+// 范围查询默认每条序列最多返回的点数（超出时由后端按 LTTB 降采样）
+const DEFAULT_MAX_DATA_POINTS = 1000;
+
 // Prometheus API 调用函数
-const queryPrometheus = async (query: string, timeRange: string = '1h'): Promise<PrometheusResponse | null> => {
+const queryPrometheus = async (query: string, timeRange: string = '1h', maxPoints: number = DEFAULT_MAX_DATA_POINTS): Promise<PrometheusResponse | null> => {
   try {
     const endTime = Math.floor(Date.now() / 1000);
     const startTime = endTime - parseTimeRange(timeRange);
     
-    const url = `${getPrometheusBaseUrl()}/api/v1/query_range?query=${encodeURIComponent(query)}&start=${startTime}&end=${endTime}&step=60`;
+    // 经后端代理查询，已结束的时间分片由服务端缓存；长时间范围自动放大步长并降采样
+    const url = `${getApiBaseUrl()}/prom/query_range?query=${encodeURIComponent(query)}&start=${startTime}&end=${endTime}&step=60&max_points=${maxPoints}&adjust_step=true`;
     
     const response = await fetch(url);
     if (!response.ok) {
@@ -173,6 +177,48 @@ const queryPrometheusInstant = async (query: string): Promise<PrometheusResponse
 };
 
 // 时间范围解析
+interface PrometheusBatchQuery {
+  id: string;
+  query: string;
+  type: 'instant' | 'range';
+  start?: number;
+  end?: number;
+  step?: number;
+  max_points?: number;
+  adjust_step?: boolean;
+}
+
+// 批量查询：一次请求提交所有面板的查询，后端去重并发执行，返回 {id: 查询结果}
+const queryPrometheusBatch = async (queries: PrometheusBatchQuery[]): Promise<Record<string, PrometheusResponse> | null> => {
+  try {
+    const response = await fetch(`${getApiBaseUrl()}/prom/batch`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ queries })
+    });
+    if (!response.ok) {
+      console.warn(`Prometheus批量查询失败 (${response.status})`);
+      return null;
+    }
+    
+    const data = await response.json();
+    if (!data.success) {
+      console.warn('Prometheus批量查询失败:', data.message);
+      return null;
+    }
+    Object.entries(data.data.results as Record<string, any>).forEach(([id, result]) => {
+      if (result.status !== 'success') {
+        console.warn(`Prometheus查询失败 (${id}): ${result.error}`);
+      }
+    });
+    return data.data.results;
+  } catch (error) {
+    // 网络错误或服务不可用
+    console.warn('Prometheus服务不可用，请检查服务状态:', error);
+    return null;
+  }
+};
+
 const parseTimeRange = (timeRange: string): number => {
   const timeMap: Record<string, number> = {
     '5m': 5 * 60,
@@ -255,6 +301,21 @@ const transformPrometheusData = (response: PrometheusResponse | null, type: stri
   return [];
 };
 
+// stat/gauge/bar 面板使用即时查询，其余面板使用范围查询
+const isInstantPanel = (panel: Panel) => panel.type === 'stat' || panel.type === 'gauge' || panel.type === 'bar';
+
+// 将查询结果转换为面板数据
+const panelDataFromResponse = (panel: Panel, response: PrometheusResponse | null) => {
+  if (!isInstantPanel(panel)) {
+    return transformPrometheusData(response, 'timeseries');
+  }
+  const data = transformPrometheusData(response, 'instant');
+  if (panel.type !== 'bar' && data.length > 0) {
+    return [{ value: data[0].value }];
+  }
+  return data;
+};
+
 // 生成序列名称的辅助函数
 const getSeriesName = (metric: any, index: number): string => {
   // 优先使用有意义的标签组合
@@ -862,7 +923,8 @@ const PanelComponent: React.FC<{
                       stroke={getSeriesColor(index, panel.color)} 
                       strokeWidth={2}
                       dot={false}
-                      connectNulls={false}
+                      // 各序列独立降采样后时间点不再对齐，连接空值避免曲线断开
+                      connectNulls={true}
                     />
                   ))
                 ) : (
@@ -920,7 +982,7 @@ const PanelComponent: React.FC<{
                       stroke={getSeriesColor(index, panel.color)} 
                       fill={getSeriesColor(index, panel.color)}
                       fillOpacity={0.3}
-                      connectNulls={false}
+                      connectNulls={true}
                     />
                   ))
                 ) : (
@@ -1606,7 +1668,7 @@ const MonitoringPanel: React.FC = () => {
     queryRange: async (query: string, start: string, end: string, step: string) => {
       try {
         const response = await fetch(
-          `${getPrometheusBaseUrl()}/api/v1/query_range?query=${encodeURIComponent(query)}&start=${start}&end=${end}&step=${step}`
+          `${getApiBaseUrl()}/prom/query_range?query=${encodeURIComponent(query)}&start=${start}&end=${end}&step=${step}`
         );
         const data = await response.json();
         return data;
@@ -1689,52 +1751,33 @@ const MonitoringPanel: React.FC = () => {
           return ['option1', 'option2', 'option3'];
         }
 
-        if (variable.query) {
-          // 如果是标签查询
-          if (variable.query.startsWith('label_values(')) {
-            // 解析 label_values(metric, label) 格式
-            const match = variable.query.match(/label_values\(([^,)]+)(?:,\s*([^)]+))?\)/);
-            if (match) {
-              const [, metric, label] = match;
-              if (label) {
-                // 获取指定指标的指定标签值
-                const seriesData = await prometheusAPI.getSeriesLabels(metric.trim());
-                if (seriesData.status === 'success') {
-                  const labelValues = new Set<string>();
-                  seriesData.data.forEach((series: any) => {
-                    if (series[label.trim()]) {
-                      labelValues.add(series[label.trim()]);
-                    }
-                  });
-                  return Array.from(labelValues).sort();
-                }
-              } else {
-                // 获取所有标签值
-                const labelData = await prometheusAPI.getLabelValues(metric.trim());
-                if (labelData.status === 'success') {
-                  return labelData.data.sort();
-                }
-              }
-            }
-          } else {
-            // 执行普通查询
-            const result = await prometheusAPI.query(variable.query);
-            if (result.status === 'success' && result.data.result) {
-              const values = result.data.result.map((item: any) => {
-                if (item.metric) {
-                  // 如果有标签，返回第一个标签的值
-                  const labels = Object.keys(item.metric);
-                  if (labels.length > 0) {
-                    return item.metric[labels[0]];
-                  }
-                }
-                return item.value ? item.value[1] : '';
-              }).filter((v: string) => v) as string[];
-              return [...new Set(values)].sort();
-            }
-          }
+        // 由后端解析（label_values 使用 match[]，正则/排序在服务端完成，结果缓存并持久化）
+        const timeRangeParams = {
+          from: `now-${selectedDashboard.timeRange || '1h'}`,
+          to: 'now'
+        };
+        let response = await fetch(
+          `${getApiBaseUrl()}/variables/${encodeURIComponent(variable.id)}/options?${new URLSearchParams(timeRangeParams)}`
+        );
+        if (response.status === 404) {
+          // 未保存到数据库的变量直接按查询解析
+          response = await fetch(`${getApiBaseUrl()}/variables/resolve`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+              query: variable.query,
+              regex: variable.regex,
+              sort: variable.sort,
+              refresh: variable.refresh,
+              ...timeRangeParams
+            })
+          });
+        }
+        const result = await response.json();
+        if (!response.ok || !result.success) {
+          throw new Error(result.message || `解析变量选项失败 (${response.status})`);
         }
-        return [];
+        return result.data.options as string[];
       } catch (error) {
         console.error('获取变量选项失败:', error);
         // 返回模拟数据作为降级处理
@@ -1749,7 +1792,7 @@ const MonitoringPanel: React.FC = () => {
     }
     
     return [];
-  }, [prometheusConnected]);
+  }, [prometheusConnected, selectedDashboard.timeRange]);
 
   // 更新变量值
   const updateVariableValue = useCallback(async (variableId: string, value: string | string[]) => {
@@ -2518,22 +2561,11 @@ const MonitoringPanel: React.FC = () => {
       console.log('替换后查询:', interpolatedQuery);
       console.log('当前变量值:', variableValues);
 
-      let data = [];
-      if (panel.type === 'stat' || panel.type === 'gauge') {
-        const response = await queryPrometheusInstant(interpolatedQuery);
-        data = transformPrometheusData(response, 'instant');
-        if (data.length > 0) {
-          data = [{ value: data[0].value }];
-        }
-      } else if (panel.type === 'bar') {
-        const response = await queryPrometheusInstant(interpolatedQuery);
-        data = transformPrometheusData(response, 'instant');
-      } else {
-        const response = await queryPrometheus(interpolatedQuery, timeRange);
-        data = transformPrometheusData(response, 'timeseries');
-      }
+      const response = isInstantPanel(panel)
+        ? await queryPrometheusInstant(interpolatedQuery)
+        : await queryPrometheus(interpolatedQuery, timeRange, panel.maxDataPoints || DEFAULT_MAX_DATA_POINTS);
 
-      return { ...panel, data };
+      return { ...panel, data: panelDataFromResponse(panel, response) };
     } catch (error) {
       console.error(`Query error for panel ${panel.id}:`, error);
       return { ...panel, data: [] };
@@ -2549,18 +2581,44 @@ const MonitoringPanel: React.FC = () => {
       return;
     }
 
-    const updatedPanels = await Promise.all(
-      selectedDashboard.panels.map(panel => 
-        executeQuery(panel, selectedDashboard.timeRange, selectedDashboard.variables)
-      )
-    );
+    // 所有面板的查询合并为一次批量请求，耗时取决于最慢的查询
+    const panels = selectedDashboard.panels;
+    const endTime = Math.floor(Date.now() / 1000);
+    const startTime = endTime - parseTimeRange(selectedDashboard.timeRange);
+    const queries: PrometheusBatchQuery[] = panels.map(panel => (
+      isInstantPanel(panel)
+        ? { id: panel.id, query: replaceVariables(panel.query), type: 'instant' }
+        : {
+            id: panel.id,
+            query: replaceVariables(panel.query),
+            type: 'range',
+            start: startTime,
+            end: endTime,
+            step: 60,
+            max_points: panel.maxDataPoints || DEFAULT_MAX_DATA_POINTS,
+            adjust_step: true
+          }
+    ));
+
+    setIsLoading(prev => ({ ...prev, ...Object.fromEntries(panels.map(panel => [panel.id, true])) }));
+    let results: Record<string, PrometheusResponse> | null = null;
+    try {
+      results = queries.length > 0 ? await queryPrometheusBatch(queries) : {};
+    } finally {
+      setIsLoading(prev => ({ ...prev, ...Object.fromEntries(panels.map(panel => [panel.id, false])) }));
+    }
+
+    const updatedPanels = panels.map(panel => ({
+      ...panel,
+      data: panelDataFromResponse(panel, results?.[panel.id] ?? null)
+    }));
 
     setSelectedDashboard(prev => ({
       ...prev,
       panels: updatedPanels
     }));
     setLastUpdate(new Date());
-  }, [selectedDashboard, prometheusConnected, executeQuery]);
+  }, [selectedDashboard, prometheusConnected, replaceVariables]);
 
   // 刷新单个面板
   const refreshPanel = useCallback(async (panelId: string) => {
@@ -2642,11 +2700,12 @@ const MonitoringPanel: React.FC = () => {
       if (!prometheusConnected) return;
       
       for (const variable of customVariables) {
-        if (variable.type === 'query' && variable.query) {
+        if (variable.type === 'query' && variable.query && (variable.refresh !== 'never' || !variable.options?.length)) {
           try {
+            // 解析结果已由后端写回 Variable.options，这里只同步本地状态
             const options = await getVariableOptions(variable);
             if (JSON.stringify(options) !== JSON.stringify(variable.options)) {
-              updateVariable(variable.id, { ...variable, options });
+              setCustomVariables(prev => prev.map(v => v.id === variable.id ? { ...v, options } : v));
             }
           } catch (error) {
             console.error(`刷新变量${variable.name}选项失败:`, error);
@@ -2661,7 +2720,7 @@ const MonitoringPanel: React.FC = () => {
     // 每5分钟自动刷新一次
     const interval = setInterval(refreshQueryVariables, 5 * 60 * 1000);
     return () => clearInterval(interval);
-  }, [customVariables, prometheusConnected, getVariableOptions, updateVariable]);
+  }, [customVariables, prometheusConnected, getVariableOptions]);
 
   // 当选择新仪表板时刷新数据
   useEffect(() => {